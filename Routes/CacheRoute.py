@@ -0,0 +1,17 @@
+from fastapi import APIRouter, status
+from cache import response_cache, response_flights
+from changelog import sync_changes
+
+router = APIRouter()
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    sync_changes()
+    return {**response_cache.stats(), "single_flight": response_flights.stats()}
+
+
+@router.post("/cache/clear", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_cache():
+    await response_cache.clear()
+    return None
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from typing import List, Optional
+from pydantic import BaseModel
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from database import get_db
+from versioning import conditional_get
+from datetime import datetime
+from Routes.ExerciseRoute import ExerciseModel
+from Routes.LessonRoute import LessonModel
+from Routes.PracticeRoomRoute import PracticeRoom, PracticeRoomModel
+from Routes.UserProgressRoute import UserProgressModel
+from Routes.UserRoute import User, UserModel
+
+router = APIRouter()
+
+DASHBOARD_TABLES = ["Users", "UserProgress", "Lessons", "Exercises", "PracticeRooms"]
+
+
+# Pydantic schemas
+class DashboardLesson(BaseModel):
+    progress_id: int
+    lesson_id: int
+    title: Optional[str] = None
+    level: Optional[str] = None
+    type: Optional[str] = None
+    media_id: Optional[str] = None
+    completed: Optional[bool] = False
+    completed_at: Optional[datetime] = None
+    exercise_count: int = 0
+
+
+class Dashboard(BaseModel):
+    user: User
+    lessons: List[DashboardLesson]
+    completed_lessons: int
+    total_lessons: int
+    completion_percentage: float
+    practice_rooms: List[PracticeRoom]
+
+
+# Everything the home screen needs in four queries, regardless of how many
+# lessons the user has: user, progress joined with lessons and exercise counts,
+# total lesson count, hosted rooms.
+@router.get("/users/{user_id}/dashboard", response_model=Dashboard)
+async def get_user_dashboard(
+    user_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, DASHBOARD_TABLES)
+    if not_modified is not None:
+        return not_modified
+
+    result = await db.execute(select(UserModel).where(UserModel.id == user_id))
+    user = result.scalar_one_or_none()
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Correlated count so only the user's lessons are counted, via ix_Exercises_lesson_id
+    exercise_count = (
+        select(func.count(ExerciseModel.id))
+        .where(ExerciseModel.lesson_id == UserProgressModel.lesson_id)
+        .correlate(UserProgressModel)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            UserProgressModel.id.label("progress_id"),
+            UserProgressModel.lesson_id,
+            LessonModel.title,
+            LessonModel.level,
+            LessonModel.type,
+            LessonModel.media_id,
+            UserProgressModel.completed,
+            UserProgressModel.completed_at,
+            exercise_count.label("exercise_count"),
+        )
+        .outerjoin(LessonModel, LessonModel.id == UserProgressModel.lesson_id)
+        .where(UserProgressModel.user_id == user_id)
+        .order_by(UserProgressModel.lesson_id)
+    )
+    lessons = result.mappings().all()
+
+    total_lessons = await db.scalar(select(func.count(LessonModel.id)))
+    completed_lessons = sum(1 for lesson in lessons if lesson["completed"])
+
+    result = await db.execute(
+        select(PracticeRoomModel).where(PracticeRoomModel.host_user_id == user_id)
+    )
+    practice_rooms = result.scalars().all()
+
+    return {
+        "user": user,
+        "lessons": lessons,
+        "completed_lessons": completed_lessons,
+        "total_lessons": total_lessons,
+        "completion_percentage": (
+            round(100 * completed_lessons / total_lessons, 1) if total_lessons else 0.0
+        ),
+        "practice_rooms": practice_rooms,
+    }
@@ -1,10 +1,26 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import (
+    APIRouter,
+    Body,
+    HTTPException,
+    status,
+    Depends,
+    Query,
+    Request,
+    Response,
+)
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, TypeAdapter
 from sqlalchemy import Column, Integer, String, ForeignKey
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database import Base, get_db
+from cache import cached_json, response_cache
+from batch import MAX_BATCH_IDS, BatchResult, fetch_by_ids
+from bulk import MAX_BULK_ITEMS, BulkResult, bulk_upsert
+from database import Base, get_db, run_write
+from versioning import conditional_get, table_versions
+from pagination import PageParams, fetch_page
+from returning import delete_returning, patch_values, update_returning
+from serialization import schema_columns
 
 router = APIRouter()
 
@@ -13,7 +29,7 @@ router = APIRouter()
 class ExerciseModel(Base):
     __tablename__ = "Exercises"
     id = Column(Integer, primary_key=True, index=True)
-    lesson_id = Column(Integer, ForeignKey("Lessons.id"), nullable=False)
+    lesson_id = Column(Integer, ForeignKey("Lessons.id"), nullable=False, index=True)
     title = Column(String, nullable=False)
     type = Column(String)
     content = Column(String)
@@ -38,68 +54,198 @@ class Exercise(ExerciseBase):
         orm_mode = True
 
 
+class ExerciseBulkItem(ExerciseCreate):
+    id: Optional[int] = None
+
+
+# PATCH body: only the fields sent are written
+class ExercisePatch(BaseModel):
+    lesson_id: Optional[int] = None
+    title: Optional[str] = None
+    type: Optional[str] = None
+    content: Optional[str] = None
+
+
+class ExerciseFilterParams(PageParams):
+    lesson_id: Optional[int] = None
+    type: Optional[str] = None
+
+
+exercise_adapter = TypeAdapter(Exercise)
+exercise_columns = schema_columns(ExerciseModel, Exercise)
+
+
+# Cache tags dropped when an exercise of the given lesson changes
+def exercise_tags(exercise_id: int, *lesson_ids: int):
+    return ["exercises", f"exercises:{exercise_id}"] + [
+        f"exercises:lesson:{lesson_id}" for lesson_id in lesson_ids
+    ]
+
+
 # Get all exercises by lesson_id
 @router.get("/exercises/by-lesson/{lesson_id}", response_model=List[Exercise])
-async def get_exercises_by_lesson(lesson_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(ExerciseModel).where(ExerciseModel.lesson_id == lesson_id)
-    )
-    exercises = result.scalars().all()
-    return exercises
+async def get_exercises_by_lesson(
+    lesson_id: int,
+    request: Request,
+    params: Annotated[PageParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Exercises"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        stmt = select(*exercise_columns).where(ExerciseModel.lesson_id == lesson_id)
+        return await fetch_page(
+            db, ExerciseModel, exercise_columns, params, response, stmt
+        )
+
+    tags = ["exercises:by-lesson", f"exercises:lesson:{lesson_id}"]
+    return await cached_json(request, response, tags, None, load)
 
 
 @router.get("/exercises", response_model=List[Exercise])
-async def get_exercises(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(ExerciseModel))
-    exercises = result.scalars().all()
-    return exercises
+async def get_exercises(
+    request: Request,
+    params: Annotated[ExerciseFilterParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Exercises"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        return await fetch_page(db, ExerciseModel, exercise_columns, params, response)
+
+    tags = ["exercises"]
+    return await cached_json(request, response, tags, None, load)
+
+
+# Many exercises by id in one query: /exercises/batch?ids=3&ids=1. Items keep
+# the request order; ids with no exercise are listed in `missing`.
+@router.get("/exercises/batch", response_model=BatchResult[Exercise])
+async def get_exercises_batch(
+    request: Request,
+    ids: Annotated[List[int], Query(min_length=1, max_length=MAX_BATCH_IDS)],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Exercises"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        return await fetch_by_ids(db, ExerciseModel, exercise_columns, ids)
+
+    # Every exercise write drops "exercises", including creates that fill a missing id
+    return await cached_json(request, response, ["exercises"], None, load)
 
 
 @router.get("/exercises/{exercise_id}", response_model=Exercise)
-async def get_exercise(exercise_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(ExerciseModel).where(ExerciseModel.id == exercise_id)
-    )
-    exercise = result.scalar_one_or_none()
-    if exercise is None:
-        raise HTTPException(status_code=404, detail="Exercise not found")
-    return exercise
+async def get_exercise(
+    exercise_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Exercises"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        result = await db.execute(
+            select(ExerciseModel).where(ExerciseModel.id == exercise_id)
+        )
+        exercise = result.scalar_one_or_none()
+        if exercise is None:
+            raise HTTPException(status_code=404, detail="Exercise not found")
+        return exercise
+
+    tags = [f"exercises:{exercise_id}"]
+    return await cached_json(request, response, tags, exercise_adapter, load)
 
 
 @router.post("/exercises", response_model=Exercise, status_code=status.HTTP_201_CREATED)
-async def create_exercise(exercise: ExerciseCreate, db: AsyncSession = Depends(get_db)):
-    db_exercise = ExerciseModel(**exercise.dict())
-    db.add(db_exercise)
-    await db.commit()
-    await db.refresh(db_exercise)
+async def create_exercise(exercise: ExerciseCreate):
+    async def write(db: AsyncSession):
+        db_exercise = ExerciseModel(**exercise.dict())
+        db.add(db_exercise)
+        await db.flush()
+        return db_exercise
+
+    db_exercise = await run_write(write)
+    await response_cache.invalidate(
+        *exercise_tags(db_exercise.id, db_exercise.lesson_id)
+    )
+    await table_versions.bump("Exercises")
     return db_exercise
 
 
-@router.put("/exercises/{exercise_id}", response_model=Exercise)
-async def update_exercise(
-    exercise_id: int, exercise: ExerciseCreate, db: AsyncSession = Depends(get_db)
+# Insert or update (by id) many exercises in one transaction
+@router.post("/exercises/bulk", response_model=BulkResult[Exercise])
+async def bulk_upsert_exercises(
+    exercises: Annotated[List[ExerciseBulkItem], Body(max_length=MAX_BULK_ITEMS)],
 ):
-    result = await db.execute(
-        select(ExerciseModel).where(ExerciseModel.id == exercise_id)
+    rows = [exercise.dict() for exercise in exercises]
+
+    async def write(db: AsyncSession):
+        return await bulk_upsert(db, ExerciseModel, rows, ["id"])
+
+    items, errors = await run_write(write)
+    # Updated rows may have moved between lessons, so drop every by-lesson page
+    await response_cache.invalidate(
+        "exercises",
+        "exercises:by-lesson",
+        *(f"exercises:{item.id}" for item in items),
     )
-    db_exercise = result.scalar_one_or_none()
-    if db_exercise is None:
-        raise HTTPException(status_code=404, detail="Exercise not found")
-    for key, value in exercise.dict().items():
-        setattr(db_exercise, key, value)
-    await db.commit()
-    await db.refresh(db_exercise)
-    return db_exercise
+    await table_versions.bump("Exercises")
+    return {"items": items, "errors": errors}
+
+
+# Write `values` into one exercise with a single UPDATE ... RETURNING.
+# The previous lesson_id is not returned, so moving an exercise to another
+# lesson drops every by-lesson page, as bulk upserts do.
+async def write_exercise(exercise_id: int, values: dict):
+    async def write(db: AsyncSession):
+        exercise = await update_returning(
+            db, ExerciseModel, exercise_columns, exercise_id, values
+        )
+        if exercise is None:
+            raise HTTPException(status_code=404, detail="Exercise not found")
+        return exercise
+
+    exercise = await run_write(write)
+    tags = exercise_tags(exercise_id, exercise["lesson_id"])
+    if "lesson_id" in values:
+        tags.append("exercises:by-lesson")
+    await response_cache.invalidate(*tags)
+    await table_versions.bump("Exercises")
+    return exercise
+
+
+@router.put("/exercises/{exercise_id}", response_model=Exercise)
+async def update_exercise(exercise_id: int, exercise: ExerciseCreate):
+    return await write_exercise(exercise_id, exercise.dict())
+
+
+@router.patch("/exercises/{exercise_id}", response_model=Exercise)
+async def patch_exercise(exercise_id: int, exercise: ExercisePatch):
+    return await write_exercise(exercise_id, patch_values(exercise, ExerciseModel))
 
 
 @router.delete("/exercises/{exercise_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_exercise(exercise_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(ExerciseModel).where(ExerciseModel.id == exercise_id)
-    )
-    db_exercise = result.scalar_one_or_none()
-    if db_exercise is None:
-        raise HTTPException(status_code=404, detail="Exercise not found")
-    await db.delete(db_exercise)
-    await db.commit()
+async def delete_exercise(exercise_id: int):
+    async def write(db: AsyncSession):
+        deleted = await delete_returning(
+            db, ExerciseModel, exercise_id, ExerciseModel.lesson_id
+        )
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Exercise not found")
+        return deleted.lesson_id
+
+    lesson_id = await run_write(write)
+    await response_cache.invalidate(*exercise_tags(exercise_id, lesson_id))
+    await table_versions.bump("Exercises")
     return None
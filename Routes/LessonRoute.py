@@ -1,10 +1,27 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import (
+    APIRouter,
+    Body,
+    HTTPException,
+    status,
+    Depends,
+    Query,
+    Request,
+    Response,
+)
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, TypeAdapter
 from sqlalchemy import Column, Integer, String
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database import Base, get_db
+from cache import cached_json, response_cache
+from batch import MAX_BATCH_IDS, BatchResult, fetch_by_ids
+from bulk import MAX_BULK_ITEMS, BulkResult, bulk_upsert
+from database import Base, get_db, run_write
+from versioning import conditional_get, table_versions
+from pagination import PageParams, fetch_page
+from returning import delete_returning, patch_values, update_returning
+from search import SearchParams, search_page
+from serialization import schema_columns
 
 router = APIRouter()
 
@@ -42,52 +59,176 @@ class Lesson(LessonBase):
         orm_mode = True
 
 
+class LessonBulkItem(LessonCreate):
+    id: Optional[int] = None
+
+
+# PATCH body: only the fields sent are written
+class LessonPatch(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    level: Optional[str] = None
+    media_id: Optional[str] = None
+    lesson_link: Optional[str] = None
+    type: Optional[str] = None
+
+
+class LessonFilterParams(PageParams):
+    level: Optional[str] = None
+    type: Optional[str] = None
+
+
+lesson_adapter = TypeAdapter(Lesson)
+lesson_columns = schema_columns(LessonModel, Lesson)
+
+
 @router.get("/lessons", response_model=List[Lesson])
-async def get_lessons(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(LessonModel))
-    lessons = result.scalars().all()
-    return lessons
+async def get_lessons(
+    request: Request,
+    params: Annotated[LessonFilterParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Lessons"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        return await fetch_page(db, LessonModel, lesson_columns, params, response)
+
+    return await cached_json(request, response, ["lessons"], None, load)
+
+
+# Full-text search over title and description; every word must match and the
+# last one also matches as a prefix. Best matches first.
+@router.get("/lessons/search", response_model=List[Lesson])
+async def search_lessons(
+    request: Request,
+    params: Annotated[SearchParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Lessons"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        return await search_page(
+            db, LessonModel, lesson_columns, "LessonsSearch", params, response
+        )
+
+    return await cached_json(request, response, ["lessons"], None, load)
+
+
+# Many lessons by id in one query: /lessons/batch?ids=3&ids=1. Items keep
+# the request order; ids with no lesson are listed in `missing`.
+@router.get("/lessons/batch", response_model=BatchResult[Lesson])
+async def get_lessons_batch(
+    request: Request,
+    ids: Annotated[List[int], Query(min_length=1, max_length=MAX_BATCH_IDS)],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Lessons"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        return await fetch_by_ids(db, LessonModel, lesson_columns, ids)
+
+    # Every lesson write drops "lessons", including creates that fill a missing id
+    return await cached_json(request, response, ["lessons"], None, load)
 
 
 @router.get("/lessons/{lesson_id}", response_model=Lesson)
-async def get_lesson(lesson_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(LessonModel).where(LessonModel.id == lesson_id))
-    lesson = result.scalar_one_or_none()
-    if lesson is None:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    return lesson
+async def get_lesson(
+    lesson_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Lessons"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        result = await db.execute(
+            select(LessonModel).where(LessonModel.id == lesson_id)
+        )
+        lesson = result.scalar_one_or_none()
+        if lesson is None:
+            raise HTTPException(status_code=404, detail="Lesson not found")
+        return lesson
+
+    tags = [f"lessons:{lesson_id}"]
+    return await cached_json(request, response, tags, lesson_adapter, load)
 
 
 @router.post("/lessons", response_model=Lesson, status_code=status.HTTP_201_CREATED)
-async def create_lesson(lesson: LessonCreate, db: AsyncSession = Depends(get_db)):
-    db_lesson = LessonModel(**lesson.dict())
-    db.add(db_lesson)
-    await db.commit()
-    await db.refresh(db_lesson)
+async def create_lesson(lesson: LessonCreate):
+    async def write(db: AsyncSession):
+        db_lesson = LessonModel(**lesson.dict())
+        db.add(db_lesson)
+        await db.flush()
+        return db_lesson
+
+    db_lesson = await run_write(write)
+    await response_cache.invalidate("lessons")
+    await table_versions.bump("Lessons")
     return db_lesson
 
 
-@router.put("/lessons/{lesson_id}", response_model=Lesson)
-async def update_lesson(
-    lesson_id: int, lesson: LessonCreate, db: AsyncSession = Depends(get_db)
+# Insert or update (by id) many lessons in one transaction
+@router.post("/lessons/bulk", response_model=BulkResult[Lesson])
+async def bulk_upsert_lessons(
+    lessons: Annotated[List[LessonBulkItem], Body(max_length=MAX_BULK_ITEMS)],
 ):
-    result = await db.execute(select(LessonModel).where(LessonModel.id == lesson_id))
-    db_lesson = result.scalar_one_or_none()
-    if db_lesson is None:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    for key, value in lesson.dict().items():
-        setattr(db_lesson, key, value)
-    await db.commit()
-    await db.refresh(db_lesson)
-    return db_lesson
+    rows = [lesson.dict() for lesson in lessons]
+
+    async def write(db: AsyncSession):
+        return await bulk_upsert(db, LessonModel, rows, ["id"])
+
+    items, errors = await run_write(write)
+    await response_cache.invalidate(
+        "lessons", *(f"lessons:{item.id}" for item in items)
+    )
+    await table_versions.bump("Lessons")
+    return {"items": items, "errors": errors}
+
+
+# Write `values` into one lesson with a single UPDATE ... RETURNING
+async def write_lesson(lesson_id: int, values: dict):
+    async def write(db: AsyncSession):
+        lesson = await update_returning(
+            db, LessonModel, lesson_columns, lesson_id, values
+        )
+        if lesson is None:
+            raise HTTPException(status_code=404, detail="Lesson not found")
+        return lesson
+
+    lesson = await run_write(write)
+    await response_cache.invalidate("lessons", f"lessons:{lesson_id}")
+    await table_versions.bump("Lessons")
+    return lesson
+
+
+@router.put("/lessons/{lesson_id}", response_model=Lesson)
+async def update_lesson(lesson_id: int, lesson: LessonCreate):
+    return await write_lesson(lesson_id, lesson.dict())
+
+
+@router.patch("/lessons/{lesson_id}", response_model=Lesson)
+async def patch_lesson(lesson_id: int, lesson: LessonPatch):
+    return await write_lesson(lesson_id, patch_values(lesson, LessonModel))
 
 
 @router.delete("/lessons/{lesson_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_lesson(lesson_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(LessonModel).where(LessonModel.id == lesson_id))
-    db_lesson = result.scalar_one_or_none()
-    if db_lesson is None:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    await db.delete(db_lesson)
-    await db.commit()
+async def delete_lesson(lesson_id: int):
+    async def write(db: AsyncSession):
+        if await delete_returning(db, LessonModel, lesson_id) is None:
+            raise HTTPException(status_code=404, detail="Lesson not found")
+
+    await run_write(write)
+    await response_cache.invalidate("lessons", f"lessons:{lesson_id}")
+    await table_versions.bump("Lessons")
     return None
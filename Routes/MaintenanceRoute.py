@@ -0,0 +1,59 @@
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from typing import List, Optional
+from pydantic import BaseModel
+from maintenance import JOBS, scheduler
+
+router = APIRouter()
+
+
+# Pydantic schemas
+class MaintenanceRun(BaseModel):
+    job: str
+    trigger: str
+    status: str
+    queued_at: str
+    started_at: Optional[str] = None
+    duration_ms: Optional[float] = None
+    details: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class MaintenanceJob(BaseModel):
+    name: str
+    interval_seconds: Optional[float] = None
+    next_run_in_seconds: Optional[float] = None
+    running: bool
+    last_run: Optional[MaintenanceRun] = None
+
+
+@router.get("/maintenance/jobs", response_model=List[MaintenanceJob])
+async def get_maintenance_jobs():
+    return scheduler.jobs()
+
+
+# Most recent first
+@router.get("/maintenance/runs", response_model=List[MaintenanceRun])
+async def get_maintenance_runs(limit: int = Query(20, ge=1, le=100)):
+    return list(scheduler.history)[:limit]
+
+
+# Start a job now. Returns at once with the queued run (202), or with the
+# finished run when wait=true. A job that is already running is not started
+# again; its current run is returned.
+@router.post(
+    "/maintenance/jobs/{name}/run",
+    response_model=MaintenanceRun,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def run_maintenance_job(name: str, response: Response, wait: bool = False):
+    if name not in JOBS:
+        raise HTTPException(status_code=404, detail="Maintenance job not found")
+    if not scheduler.available:
+        raise HTTPException(
+            status_code=503, detail="Maintenance needs a file-backed SQLite database"
+        )
+    record = scheduler.trigger(name)
+    if wait:
+        await scheduler.wait(name)
+        response.status_code = status.HTTP_200_OK
+    return record
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from metrics import PROMETHEUS_CONTENT_TYPE, metrics
+
+router = APIRouter()
+
+
+# Prometheus scrape target
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,10 +1,28 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Optional
+import asyncio
+from fastapi import (
+    APIRouter,
+    Body,
+    HTTPException,
+    status,
+    Depends,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from typing import Annotated, List, Optional
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database import Base, get_db
+from bulk import MAX_BULK_ITEMS, BulkResult, bulk_upsert
+from database import Base, SessionLocal, get_db, run_write
+from versioning import conditional_get, table_versions
+from pagination import TimestampPageParams, fetch_page
+from presence import ROOM_GONE_CLOSE, room_registry
+from returning import delete_returning, patch_values, update_returning
+from serialization import json_response, schema_columns
 from datetime import datetime
 
 router = APIRouter()
@@ -15,9 +33,13 @@ class PracticeRoomModel(Base):
     __tablename__ = "PracticeRooms"
     id = Column(Integer, primary_key=True, index=True)
     room_name = Column(String, nullable=False)
-    host_user_id = Column(Integer, ForeignKey("Users.id"))
+    host_user_id = Column(Integer, ForeignKey("Users.id"), index=True)
     instrument = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# Expression index backing the case-insensitive by-instrument lookup
+Index("ix_PracticeRooms_lower_instrument", func.lower(PracticeRoomModel.instrument))
 
 
 # Pydantic schemas
@@ -39,24 +61,71 @@ class PracticeRoom(PracticeRoomBase):
         orm_mode = True
 
 
+practice_room_columns = schema_columns(PracticeRoomModel, PracticeRoom)
+
+
+class PracticeRoomBulkItem(PracticeRoomCreate):
+    id: Optional[int] = None
+
+
+# PATCH body: only the fields sent are written
+class PracticeRoomPatch(BaseModel):
+    room_name: Optional[str] = None
+    host_user_id: Optional[int] = None
+    instrument: Optional[str] = None
+
+
+class PracticeRoomFilterParams(TimestampPageParams):
+    host_user_id: Optional[int] = None
+    instrument: Optional[str] = None
+
+
 @router.get("/practice-rooms", response_model=List[PracticeRoom])
-async def get_practice_rooms(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(PracticeRoomModel))
-    rooms = result.scalars().all()
-    return rooms
+async def get_practice_rooms(
+    request: Request,
+    params: Annotated[PracticeRoomFilterParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["PracticeRooms"])
+    if not_modified is not None:
+        return not_modified
+    rows = await fetch_page(
+        db, PracticeRoomModel, practice_room_columns, params, response
+    )
+    return json_response(rows, response)
 
 
 @router.get("/practice-rooms/by-user/{user_id}", response_model=List[PracticeRoom])
-async def get_practice_rooms_by_user(user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(PracticeRoomModel).where(PracticeRoomModel.host_user_id == user_id)
+async def get_practice_rooms_by_user(
+    user_id: int,
+    request: Request,
+    params: Annotated[TimestampPageParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["PracticeRooms"])
+    if not_modified is not None:
+        return not_modified
+    stmt = select(*practice_room_columns).where(
+        PracticeRoomModel.host_user_id == user_id
+    )
+    rows = await fetch_page(
+        db, PracticeRoomModel, practice_room_columns, params, response, stmt
     )
-    rooms = result.scalars().all()
-    return rooms
+    return json_response(rows, response)
 
 
 @router.get("/practice-rooms/{room_id}", response_model=PracticeRoom)
-async def get_practice_room(room_id: int, db: AsyncSession = Depends(get_db)):
+async def get_practice_room(
+    room_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["PracticeRooms"])
+    if not_modified is not None:
+        return not_modified
     result = await db.execute(
         select(PracticeRoomModel).where(PracticeRoomModel.id == room_id)
     )
@@ -70,55 +139,143 @@ async def get_practice_room(room_id: int, db: AsyncSession = Depends(get_db)):
     "/practice-rooms/by-instrument/{instrument}", response_model=List[PracticeRoom]
 )
 async def get_practice_rooms_by_instrument(
-    instrument: str, db: AsyncSession = Depends(get_db)
+    instrument: str,
+    request: Request,
+    params: Annotated[TimestampPageParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(
-        select(PracticeRoomModel).where(
-            func.lower(PracticeRoomModel.instrument) == instrument.lower()
-        )
+    not_modified = conditional_get(request, response, ["PracticeRooms"])
+    if not_modified is not None:
+        return not_modified
+    stmt = select(*practice_room_columns).where(
+        func.lower(PracticeRoomModel.instrument) == instrument.lower()
+    )
+    rows = await fetch_page(
+        db, PracticeRoomModel, practice_room_columns, params, response, stmt
     )
-    rooms = result.scalars().all()
-    return rooms
+    return json_response(rows, response)
 
 
 @router.post(
     "/practice-rooms", response_model=PracticeRoom, status_code=status.HTTP_201_CREATED
 )
-async def create_practice_room(
-    room: PracticeRoomCreate, db: AsyncSession = Depends(get_db)
-):
-    db_room = PracticeRoomModel(**room.dict())
-    db.add(db_room)
-    await db.commit()
-    await db.refresh(db_room)
+async def create_practice_room(room: PracticeRoomCreate):
+    async def write(db: AsyncSession):
+        db_room = PracticeRoomModel(**room.dict())
+        db.add(db_room)
+        await db.flush()
+        return db_room
+
+    db_room = await run_write(write)
+    await table_versions.bump("PracticeRooms")
     return db_room
 
 
-@router.put("/practice-rooms/{room_id}", response_model=PracticeRoom)
-async def update_practice_room(
-    room_id: int, room: PracticeRoomCreate, db: AsyncSession = Depends(get_db)
+# Insert or update (by id) many practice rooms in one transaction
+@router.post("/practice-rooms/bulk", response_model=BulkResult[PracticeRoom])
+async def bulk_upsert_practice_rooms(
+    rooms: Annotated[List[PracticeRoomBulkItem], Body(max_length=MAX_BULK_ITEMS)],
 ):
-    result = await db.execute(
-        select(PracticeRoomModel).where(PracticeRoomModel.id == room_id)
-    )
-    db_room = result.scalar_one_or_none()
-    if db_room is None:
-        raise HTTPException(status_code=404, detail="Practice room not found")
-    for key, value in room.dict().items():
-        setattr(db_room, key, value)
-    await db.commit()
-    await db.refresh(db_room)
-    return db_room
+    rows = [room.dict() for room in rooms]
+
+    async def write(db: AsyncSession):
+        return await bulk_upsert(db, PracticeRoomModel, rows, ["id"])
+
+    items, errors = await run_write(write)
+    await table_versions.bump("PracticeRooms")
+    return {"items": items, "errors": errors}
+
+
+# Write `values` into one room with a single UPDATE ... RETURNING
+async def write_practice_room(room_id: int, values: dict):
+    async def write(db: AsyncSession):
+        room = await update_returning(
+            db, PracticeRoomModel, practice_room_columns, room_id, values
+        )
+        if room is None:
+            raise HTTPException(status_code=404, detail="Practice room not found")
+        return room
+
+    room = await run_write(write)
+    await table_versions.bump("PracticeRooms")
+    return room
+
+
+@router.put("/practice-rooms/{room_id}", response_model=PracticeRoom)
+async def update_practice_room(room_id: int, room: PracticeRoomCreate):
+    return await write_practice_room(room_id, room.dict())
+
+
+@router.patch("/practice-rooms/{room_id}", response_model=PracticeRoom)
+async def patch_practice_room(room_id: int, room: PracticeRoomPatch):
+    return await write_practice_room(room_id, patch_values(room, PracticeRoomModel))
 
 
 @router.delete("/practice-rooms/{room_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_practice_room(room_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(PracticeRoomModel).where(PracticeRoomModel.id == room_id)
-    )
-    db_room = result.scalar_one_or_none()
-    if db_room is None:
-        raise HTTPException(status_code=404, detail="Practice room not found")
-    await db.delete(db_room)
-    await db.commit()
+async def delete_practice_room(room_id: int):
+    async def write(db: AsyncSession):
+        if await delete_returning(db, PracticeRoomModel, room_id) is None:
+            raise HTTPException(status_code=404, detail="Practice room not found")
+
+    await run_write(write)
+    await table_versions.bump("PracticeRooms")
+    room_registry.close_room(room_id)
     return None
+
+
+# Connection counts and message totals for this worker
+@router.get("/practice-rooms/presence/stats")
+async def get_presence_stats():
+    return room_registry.stats()
+
+
+# Who is connected to a room right now, served from memory
+@router.get("/practice-rooms/{room_id}/presence")
+async def get_practice_room_presence(room_id: int):
+    members = room_registry.members(room_id)
+    return {"room_id": room_id, "members": members}
+
+
+async def load_room_exists(room_id: int) -> bool:
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(PracticeRoomModel.id).where(PracticeRoomModel.id == room_id)
+        )
+        return result.scalar_one_or_none() is not None
+
+
+# Sockets arriving together for a room nobody is in yet share one lookup
+room_checks = {}
+
+
+async def room_exists(room_id: int) -> bool:
+    check = room_checks.get(room_id)
+    if check is None:
+        check = asyncio.ensure_future(load_room_exists(room_id))
+        room_checks[room_id] = check
+        check.add_done_callback(lambda _: room_checks.pop(room_id, None))
+    return await asyncio.shield(check)
+
+
+# Presence, chat and metronome sync for one room. The database is only read
+# to check that the room exists when its first socket connects; everything
+# after that goes through the in-memory registry.
+@router.websocket("/practice-rooms/{room_id}/ws")
+async def practice_room_socket(websocket: WebSocket, room_id: int, user_id: int):
+    if not room_registry.is_live(room_id) and not await room_exists(room_id):
+        await websocket.close(code=ROOM_GONE_CLOSE)
+        return
+
+    await websocket.accept()
+    conn = room_registry.join(websocket, room_id, user_id)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            room_registry.receive(conn, message.get("text"))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        room_registry.leave(conn)
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import List, Optional
+from pydantic import BaseModel
+from recommend import (
+    MAX_RECOMMENDATIONS,
+    ready_timeout,
+    recommendations_enabled,
+    recommender,
+)
+from serialization import json_response
+
+router = APIRouter()
+
+
+# Pydantic schemas
+class Recommendation(BaseModel):
+    lesson_id: int
+    score: float
+    title: Optional[str] = None
+    level: Optional[str] = None
+    type: Optional[str] = None
+
+
+# Lessons to practise next: ones not started yet, ranked by how often they are
+# completed together with the user's completed lessons. Answered from the
+# in-memory model (recommend.py), which trails writes by up to
+# RECOMMEND_REFRESH_SECONDS. Users with no completions get the most completed.
+# 503 while the first build has not finished within
+# RECOMMEND_READY_TIMEOUT_SECONDS or has failed.
+@router.get("/users/{user_id}/recommendations", response_model=List[Recommendation])
+async def get_recommendations(
+    user_id: int,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_RECOMMENDATIONS),
+    level: Optional[str] = None,
+    type: Optional[str] = None,
+):
+    if not recommendations_enabled:
+        raise HTTPException(status_code=503, detail="Recommendations are disabled")
+    if not await recommender.wait_ready(ready_timeout):
+        raise HTTPException(status_code=503, detail="Recommendations are not ready")
+    items = recommender.recommend(user_id, limit, level, type)
+    return json_response(items, response)
@@ -1,10 +1,28 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import (
+    APIRouter,
+    Body,
+    HTTPException,
+    status,
+    Depends,
+    Query,
+    Request,
+    Response,
+)
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, TypeAdapter
 from sqlalchemy import Column, Integer, String
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database import Base, get_db
+from cache import cached_json, response_cache
+from batch import MAX_BATCH_IDS, BatchResult, fetch_by_ids
+from bulk import MAX_BULK_ITEMS, BulkResult, bulk_upsert
+from database import Base, get_db, run_write
+from export import ExportFormat, export_response
+from versioning import conditional_get, table_versions
+from pagination import PageParams, fetch_page
+from returning import delete_returning, patch_values, update_returning
+from search import SearchParams, search_page
+from serialization import schema_columns
 
 router = APIRouter()
 
@@ -40,52 +58,176 @@ class Song(SongBase):
         orm_mode = True
 
 
+class SongBulkItem(SongCreate):
+    id: Optional[int] = None
+
+
+# PATCH body: only the fields sent are written
+class SongPatch(BaseModel):
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    level: Optional[str] = None
+    sheet_url: Optional[str] = None
+    video_id: Optional[str] = None
+
+
+class SongFilterParams(PageParams):
+    artist: Optional[str] = None
+    level: Optional[str] = None
+
+
+song_adapter = TypeAdapter(Song)
+song_columns = schema_columns(SongModel, Song)
+
+
 @router.get("/songs", response_model=List[Song])
-async def get_songs(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(SongModel))
-    songs = result.scalars().all()
-    return songs
+async def get_songs(
+    request: Request,
+    params: Annotated[SongFilterParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Songs"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        return await fetch_page(db, SongModel, song_columns, params, response)
+
+    return await cached_json(request, response, ["songs"], None, load)
+
+
+# Stream the whole table as NDJSON (default) or a chunked JSON array
+@router.get("/songs/export")
+async def export_songs(format: ExportFormat = "ndjson"):
+    return export_response(SongModel, format)
+
+
+# Full-text search over title and artist; every word must match and the
+# last one also matches as a prefix. Best matches first.
+@router.get("/songs/search", response_model=List[Song])
+async def search_songs(
+    request: Request,
+    params: Annotated[SearchParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Songs"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        return await search_page(
+            db, SongModel, song_columns, "SongsSearch", params, response
+        )
+
+    return await cached_json(request, response, ["songs"], None, load)
+
+
+# Many songs by id in one query: /songs/batch?ids=3&ids=1. Items keep
+# the request order; ids with no song are listed in `missing`.
+@router.get("/songs/batch", response_model=BatchResult[Song])
+async def get_songs_batch(
+    request: Request,
+    ids: Annotated[List[int], Query(min_length=1, max_length=MAX_BATCH_IDS)],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Songs"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        return await fetch_by_ids(db, SongModel, song_columns, ids)
+
+    # Every song write drops "songs", including creates that fill a missing id
+    return await cached_json(request, response, ["songs"], None, load)
 
 
 @router.get("/songs/{song_id}", response_model=Song)
-async def get_song(song_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(SongModel).where(SongModel.id == song_id))
-    song = result.scalar_one_or_none()
-    if song is None:
-        raise HTTPException(status_code=404, detail="Song not found")
-    return song
+async def get_song(
+    song_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["Songs"])
+    if not_modified is not None:
+        return not_modified
+
+    async def load():
+        result = await db.execute(select(SongModel).where(SongModel.id == song_id))
+        song = result.scalar_one_or_none()
+        if song is None:
+            raise HTTPException(status_code=404, detail="Song not found")
+        return song
+
+    return await cached_json(
+        request, response, [f"songs:{song_id}"], song_adapter, load
+    )
 
 
 @router.post("/songs", response_model=Song, status_code=status.HTTP_201_CREATED)
-async def create_song(song: SongCreate, db: AsyncSession = Depends(get_db)):
-    db_song = SongModel(**song.dict())
-    db.add(db_song)
-    await db.commit()
-    await db.refresh(db_song)
+async def create_song(song: SongCreate):
+    async def write(db: AsyncSession):
+        db_song = SongModel(**song.dict())
+        db.add(db_song)
+        await db.flush()
+        return db_song
+
+    db_song = await run_write(write)
+    await response_cache.invalidate("songs")
+    await table_versions.bump("Songs")
     return db_song
 
 
-@router.put("/songs/{song_id}", response_model=Song)
-async def update_song(
-    song_id: int, song: SongCreate, db: AsyncSession = Depends(get_db)
+# Insert or update (by id) many songs in one transaction
+@router.post("/songs/bulk", response_model=BulkResult[Song])
+async def bulk_upsert_songs(
+    songs: Annotated[List[SongBulkItem], Body(max_length=MAX_BULK_ITEMS)],
 ):
-    result = await db.execute(select(SongModel).where(SongModel.id == song_id))
-    db_song = result.scalar_one_or_none()
-    if db_song is None:
-        raise HTTPException(status_code=404, detail="Song not found")
-    for key, value in song.dict().items():
-        setattr(db_song, key, value)
-    await db.commit()
-    await db.refresh(db_song)
-    return db_song
+    rows = [song.dict() for song in songs]
+
+    async def write(db: AsyncSession):
+        return await bulk_upsert(db, SongModel, rows, ["id"])
+
+    items, errors = await run_write(write)
+    await response_cache.invalidate("songs", *(f"songs:{item.id}" for item in items))
+    await table_versions.bump("Songs")
+    return {"items": items, "errors": errors}
+
+
+# Write `values` into one song with a single UPDATE ... RETURNING
+async def write_song(song_id: int, values: dict):
+    async def write(db: AsyncSession):
+        song = await update_returning(db, SongModel, song_columns, song_id, values)
+        if song is None:
+            raise HTTPException(status_code=404, detail="Song not found")
+        return song
+
+    song = await run_write(write)
+    await response_cache.invalidate("songs", f"songs:{song_id}")
+    await table_versions.bump("Songs")
+    return song
+
+
+@router.put("/songs/{song_id}", response_model=Song)
+async def update_song(song_id: int, song: SongCreate):
+    return await write_song(song_id, song.dict())
+
+
+@router.patch("/songs/{song_id}", response_model=Song)
+async def patch_song(song_id: int, song: SongPatch):
+    return await write_song(song_id, patch_values(song, SongModel))
 
 
 @router.delete("/songs/{song_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_song(song_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(SongModel).where(SongModel.id == song_id))
-    db_song = result.scalar_one_or_none()
-    if db_song is None:
-        raise HTTPException(status_code=404, detail="Song not found")
-    await db.delete(db_song)
-    await db.commit()
+async def delete_song(song_id: int):
+    async def write(db: AsyncSession):
+        if await delete_returning(db, SongModel, song_id) is None:
+            raise HTTPException(status_code=404, detail="Song not found")
+
+    await run_write(write)
+    await response_cache.invalidate("songs", f"songs:{song_id}")
+    await table_versions.bump("Songs")
     return None
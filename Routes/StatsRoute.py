@@ -0,0 +1,136 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from typing import List, Optional
+from pydantic import BaseModel
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from database import get_db, run_write
+from versioning import conditional_get, table_versions
+from stats import LessonStatsModel, UserStatsModel, refresh_stats
+from Routes.LessonRoute import LessonModel
+from Routes.UserRoute import UserModel
+
+router = APIRouter()
+
+MAX_LEADERBOARD = 100
+
+
+# Pydantic schemas
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: Optional[str] = None
+    completed_count: int
+    progress_count: int
+
+
+class UserStats(BaseModel):
+    user_id: int
+    progress_count: int
+    completed_count: int
+
+
+class LessonFunnel(BaseModel):
+    lesson_id: int
+    title: Optional[str] = None
+    started_count: int
+    completed_count: int
+    completion_rate: float
+
+
+# Top-N users by completed lessons, read in index order from ix_UserStats_leaderboard
+@router.get("/stats/leaderboard", response_model=List[LeaderboardEntry])
+async def get_leaderboard(
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_LEADERBOARD),
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["UserStats", "Users"])
+    if not_modified is not None:
+        return not_modified
+
+    result = await db.execute(
+        select(
+            UserStatsModel.user_id,
+            UserModel.username,
+            UserStatsModel.completed_count,
+            UserStatsModel.progress_count,
+        )
+        .outerjoin(UserModel, UserModel.id == UserStatsModel.user_id)
+        .order_by(UserStatsModel.completed_count.desc(), UserStatsModel.user_id)
+        .limit(limit)
+    )
+    return [
+        {"rank": rank, **row}
+        for rank, row in enumerate(result.mappings().all(), start=1)
+    ]
+
+
+@router.get("/stats/users/{user_id}", response_model=UserStats)
+async def get_user_stats(
+    user_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["UserStats", "Users"])
+    if not_modified is not None:
+        return not_modified
+
+    result = await db.execute(
+        select(
+            UserModel.id,
+            func.coalesce(UserStatsModel.progress_count, 0),
+            func.coalesce(UserStatsModel.completed_count, 0),
+        )
+        .outerjoin(UserStatsModel, UserStatsModel.user_id == UserModel.id)
+        .where(UserModel.id == user_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"user_id": row[0], "progress_count": row[1], "completed_count": row[2]}
+
+
+# Started -> completed funnel for one lesson
+@router.get("/stats/lessons/{lesson_id}", response_model=LessonFunnel)
+async def get_lesson_funnel(
+    lesson_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    not_modified = conditional_get(request, response, ["LessonStats", "Lessons"])
+    if not_modified is not None:
+        return not_modified
+
+    result = await db.execute(
+        select(
+            LessonModel.id,
+            LessonModel.title,
+            func.coalesce(LessonStatsModel.started_count, 0),
+            func.coalesce(LessonStatsModel.completed_count, 0),
+        )
+        .outerjoin(LessonStatsModel, LessonStatsModel.lesson_id == LessonModel.id)
+        .where(LessonModel.id == lesson_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    started, completed = row[2], row[3]
+    return {
+        "lesson_id": row[0],
+        "title": row[1],
+        "started_count": started,
+        "completed_count": completed,
+        "completion_rate": round(completed / started, 4) if started else 0.0,
+    }
+
+
+# Recount every summary row from UserProgress
+@router.post("/stats/rebuild")
+async def rebuild_stats():
+    await run_write(refresh_stats)
+    await table_versions.bump("UserStats", "LessonStats")
+    return {"detail": "Stats rebuilt."}
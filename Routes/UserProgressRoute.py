@@ -1,10 +1,26 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Optional
+from fastapi import APIRouter, Body, HTTPException, status, Depends, Query, Response
+from typing import Annotated, List, Optional
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Boolean, DateTime, ForeignKey, Index, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database import Base, get_db
+from bulk import MAX_BULK_ITEMS, BulkResult, bulk_upsert
+from database import Base, get_db, run_write
+from export import ExportFormat, export_response
+from versioning import table_versions
+from pagination import PageParams, fetch_page
+from returning import delete_returning, patch_values, update_returning
+from serialization import json_response, schema_columns
+from stats import apply_progress_change, refresh_stats
+from sync import (
+    SyncPage,
+    SyncParams,
+    SyncPush,
+    SyncPushResult,
+    changes_since,
+    push_changes,
+)
 from datetime import datetime
 
 router = APIRouter()
@@ -19,6 +35,11 @@ class UserProgressModel(Base):
     completed = Column(Boolean, default=False)
     completed_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index("ix_UserProgress_user_id_lesson_id", "user_id", "lesson_id", unique=True),
+        Index("ix_UserProgress_lesson_id", "lesson_id"),
+    )
+
 
 # Pydantic schemas
 class UserProgressBase(BaseModel):
@@ -39,11 +60,39 @@ class UserProgress(UserProgressBase):
         orm_mode = True
 
 
+# PATCH body: only the fields sent are written
+class UserProgressPatch(BaseModel):
+    user_id: Optional[int] = None
+    lesson_id: Optional[int] = None
+    completed: Optional[bool] = None
+    completed_at: Optional[datetime] = None
+
+
+user_progress_columns = schema_columns(UserProgressModel, UserProgress)
+
+
+class UserProgressFilterParams(PageParams):
+    user_id: Optional[int] = None
+    lesson_id: Optional[int] = None
+    completed: Optional[bool] = None
+
+
 @router.get("/user-progress", response_model=List[UserProgress])
-async def get_user_progresses(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserProgressModel))
-    progresses = result.scalars().all()
-    return progresses
+async def get_user_progresses(
+    params: Annotated[UserProgressFilterParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    rows = await fetch_page(
+        db, UserProgressModel, user_progress_columns, params, response
+    )
+    return json_response(rows, response)
+
+
+# Stream the whole table as NDJSON (default) or a chunked JSON array
+@router.get("/user-progress/export")
+async def export_user_progresses(format: ExportFormat = "ndjson"):
+    return export_response(UserProgressModel, format)
 
 
 # Get progress by user_id and lesson_id
@@ -67,12 +116,17 @@ async def get_progress_by_user_and_lesson(
 
 # Get all progress records by user_id
 @router.get("/user-progress/by-user/{user_id}", response_model=List[UserProgress])
-async def get_progress_by_user(user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(UserProgressModel).where(UserProgressModel.user_id == user_id)
+async def get_progress_by_user(
+    user_id: int,
+    params: Annotated[PageParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    stmt = select(*user_progress_columns).where(UserProgressModel.user_id == user_id)
+    rows = await fetch_page(
+        db, UserProgressModel, user_progress_columns, params, response, stmt
     )
-    progresses = result.scalars().all()
-    return progresses
+    return json_response(rows, response)
 
 
 # Get progress by user_id and lesson_id
@@ -94,6 +148,32 @@ async def get_progress_by_user_and_lesson(
     return progress
 
 
+# Offline sync, pull: the user's progress changes after the `since` token, oldest
+# first, with the token to pass next time. Without a token (or with one from
+# before a reset) it returns the full state and `reset: true`.
+@router.get("/user-progress/sync/{user_id}", response_model=SyncPage)
+async def pull_progress_changes(
+    user_id: int,
+    params: Annotated[SyncParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    page = await changes_since(db, user_id, params)
+    return json_response(page, response)
+
+
+# Offline sync, push: apply a batch of local changes in one transaction,
+# resolving conflicts with server changes made after the client's token
+@router.post("/user-progress/sync/{user_id}", response_model=SyncPushResult)
+async def push_progress_changes(user_id: int, push: SyncPush):
+    async def write(db: AsyncSession):
+        return await push_changes(db, user_id, push)
+
+    result = await run_write(write)
+    await table_versions.bump("UserProgress", "UserStats", "LessonStats")
+    return result
+
+
 @router.get("/user-progress/{progress_id}", response_model=UserProgress)
 async def get_user_progress(progress_id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(
@@ -108,41 +188,131 @@ async def get_user_progress(progress_id: int, db: AsyncSession = Depends(get_db)
 @router.post(
     "/user-progress", response_model=UserProgress, status_code=status.HTTP_201_CREATED
 )
-async def create_user_progress(
-    progress: UserProgressCreate, db: AsyncSession = Depends(get_db)
-):
-    db_progress = UserProgressModel(**progress.dict())
-    db.add(db_progress)
-    await db.commit()
-    await db.refresh(db_progress)
+async def create_user_progress(progress: UserProgressCreate):
+    async def write(db: AsyncSession):
+        db_progress = UserProgressModel(**progress.dict())
+        db.add(db_progress)
+        await db.flush()
+        await apply_progress_change(db, None, db_progress)
+        return db_progress
+
+    try:
+        db_progress = await run_write(write)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=400, detail="Progress for this user and lesson already exists"
+        )
+    await table_versions.bump("UserProgress", "UserStats", "LessonStats")
     return db_progress
 
 
-@router.put("/user-progress/{progress_id}", response_model=UserProgress)
-async def update_user_progress(
-    progress_id: int, progress: UserProgressCreate, db: AsyncSession = Depends(get_db)
+# Insert many progress rows in one transaction, updating existing
+# rows for the same (user_id, lesson_id)
+@router.post("/user-progress/bulk", response_model=BulkResult[UserProgress])
+async def bulk_upsert_user_progress(
+    progresses: Annotated[List[UserProgressCreate], Body(max_length=MAX_BULK_ITEMS)],
 ):
-    result = await db.execute(
-        select(UserProgressModel).where(UserProgressModel.id == progress_id)
+    rows = [progress.dict() for progress in progresses]
+
+    async def write(db: AsyncSession):
+        items, errors = await bulk_upsert(
+            db, UserProgressModel, rows, ["user_id", "lesson_id"]
+        )
+        # Previous values of upserted rows are unknown, so recount the touched keys
+        await refresh_stats(
+            db,
+            user_ids={item.user_id for item in items},
+            lesson_ids={item.lesson_id for item in items},
+        )
+        return items, errors
+
+    items, errors = await run_write(write)
+    await table_versions.bump("UserProgress", "UserStats", "LessonStats")
+    return {"items": items, "errors": errors}
+
+
+# Write `values` into one progress row with a single UPDATE ... RETURNING and
+# keep the stats in step. SQLite's RETURNING only sees the new values, so a
+# `completed` change is made conditional on the old value differing; moving a
+# row to another user or lesson still reads the old keys first.
+async def write_user_progress(progress_id: int, values: dict):
+    async def write(db: AsyncSession):
+        old = None
+        if "user_id" in values or "lesson_id" in values:
+            result = await db.execute(
+                select(
+                    UserProgressModel.user_id,
+                    UserProgressModel.lesson_id,
+                    UserProgressModel.completed,
+                ).where(UserProgressModel.id == progress_id)
+            )
+            old = result.one_or_none()
+            if old is None:
+                raise HTTPException(status_code=404, detail="User progress not found")
+        elif "completed" in values:
+            done = bool(values["completed"])
+            progress = await update_returning(
+                db,
+                UserProgressModel,
+                user_progress_columns,
+                progress_id,
+                values,
+                func.coalesce(UserProgressModel.completed, False) != done,
+            )
+            if progress is not None:
+                old = UserProgressBase(
+                    user_id=progress["user_id"],
+                    lesson_id=progress["lesson_id"],
+                    completed=not done,
+                )
+                await apply_progress_change(db, old, UserProgressBase(**progress))
+                return progress
+        progress = await update_returning(
+            db, UserProgressModel, user_progress_columns, progress_id, values
+        )
+        if progress is None:
+            raise HTTPException(status_code=404, detail="User progress not found")
+        if old is not None:
+            await apply_progress_change(db, old, UserProgressBase(**progress))
+        return progress
+
+    try:
+        progress = await run_write(write)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=400, detail="Progress for this user and lesson already exists"
+        )
+    await table_versions.bump("UserProgress", "UserStats", "LessonStats")
+    return progress
+
+
+@router.put("/user-progress/{progress_id}", response_model=UserProgress)
+async def update_user_progress(progress_id: int, progress: UserProgressCreate):
+    return await write_user_progress(progress_id, progress.dict())
+
+
+@router.patch("/user-progress/{progress_id}", response_model=UserProgress)
+async def patch_user_progress(progress_id: int, progress: UserProgressPatch):
+    return await write_user_progress(
+        progress_id, patch_values(progress, UserProgressModel)
     )
-    db_progress = result.scalar_one_or_none()
-    if db_progress is None:
-        raise HTTPException(status_code=404, detail="User progress not found")
-    for key, value in progress.dict().items():
-        setattr(db_progress, key, value)
-    await db.commit()
-    await db.refresh(db_progress)
-    return db_progress
 
 
 @router.delete("/user-progress/{progress_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user_progress(progress_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(UserProgressModel).where(UserProgressModel.id == progress_id)
-    )
-    db_progress = result.scalar_one_or_none()
-    if db_progress is None:
-        raise HTTPException(status_code=404, detail="User progress not found")
-    await db.delete(db_progress)
-    await db.commit()
+async def delete_user_progress(progress_id: int):
+    async def write(db: AsyncSession):
+        deleted = await delete_returning(
+            db,
+            UserProgressModel,
+            progress_id,
+            UserProgressModel.user_id,
+            UserProgressModel.lesson_id,
+            UserProgressModel.completed,
+        )
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="User progress not found")
+        await apply_progress_change(db, deleted, None)
+
+    await run_write(write)
+    await table_versions.bump("UserProgress", "UserStats", "LessonStats")
     return None
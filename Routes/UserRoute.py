@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Optional
+from fastapi import APIRouter, Body, HTTPException, status, Depends, Query, Response
+from typing import Annotated, List, Optional
 from pydantic import BaseModel
 from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database import Base, get_db
+from batch import MAX_BATCH_IDS, BatchResult, fetch_by_ids
+from bulk import MAX_BULK_ITEMS, BulkResult, bulk_upsert
+from database import Base, get_db, run_write
+from export import ExportFormat, export_response
+from versioning import table_versions
+from pagination import TimestampPageParams, fetch_page
+from returning import delete_returning, patch_values, update_returning
+from serialization import json_response, schema_columns
 from datetime import datetime
 
 router = APIRouter()
@@ -17,7 +25,7 @@ class UserModel(Base):
     username = Column(String, unique=True, nullable=False)
     email = Column(String, unique=True)
     avatar_url = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
 # Pydantic schemas
@@ -39,11 +47,34 @@ class User(UserBase):
         orm_mode = True
 
 
+# PATCH body: only the fields sent are written
+class UserPatch(BaseModel):
+    username: Optional[str] = None
+    email: Optional[str] = None
+    avatar_url: Optional[str] = None
+
+
+user_columns = schema_columns(UserModel, User)
+
+
+class UserFilterParams(TimestampPageParams):
+    username: Optional[str] = None
+
+
 @router.get("/users", response_model=List[User])
-async def get_users(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserModel))
-    users = result.scalars().all()
-    return users
+async def get_users(
+    params: Annotated[UserFilterParams, Query()],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    rows = await fetch_page(db, UserModel, user_columns, params, response)
+    return json_response(rows, response)
+
+
+# Stream the whole table as NDJSON (default) or a chunked JSON array
+@router.get("/users/export")
+async def export_users(format: ExportFormat = "ndjson"):
+    return export_response(UserModel, format)
 
 
 @router.get("/users/by-email/{email}", response_model=User)
@@ -55,6 +86,18 @@ async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     return user
 
 
+# Many users by id in one query: /users/batch?ids=3&ids=1. Items keep the
+# request order; ids with no user are listed in `missing`.
+@router.get("/users/batch", response_model=BatchResult[User])
+async def get_users_batch(
+    ids: Annotated[List[int], Query(min_length=1, max_length=MAX_BATCH_IDS)],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    batch = await fetch_by_ids(db, UserModel, user_columns, ids)
+    return json_response(batch, response)
+
+
 @router.get("/users/{user_id}", response_model=User)
 async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(UserModel).where(UserModel.id == user_id))
@@ -75,39 +118,68 @@ async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
 
 
 @router.post("/users", response_model=User, status_code=status.HTTP_201_CREATED)
-async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
-    db_user = UserModel(**user.dict())
-    db.add(db_user)
+async def create_user(user: UserCreate):
+    async def write(db: AsyncSession):
+        db_user = UserModel(**user.dict())
+        db.add(db_user)
+        await db.flush()
+        return db_user
+
     try:
-        await db.commit()
-    except Exception as e:
-        await db.rollback()
+        db_user = await run_write(write)
+    except IntegrityError:
         raise HTTPException(status_code=400, detail="Username or email already exists")
-    await db.refresh(db_user)
+    await table_versions.bump("Users")
     return db_user
 
 
-@router.put("/users/{user_id}", response_model=User)
-async def update_user(
-    user_id: int, user: UserCreate, db: AsyncSession = Depends(get_db)
+# Insert many users in one transaction, updating existing ones by username
+@router.post("/users/bulk", response_model=BulkResult[User])
+async def bulk_upsert_users(
+    users: Annotated[List[UserCreate], Body(max_length=MAX_BULK_ITEMS)],
 ):
-    result = await db.execute(select(UserModel).where(UserModel.id == user_id))
-    db_user = result.scalar_one_or_none()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    for key, value in user.dict().items():
-        setattr(db_user, key, value)
-    await db.commit()
-    await db.refresh(db_user)
-    return db_user
+    rows = [user.dict() for user in users]
+
+    async def write(db: AsyncSession):
+        return await bulk_upsert(db, UserModel, rows, ["username"])
+
+    items, errors = await run_write(write)
+    await table_versions.bump("Users")
+    return {"items": items, "errors": errors}
+
+
+# Write `values` into one user with a single UPDATE ... RETURNING
+async def write_user(user_id: int, values: dict):
+    async def write(db: AsyncSession):
+        user = await update_returning(db, UserModel, user_columns, user_id, values)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+
+    try:
+        user = await run_write(write)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Username or email already exists")
+    await table_versions.bump("Users")
+    return user
+
+
+@router.put("/users/{user_id}", response_model=User)
+async def update_user(user_id: int, user: UserCreate):
+    return await write_user(user_id, user.dict())
+
+
+@router.patch("/users/{user_id}", response_model=User)
+async def patch_user(user_id: int, user: UserPatch):
+    return await write_user(user_id, patch_values(user, UserModel))
 
 
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserModel).where(UserModel.id == user_id))
-    db_user = result.scalar_one_or_none()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    await db.delete(db_user)
-    await db.commit()
+async def delete_user(user_id: int):
+    async def write(db: AsyncSession):
+        if await delete_returning(db, UserModel, user_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    await run_write(write)
+    await table_versions.bump("Users")
     return None
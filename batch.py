@@ -0,0 +1,29 @@
+from typing import Generic, List, TypeVar
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from serialization import rows_as_dicts
+
+# Ids per batch lookup; they travel as repeated ?ids= query parameters, so this
+# also keeps the URL well under common 8 KiB request line limits
+MAX_BATCH_IDS = 200
+
+T = TypeVar("T")
+
+
+class BatchResult(BaseModel, Generic[T]):
+    items: List[T]
+    missing: List[int]
+
+
+# Look up many rows with one SELECT ... WHERE id IN (...). Items follow the
+# order of `ids` (a repeated id is returned once); ids without a row are listed
+# in `missing`. Returns plain rows, for cached_json or json_response to encode.
+async def fetch_by_ids(db: AsyncSession, model, columns, ids: List[int]):
+    ids = list(dict.fromkeys(ids))
+    result = await db.execute(select(*columns).where(model.id.in_(ids)))
+    found = {row["id"]: row for row in rows_as_dicts(result.all(), columns)}
+    return {
+        "items": [found[row_id] for row_id in ids if row_id in found],
+        "missing": [row_id for row_id in ids if row_id not in found],
+    }
@@ -0,0 +1,88 @@
+"""Compare rows/sec for single-row POSTs against the bulk upsert endpoints.
+
+Boots the app in-process against a temp SQLite file and inserts ROWS
+songs and user-progress rows through both paths.
+
+Usage: python benchmarks/bulk_insert.py [--rows 2000] [--batch 500]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bulk.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+import httpx  # noqa: E402
+from main import app  # noqa: E402
+
+
+def song_rows(count, offset):
+    return [{"title": f"Song {offset + i}", "level": "basic"} for i in range(count)]
+
+
+def progress_rows(count, offset):
+    return [
+        {"user_id": offset + i, "lesson_id": 1, "completed": True} for i in range(count)
+    ]
+
+
+async def single(client, path, rows):
+    start = time.perf_counter()
+    for row in rows:
+        response = await client.post(path, json=row)
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def bulk(client, path, rows, batch):
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch):
+        response = await client.post(path, json=rows[i : i + batch])
+        response.raise_for_status()
+        assert not response.json()["errors"]
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for resource, make_rows in (
+                ("songs", song_rows),
+                ("user-progress", progress_rows),
+            ):
+                path = f"/api/v1/{resource}"
+                single_secs = await single(client, path, make_rows(args.rows, 0))
+                bulk_secs = await bulk(
+                    client, f"{path}/bulk", make_rows(args.rows, args.rows), args.batch
+                )
+                results.append(
+                    {
+                        "resource": resource,
+                        "rows": args.rows,
+                        "single_rows_per_sec": round(args.rows / single_secs, 1),
+                        "bulk_rows_per_sec": round(args.rows / bulk_secs, 1),
+                        "speedup": round(single_secs / bulk_secs, 1),
+                    }
+                )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
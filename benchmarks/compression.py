@@ -0,0 +1,264 @@
+"""Measure response compression: CPU cost against bytes saved.
+
+Seeds a temp copy of store.db with catalog rows shaped like real ones (URLs,
+video ids, sentences), fetches catalog payloads from main.app in-process
+(ASGITransport), then reports:
+
+  * codecs: for each payload, every gzip level and brotli quality in the sweep
+    with compressed size, ratio and median compression time, and
+  * served: per-request latency and bytes on the wire through the app for
+    identity, gzip and br. With the response cache on (default), repeated
+    requests get the precompressed body; --no-cache compresses every response.
+
+brotli is optional; without it the br rows are skipped.
+
+Usage: python benchmarks/compression.py [--rows 5000] [--repeat 20]
+           [--requests 200] [--no-cache] [--output compression.json]
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(WORK_DIR, "compression.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+if "--no-cache" in sys.argv:
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+from compression import brotli  # noqa: E402
+from database import run_write  # noqa: E402
+from main import app  # noqa: E402
+from stats import refresh_stats  # noqa: E402
+
+LESSONS = 200
+WORDS = (
+    "moon river blue night dance love rain city light heart fire road scale chord"
+    " rhythm tempo melody harmony practice finger position major minor"
+).split()
+LEVELS = ["beginner", "intermediate", "advanced"]
+
+# (name, path); the page sizes span the default page to the largest allowed
+PAYLOADS = [
+    ("songs.page_20", "/songs?limit=20"),
+    ("songs.page_100", "/songs"),
+    ("songs.page_500", "/songs?limit=500"),
+    ("lessons.page_100", "/lessons"),
+    ("user_progress.page_500", "/user-progress?limit=500"),
+    ("dashboard", "/users/1/dashboard"),
+    ("songs.export", "/songs/export"),
+]
+# Served through the app; export bodies are streamed and never cached
+SERVED = ["songs.page_100", "songs.page_500", "lessons.page_100"]
+
+GZIP_LEVELS = [1, 6, 9]
+BROTLI_QUALITIES = [1, 4, 6, 9, 11]
+
+
+def video_id(rng):
+    return base64.urlsafe_b64encode(rng.randbytes(8)).decode()[:11]
+
+
+def sentence(rng, words):
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def progress_row(rng, user_id: int, lesson_id: int):
+    if rng.random() < 0.4:
+        return user_id, lesson_id, False, None
+    completed_at = (
+        f"2025-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}"
+        f" {rng.randint(0, 23):02}:{rng.randint(0, 59):02}:00"
+    )
+    return user_id, lesson_id, True, completed_at
+
+
+def seed(rows: int):
+    rng = random.Random(1)
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany(
+        "INSERT INTO Songs (title, artist, level, sheet_url, video_id)"
+        " VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}",
+                f"Artist {rng.randrange(rows // 10 + 1)}",
+                rng.choice(LEVELS),
+                f"https://cdn.example.com/sheets/{i}-{video_id(rng)}.pdf",
+                video_id(rng),
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO Lessons (title, description, level, media_id, lesson_link, type)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (
+                f"Lesson {i}: {rng.choice(WORDS)} {rng.choice(WORDS)}",
+                sentence(rng, rng.randint(12, 40)),
+                rng.choice(LEVELS),
+                video_id(rng),
+                f"https://learn.example.com/lessons/{i}",
+                rng.choice(["theory", "practice", "ear_training"]),
+            )
+            for i in range(LESSONS)
+        ),
+    )
+    (first_user,) = conn.execute(
+        "SELECT COALESCE(MAX(id), 0) + 1 FROM Users"
+    ).fetchone()
+    conn.executemany(
+        "INSERT INTO Users (username, email, avatar_url, created_at)"
+        " VALUES (?, ?, ?, '2025-01-01 00:00:00')",
+        (
+            (
+                f"player{i}",
+                f"player{i}@example.com",
+                f"https://cdn.example.com/a/{i}.png",
+            )
+            for i in range(rows // 20 + 1)
+        ),
+    )
+    (first_lesson,) = conn.execute("SELECT MIN(id) FROM Lessons").fetchone()
+    conn.executemany(
+        "INSERT OR IGNORE INTO UserProgress (user_id, lesson_id, completed,"
+        " completed_at) VALUES (?, ?, ?, ?)",
+        (
+            progress_row(
+                rng, first_user + i // 20, first_lesson + rng.randrange(LESSONS)
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def codecs():
+    yield from (
+        (f"gzip-{level}", lambda body, level=level: gzip.compress(body, level, mtime=0))
+        for level in GZIP_LEVELS
+    )
+    if brotli is not None:
+        yield from (
+            (
+                f"br-{quality}",
+                lambda body, quality=quality: brotli.compress(
+                    body, mode=brotli.MODE_TEXT, quality=quality
+                ),
+            )
+            for quality in BROTLI_QUALITIES
+        )
+
+
+def codec_sweep(body: bytes, repeat: int):
+    results = {}
+    for name, compress in codecs():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compressed = compress(body)
+            times.append(time.perf_counter() - start)
+        seconds = statistics.median(times)
+        results[name] = {
+            "bytes": len(compressed),
+            "ratio": round(len(body) / len(compressed), 2),
+            "ms": round(seconds * 1000, 3),
+            "mb_per_sec": round(len(body) / seconds / 1e6, 1),
+        }
+    return results
+
+
+# Sequential requests, so latency is the app's own cost for each encoding
+async def served(client, path: str, encoding: str, requests: int):
+    latencies, wire = [], 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        request = client.build_request(
+            "GET", path, headers={"Accept-Encoding": encoding}
+        )
+        response = await client.send(request, stream=True)
+        body = b"".join([chunk async for chunk in response.aiter_raw()])
+        await response.aclose()
+        latencies.append((time.perf_counter() - start) * 1000)
+        wire = len(body)
+    return {
+        "content_encoding": response.headers.get("content-encoding", "identity"),
+        "wire_bytes": wire,
+        "p50_ms": round(statistics.median(latencies), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+    }
+
+
+async def run(args):
+    shutil.copy(os.path.join(ROOT, "store.db"), DB_PATH)
+    report = {
+        "rows": args.rows,
+        "response_cache": not args.no_cache,
+        "brotli": brotli is not None,
+        "payloads": {},
+        "served": {},
+    }
+    async with app.router.lifespan_context(app):
+        seed(args.rows)
+        await run_write(refresh_stats)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench/api/v1"
+        ) as client:
+            for name, path in PAYLOADS:
+                response = await client.get(
+                    path, headers={"Accept-Encoding": "identity"}
+                )
+                response.raise_for_status()
+                report["payloads"][name] = {
+                    "bytes": len(response.content),
+                    "codecs": codec_sweep(response.content, args.repeat),
+                }
+
+            encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+            for name in SERVED:
+                path = dict(PAYLOADS)[name]
+                report["served"][name] = {
+                    encoding: await served(client, path, encoding, args.requests)
+                    for encoding in encodings
+                }
+            report["cache"] = (await client.get("/cache/stats")).json()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Measure a thundering herd of identical GETs with and without single-flight.
+
+Boots the app in-process against a temp copy of store.db, gives one lesson
+--exercises exercises, then for each path fires --clients concurrent identical
+requests right after clearing the response cache (as when a lesson is just
+published), --rounds times. Reports per mode the SELECTs executed per burst
+and the burst's p50/p99 latency and wall time.
+
+Usage: python benchmarks/herd.py [--clients 500] [--rounds 5] [--exercises 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(WORK_DIR, "herd.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+import httpx  # noqa: E402
+import singleflight  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from cache import response_cache  # noqa: E402
+from database import read_engine  # noqa: E402
+from main import app  # noqa: E402
+
+PATHS = ["/lessons/{id}", "/exercises/by-lesson/{id}"]
+
+
+def seed(exercises: int) -> int:
+    conn = sqlite3.connect(DB_PATH)
+    (lesson_id,) = conn.execute("SELECT MIN(id) FROM Lessons").fetchone()
+    conn.executemany(
+        "INSERT INTO Exercises (lesson_id, title, type, content)"
+        " VALUES (?, ?, 'practice', ?)",
+        (
+            (lesson_id, f"Exercise {i}", f"Play the scale in position {i}.")
+            for i in range(exercises)
+        ),
+    )
+    conn.commit()
+    conn.close()
+    return lesson_id
+
+
+async def burst(client, path: str, clients: int):
+    async def one():
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+    await response_cache.clear()
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(clients)))
+    return latencies, (time.perf_counter() - start) * 1000
+
+
+async def run(args):
+    shutil.copy(os.path.join(ROOT, "store.db"), DB_PATH)
+    selects = [0]
+
+    def count_selects(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects[0] += 1
+
+    report = {"clients": args.clients, "rounds": args.rounds, "paths": {}}
+    async with app.router.lifespan_context(app):
+        lesson_id = seed(args.exercises)
+        event.listen(read_engine.sync_engine, "before_cursor_execute", count_selects)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench/api/v1"
+        ) as client:
+            for template in PATHS:
+                path = template.format(id=lesson_id)
+                await client.get(path)
+                modes = {}
+                for enabled in (False, True):
+                    singleflight.single_flight_enabled = enabled
+                    latencies, walls, counts = [], [], []
+                    for _ in range(args.rounds):
+                        selects[0] = 0
+                        burst_latencies, wall = await burst(client, path, args.clients)
+                        latencies.extend(burst_latencies)
+                        walls.append(wall)
+                        counts.append(selects[0])
+                    latencies.sort()
+                    modes["single_flight" if enabled else "off"] = {
+                        "selects_per_burst": statistics.fmean(counts),
+                        "p50_ms": round(statistics.median(latencies), 2),
+                        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 2),
+                        "burst_ms": round(statistics.median(walls), 2),
+                    }
+                report["paths"][template] = modes
+        event.remove(read_engine.sync_engine, "before_cursor_execute", count_selects)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--exercises", type=int, default=50)
+    args = parser.parse_args()
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+"""Load test every router in-process and report latency and throughput as JSON.
+
+Boots main.app through httpx.ASGITransport against a temp SQLite file, seeds
+a synthetic dataset sized by --progress-rows (UserProgress rows; the other
+tables scale with it), then runs:
+
+  * one scenario per endpoint (--requests requests each), and
+  * a mixed read/write scenario with weighted endpoints (--mixed-requests),
+
+each with --concurrency concurrent clients. Every scenario reports p50/p95/p99
+latency in ms, requests/sec and error counts. POST /reset-db replaces the
+dataset with the seed data, so it is measured last. Save the output with
+--output and compare runs across commits.
+
+Usage: python benchmarks/load.py [--progress-rows 1000|100000|1000000]
+           [--requests 200] [--mixed-requests 2000] [--concurrency 8]
+           [--no-cache] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LESSONS = 100
+EXERCISES_PER_LESSON = 5
+PROGRESS_PER_USER = 20
+# Ids per request in the batch lookup endpoints
+BATCH_SIZE = 20
+INSTRUMENTS = ["Piano", "Guitar", "Violin", "Drums", "Flute", "Cello"]
+WORDS = "moon river blue night dance love rain city light heart fire road".split()
+
+
+class Dataset:
+    def __init__(self, progress_rows: int):
+        self.progress = progress_rows
+        self.users = max(1, -(-progress_rows // PROGRESS_PER_USER))
+        self.lessons = LESSONS
+        self.exercises = LESSONS * EXERCISES_PER_LESSON
+        self.songs = max(1000, progress_rows // 10)
+        self.rooms = max(10, self.users // 5)
+        # Ids of rows created during the run, for update/delete endpoints
+        self.created = defaultdict(list)
+        self.counter = 0
+        self.progress_counter = 0
+        # Sync token of a client that pulled right after seeding
+        self.sync_token = None
+
+    def next(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    # Separate from next(), so new progress pairs stay unique for as long as
+    # the run creates fewer rows than the seeded ones
+    def next_progress(self) -> int:
+        self.progress_counter += 1
+        return self.progress_counter
+
+    # Seeded progress uses lessons (user + 5j) for j < 20; new progress rows use
+    # (user + 1 + 5j) so creates never collide with seeded or earlier rows
+    def lesson_for(self, user_id: int, j: int, offset: int = 0) -> int:
+        return (user_id + offset + 5 * j) % LESSONS + 1
+
+    def counts(self):
+        return {
+            "users": self.users,
+            "lessons": self.lessons,
+            "exercises": self.exercises,
+            "songs": self.songs,
+            "practice_rooms": self.rooms,
+            "user_progress": self.progress,
+        }
+
+
+def seed(data: Dataset, db_path: str):
+    rng = random.Random(1)
+    conn = sqlite3.connect(db_path)
+    for table in ("UserProgress", "PracticeRooms", "Exercises", "Songs", "Lessons"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("DELETE FROM Users")
+    conn.executemany(
+        "INSERT INTO Users (id, username, email, created_at)"
+        " VALUES (?, ?, ?, '2024-01-01 00:00:00')",
+        ((i, f"user{i}", f"user{i}@example.com") for i in range(1, data.users + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO Lessons (id, title, description, level, type)"
+        " VALUES (?, ?, ?, 'basic', 'theory')",
+        (
+            (i, f"Lesson {i} {rng.choice(WORDS)}", " ".join(rng.choices(WORDS, k=8)))
+            for i in range(1, LESSONS + 1)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO Exercises (lesson_id, title, type) VALUES (?, ?, 'quiz')",
+        ((i % LESSONS + 1, f"Exercise {i}") for i in range(data.exercises)),
+    )
+    conn.executemany(
+        "INSERT INTO Songs (title, artist, level) VALUES (?, ?, 'basic')",
+        (
+            (f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}", f"Artist {i % 500}")
+            for i in range(data.songs)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO PracticeRooms (room_name, host_user_id, instrument, created_at)"
+        " VALUES (?, ?, ?, '2024-01-01 00:00:00')",
+        (
+            (f"Room {i}", i % data.users + 1, INSTRUMENTS[i % len(INSTRUMENTS)])
+            for i in range(data.rooms)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO UserProgress (user_id, lesson_id, completed) VALUES (?, ?, ?)",
+        (
+            (
+                i // PROGRESS_PER_USER + 1,
+                data.lesson_for(i // PROGRESS_PER_USER + 1, i % PROGRESS_PER_USER),
+                rng.random() < 0.6,
+            )
+            for i in range(data.progress)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def seeded_sync_token(db_path: str) -> str:
+    from pagination import encode_cursor
+
+    conn = sqlite3.connect(db_path)
+    (epoch,) = conn.execute("SELECT epoch FROM SyncState WHERE id = 1").fetchone()
+    (seq,) = conn.execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM UserProgressSync"
+    ).fetchone()
+    conn.close()
+    return encode_cursor(epoch, seq)
+
+
+# Each endpoint: name -> (weight in the mixed scenario, request builder).
+# A builder returns (method, path, json body or None), or None to skip this turn.
+# Weight 0 endpoints run only in their own scenario.
+def endpoints(data: Dataset, rng: random.Random):
+    def pick(count):
+        return rng.randint(1, count)
+
+    def new_progress():
+        k = data.next_progress()
+        user_id = k // PROGRESS_PER_USER % data.users + 1
+        lesson_id = data.lesson_for(user_id, k % PROGRESS_PER_USER, offset=1)
+        return {"user_id": user_id, "lesson_id": lesson_id, "completed": False}
+
+    # A user whose PROGRESS_PER_USER seeded rows all exist
+    def seeded_user():
+        return pick(max(1, data.progress // PROGRESS_PER_USER))
+
+    def progress_by_user_lesson():
+        user_id = seeded_user()
+        lesson_id = data.lesson_for(user_id, rng.randrange(PROGRESS_PER_USER))
+        return ("GET", f"/user-progress/by-user-lesson/{user_id}/{lesson_id}", None)
+
+    def update_progress():
+        user_id = seeded_user()
+        body = {
+            "user_id": user_id,
+            "lesson_id": data.lesson_for(user_id, 0),
+            "completed": rng.random() < 0.5,
+        }
+        return ("PUT", f"/user-progress/{(user_id - 1) * PROGRESS_PER_USER + 1}", body)
+
+    def patch_progress():
+        progress_id = (seeded_user() - 1) * PROGRESS_PER_USER + 1
+        body = {"completed": rng.random() < 0.5}
+        return ("PATCH", f"/user-progress/{progress_id}", body)
+
+    # A client that was offline since seeding: pulls what changed since, or
+    # pushes a few completions of its seeded lessons, conflicting with any
+    # server change made meanwhile
+    def sync_pull():
+        query = f"since={data.sync_token}&limit=50"
+        return ("GET", f"/user-progress/sync/{seeded_user()}?{query}", None)
+
+    def sync_push():
+        user_id = seeded_user()
+        js = rng.sample(range(PROGRESS_PER_USER), 3)
+        changes = [
+            {
+                "lesson_id": data.lesson_for(user_id, j),
+                "completed": True,
+                "completed_at": "2024-06-01T12:00:00Z",
+            }
+            for j in js
+        ]
+        body = {"token": data.sync_token, "changes": changes}
+        return ("POST", f"/user-progress/sync/{user_id}", body)
+
+    def create_user():
+        k = data.next()
+        return ("POST", "/users", {"username": f"load{k}", "email": f"load{k}@x.io"})
+
+    # BATCH_SIZE random ids in one batch lookup
+    def batch(path, count):
+        ids = "&".join(f"ids={pick(count)}" for _ in range(BATCH_SIZE))
+        return ("GET", f"{path}/batch?{ids}", None)
+
+    def delete(kind, path):
+        if not data.created[kind]:
+            return None
+        return ("DELETE", f"{path}/{data.created[kind].pop()}", None)
+
+    return {
+        # Reads
+        "songs.list": (4, lambda: ("GET", "/songs?limit=50", None)),
+        "songs.get": (6, lambda: ("GET", f"/songs/{pick(data.songs)}", None)),
+        "songs.search": (
+            2,
+            lambda: ("GET", f"/songs/search?q={rng.choice(WORDS)[:3]}&limit=20", None),
+        ),
+        "songs.batch": (1, lambda: batch("/songs", data.songs)),
+        "songs.export": (0, lambda: ("GET", "/songs/export", None)),
+        "lessons.list": (3, lambda: ("GET", "/lessons?limit=50", None)),
+        "lessons.get": (4, lambda: ("GET", f"/lessons/{pick(LESSONS)}", None)),
+        "lessons.batch": (1, lambda: batch("/lessons", LESSONS)),
+        "lessons.search": (
+            1,
+            lambda: ("GET", f"/lessons/search?q={rng.choice(WORDS)}&limit=20", None),
+        ),
+        "exercises.by_lesson": (
+            3,
+            lambda: ("GET", f"/exercises/by-lesson/{pick(LESSONS)}", None),
+        ),
+        "exercises.get": (
+            2,
+            lambda: ("GET", f"/exercises/{pick(data.exercises)}", None),
+        ),
+        "exercises.batch": (1, lambda: batch("/exercises", data.exercises)),
+        "users.list": (2, lambda: ("GET", "/users?limit=50", None)),
+        "users.get": (4, lambda: ("GET", f"/users/{pick(data.users)}", None)),
+        "users.by_email": (
+            1,
+            lambda: (
+                "GET",
+                f"/users/by-email/user{pick(data.users)}@example.com",
+                None,
+            ),
+        ),
+        "users.batch": (1, lambda: batch("/users", data.users)),
+        "users.export": (0, lambda: ("GET", "/users/export", None)),
+        "user_progress.list": (
+            2,
+            lambda: ("GET", f"/user-progress?lesson_id={pick(LESSONS)}&limit=50", None),
+        ),
+        "user_progress.get": (
+            2,
+            lambda: ("GET", f"/user-progress/{pick(data.progress)}", None),
+        ),
+        "user_progress.by_user": (
+            4,
+            lambda: ("GET", f"/user-progress/by-user/{pick(data.users)}", None),
+        ),
+        "user_progress.by_user_lesson": (3, progress_by_user_lesson),
+        "user_progress.export": (0, lambda: ("GET", "/user-progress/export", None)),
+        "user_progress.sync_pull": (2, sync_pull),
+        # A new device: the user's full state, without a token
+        "user_progress.sync_full": (
+            1,
+            lambda: ("GET", f"/user-progress/sync/{seeded_user()}", None),
+        ),
+        "practice_rooms.list": (1, lambda: ("GET", "/practice-rooms?limit=50", None)),
+        "practice_rooms.get": (
+            2,
+            lambda: ("GET", f"/practice-rooms/{pick(data.rooms)}", None),
+        ),
+        "practice_rooms.by_user": (
+            2,
+            lambda: ("GET", f"/practice-rooms/by-user/{pick(data.users)}", None),
+        ),
+        "practice_rooms.by_instrument": (
+            1,
+            lambda: (
+                "GET",
+                f"/practice-rooms/by-instrument/{rng.choice(INSTRUMENTS)}",
+                None,
+            ),
+        ),
+        "dashboard.get": (
+            3,
+            lambda: ("GET", f"/users/{pick(data.users)}/dashboard", None),
+        ),
+        "recommendations.get": (
+            1,
+            lambda: ("GET", f"/users/{pick(data.users)}/recommendations", None),
+        ),
+        "stats.leaderboard": (2, lambda: ("GET", "/stats/leaderboard?limit=10", None)),
+        "stats.user": (1, lambda: ("GET", f"/stats/users/{pick(data.users)}", None)),
+        "stats.lesson": (1, lambda: ("GET", f"/stats/lessons/{pick(LESSONS)}", None)),
+        "cache.stats": (0, lambda: ("GET", "/cache/stats", None)),
+        # Writes
+        "songs.create": (
+            2,
+            lambda: (
+                "POST",
+                "/songs",
+                {"title": f"Load {data.next()}", "level": "basic"},
+            ),
+        ),
+        "songs.update": (
+            1,
+            lambda: (
+                "PUT",
+                f"/songs/{pick(data.songs)}",
+                {"title": f"Updated {data.next()}", "level": "basic"},
+            ),
+        ),
+        "songs.bulk": (
+            1,
+            lambda: (
+                "POST",
+                "/songs/bulk",
+                [{"title": f"Bulk {data.next()}"} for _ in range(20)],
+            ),
+        ),
+        "songs.patch": (
+            1,
+            lambda: (
+                "PATCH",
+                f"/songs/{pick(data.songs)}",
+                {"title": f"Patched {data.next()}"},
+            ),
+        ),
+        "songs.delete": (1, lambda: delete("songs", "/songs")),
+        "lessons.update": (
+            0,
+            lambda: (
+                "PUT",
+                f"/lessons/{pick(LESSONS)}",
+                {"title": f"Lesson {data.next()}", "level": "basic"},
+            ),
+        ),
+        "exercises.create": (
+            1,
+            lambda: (
+                "POST",
+                "/exercises",
+                {"lesson_id": pick(LESSONS), "title": f"Exercise {data.next()}"},
+            ),
+        ),
+        "users.create": (1, create_user),
+        "user_progress.create": (2, lambda: ("POST", "/user-progress", new_progress())),
+        "user_progress.update": (2, update_progress),
+        "user_progress.patch": (2, patch_progress),
+        "user_progress.sync_push": (1, sync_push),
+        "user_progress.bulk": (
+            1,
+            lambda: (
+                "POST",
+                "/user-progress/bulk",
+                [new_progress() for _ in range(20)],
+            ),
+        ),
+        "practice_rooms.create": (
+            1,
+            lambda: (
+                "POST",
+                "/practice-rooms",
+                {
+                    "room_name": f"Room {data.next()}",
+                    "host_user_id": pick(data.users),
+                    "instrument": rng.choice(INSTRUMENTS),
+                },
+            ),
+        ),
+        "stats.rebuild": (0, lambda: ("POST", "/stats/rebuild", None)),
+        "cache.clear": (0, lambda: ("POST", "/cache/clear", None)),
+    }
+
+
+# Endpoints that create rows whose ids later delete requests can use
+CREATES = {"songs.create": "songs"}
+# Heavy or whole-table endpoints get fewer requests in their own scenario
+HEAVY = {"songs.export", "users.export", "user_progress.export", "stats.rebuild"}
+# Replaces the dataset, so it runs after everything else
+DESTRUCTIVE = {"reset_db": ("POST", "/reset-db", None)}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, wall):
+    count = len(latencies)
+    summary = {
+        "requests": count,
+        "errors": errors,
+        "rps": round(count / wall, 1) if wall else 0.0,
+    }
+    if latencies:
+        summary.update(
+            p50_ms=round(percentile(latencies, 50), 2),
+            p95_ms=round(percentile(latencies, 95), 2),
+            p99_ms=round(percentile(latencies, 99), 2),
+        )
+    return summary
+
+
+async def run_scenario(client, data, choose, total, concurrency):
+    latencies = defaultdict(list)
+    errors = Counter()
+    statuses = Counter()
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            name, request = choose()
+            method, path, body = request
+            start = time.perf_counter()
+            response = await client.request(method, f"/api/v1{path}", json=body)
+            latencies[name].append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors[name] += 1
+                statuses[f"{name}:{response.status_code}"] += 1
+            elif name in CREATES:
+                data.created[CREATES[name]].append(response.json()["id"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    all_latencies = [value for values in latencies.values() for value in values]
+    result = summarize(all_latencies, sum(errors.values()), wall)
+    if statuses:
+        result["error_statuses"] = dict(statuses)
+    return result, latencies, errors, wall
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, app, db_path: str):
+    from database import run_write
+    from stats import refresh_stats
+
+    rng = random.Random(args.seed)
+    data = Dataset(args.progress_rows)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "concurrency": args.concurrency,
+            "response_cache": not args.no_cache,
+            "write_queue": os.getenv("DB_WRITE_QUEUE", "false"),
+        },
+        "dataset": data.counts(),
+        "endpoints": {},
+    }
+
+    async with app.router.lifespan_context(app):
+        start = time.perf_counter()
+        seed(data, db_path)
+        await run_write(refresh_stats)
+        data.sync_token = seeded_sync_token(db_path)
+        report["dataset"]["seed_secs"] = round(time.perf_counter() - start, 2)
+
+        table = endpoints(data, rng)
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            names = [name for name, (weight, _) in table.items() if weight]
+            weights = [table[name][0] for name in names]
+
+            def choose_mixed():
+                while True:
+                    name = rng.choices(names, weights)[0]
+                    request = table[name][1]()
+                    if request is not None:
+                        return name, request
+
+            mixed, latencies, errors, wall = await run_scenario(
+                client, data, choose_mixed, args.mixed_requests, args.concurrency
+            )
+            mixed["by_endpoint"] = {
+                name: summarize(values, errors[name], wall)
+                for name, values in sorted(latencies.items())
+            }
+            report["mixed"] = mixed
+
+            for name, (_, build) in table.items():
+                total = max(5, args.requests // 20) if name in HEAVY else args.requests
+                if name == "songs.delete":
+                    # Give every delete request a row of its own
+                    response = await client.post(
+                        "/api/v1/songs/bulk",
+                        json=[{"title": "To delete"}] * min(total, 1000),
+                    )
+                    data.created["songs"] = [
+                        song["id"] for song in response.json()["items"]
+                    ]
+                    total = len(data.created["songs"])
+
+                def choose(name=name, build=build):
+                    while True:
+                        request = build()
+                        if request is not None:
+                            return name, request
+
+                result, _, _, _ = await run_scenario(
+                    client, data, choose, total, args.concurrency
+                )
+                report["endpoints"][name] = result
+
+            for name, request in DESTRUCTIVE.items():
+                result, _, _, _ = await run_scenario(
+                    client, data, lambda: (name, request), 20, 1
+                )
+                report["endpoints"][name] = result
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--progress-rows", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--mixed-requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    # The app reads its settings on import
+    work_dir = tempfile.mkdtemp()
+    db_path = os.path.join(work_dir, "load.db")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ["RESET_TEMPLATE_DIR"] = os.path.join(work_dir, "templates")
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    try:
+        from main import app
+
+        report = asyncio.run(run(args, app, db_path))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
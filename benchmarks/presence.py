@@ -0,0 +1,300 @@
+"""Load test practice room WebSockets against one uvicorn worker.
+
+Starts uvicorn in a subprocess against a temp copy of store.db with --rooms
+extra practice rooms, then from this process:
+
+  * opens --sockets sockets spread over the rooms and reports the connect
+    rate and the worker's resident memory per socket,
+  * has one member per room send --messages chat messages and reports the
+    fan-out latency from send to receipt on every other member, and
+  * with --slow N, opens a separate room with --slow-readers readers and N
+    sockets that never read (with tiny receive buffers), sends large chat
+    messages into it at --slow-rate per second, and reports how many stalled sockets the server closed
+    as slow consumers and the latency the readers saw meanwhile.
+
+Usage: python benchmarks/presence.py [--sockets 2000] [--rooms 20]
+           [--messages 20] [--slow 10] [--no-deflate] [--port 8765]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+from websockets.asyncio.client import connect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORK_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(WORK_DIR, "presence.db")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    if not samples:
+        return {"samples": 0}
+    return {
+        "samples": len(samples),
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+    }
+
+
+def seed_rooms(rooms: int):
+    conn = sqlite3.connect(DB_PATH)
+    first = conn.execute("SELECT COALESCE(MAX(id), 0) FROM PracticeRooms").fetchone()
+    conn.executemany(
+        "INSERT INTO PracticeRooms (room_name, host_user_id, instrument, created_at)"
+        " VALUES (?, 1, 'Piano', '2024-01-01 00:00:00')",
+        ((f"Load room {i}",) for i in range(rooms)),
+    )
+    conn.commit()
+    conn.close()
+    return list(range(first[0] + 1, first[0] + rooms + 1))
+
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def wait_for_server(server, port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn did not start")
+
+
+class Client:
+    def __init__(self, room_id: int, user_id: int):
+        self.room_id = room_id
+        self.user_id = user_id
+        self.ws = None
+        self.reader = None
+        self.latencies = []
+        self.close_code = None
+
+    async def open(self, port: int, slow: bool = False):
+        sock = None
+        if slow:
+            # Small buffers make a stalled reader back up into the server quickly
+            sock = socket.socket()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            sock.connect(("127.0.0.1", port))
+        self.ws = await connect(
+            f"ws://127.0.0.1:{port}/api/v1/practice-rooms/{self.room_id}/ws"
+            f"?user_id={self.user_id}",
+            sock=sock,
+            max_queue=4 if slow else 64,
+            open_timeout=60,
+            ping_interval=None,
+        )
+        presence = json.loads(await self.ws.recv())
+        assert presence["type"] == "presence", presence
+
+    def start_reading(self):
+        self.reader = asyncio.create_task(self.read())
+
+    async def read(self):
+        try:
+            async for text in self.ws:
+                message = json.loads(text)
+                if message["type"] == "chat" and message["user_id"] != self.user_id:
+                    self.latencies.append((time.time() - message["sent_at"]) * 1000)
+        except websockets.ConnectionClosed:
+            pass
+        self.close_code = self.ws.close_code
+
+
+async def run(args):
+    shutil.copy(os.path.join(ROOT, "store.db"), DB_PATH)
+    *room_ids, slow_room_id = seed_rooms(args.rooms + 1)
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{DB_PATH}",
+        "PRESENCE_SEND_QUEUE": str(args.send_queue),
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(args.port),
+            "--ws",
+            "websockets",
+            "--log-level",
+            "warning",
+            "--backlog",
+            "4096",
+            *(["--ws-per-message-deflate", "false"] if args.no_deflate else []),
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    report = {
+        "sockets": args.sockets,
+        "rooms": args.rooms,
+        "slow": args.slow,
+        "per_message_deflate": not args.no_deflate,
+    }
+    try:
+        await wait_for_server(server, args.port)
+        baseline_rss = rss_kib(server.pid)
+
+        clients = [Client(room_ids[i % args.rooms], i + 1) for i in range(args.sockets)]
+        limit = asyncio.Semaphore(200)
+
+        async def open_client(client):
+            async with limit:
+                await client.open(args.port)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(open_client(client) for client in clients))
+        connect_secs = time.perf_counter() - start
+        report["connect"] = {
+            "secs": round(connect_secs, 2),
+            "per_sec": round(args.sockets / connect_secs, 1),
+            "server_rss_mib": round(rss_kib(server.pid) / 1024, 1),
+            "kib_per_socket": round(
+                (rss_kib(server.pid) - baseline_rss) / args.sockets, 1
+            ),
+        }
+        for client in clients:
+            client.start_reading()
+
+        # One sender per room; every other member of the room should receive each message
+        senders = {}
+        for client in clients:
+            senders.setdefault(client.room_id, client)
+        start = time.perf_counter()
+        for _ in range(args.messages):
+            for sender in senders.values():
+                await sender.ws.send(
+                    json.dumps({"type": "chat", "text": "hi", "sent_at": time.time()})
+                )
+            await asyncio.sleep(args.interval)
+        expected = args.messages * (args.sockets - len(senders))
+        while (
+            sum(len(c.latencies) for c in clients) < expected
+            and time.perf_counter() - start < 60
+        ):
+            await asyncio.sleep(0.05)
+        received = [value for client in clients for value in client.latencies]
+        report["fan_out"] = {
+            "deliveries": len(received),
+            "expected": expected,
+            "deliveries_per_sec": round(len(received) / (time.perf_counter() - start)),
+            **latency_summary(received),
+        }
+
+        if args.slow:
+            slow_room = slow_room_id
+            readers = [Client(slow_room, 200000 + i) for i in range(args.slow_readers)]
+            slow = [Client(slow_room, 100000 + i) for i in range(args.slow)]
+            for client in readers:
+                await client.open(args.port)
+                client.start_reading()
+            for client in slow:
+                await client.open(args.port, slow=True)
+            sender = readers[0]
+            start = time.perf_counter()
+            for i in range(args.slow_messages):
+                # Random text, so per-message deflate cannot shrink the backlog
+                chat = base64.b64encode(os.urandom(args.slow_message_bytes * 3 // 4))
+                message = {
+                    "type": "chat",
+                    "text": chat.decode(),
+                    "sent_at": time.time(),
+                }
+                await sender.ws.send(json.dumps(message))
+                await asyncio.sleep(
+                    max(0, start + (i + 1) / args.slow_rate - time.perf_counter())
+                )
+            expected = args.slow_messages * (len(readers) - 1)
+            while (
+                sum(len(c.latencies) for c in readers) < expected
+                and time.perf_counter() - start < 60
+            ):
+                await asyncio.sleep(0.05)
+            # A stalled client never reads the close frame queued behind its
+            # backlog, so ask the server who it dropped
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{args.port}/api/v1"
+            ) as http:
+                stats = (await http.get("/practice-rooms/presence/stats")).json()
+                members = (
+                    await http.get(f"/practice-rooms/{slow_room}/presence")
+                ).json()
+            still_in_room = {c.user_id for c in slow} & set(members["members"])
+            received = [value for client in readers for value in client.latencies]
+            report["slow_consumers"] = {
+                "messages": args.slow_messages,
+                "message_bytes": args.slow_message_bytes,
+                "slow_consumers_closed": stats["slow_consumers"],
+                "slow_still_in_room": len(still_in_room),
+                "reader_deliveries": len(received),
+                "reader_expected": expected,
+                "secs": round(time.perf_counter() - start, 2),
+                **latency_summary(received),
+            }
+            for client in readers + slow:
+                await client.ws.close()
+
+        for client in clients:
+            await client.ws.close()
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=2000)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--slow", type=int, default=10)
+    parser.add_argument("--slow-readers", type=int, default=10)
+    parser.add_argument("--slow-messages", type=int, default=3000)
+    parser.add_argument("--slow-rate", type=float, default=200, help="messages/sec")
+    # Chat text is capped at 2000 chars (presence.MAX_CHAT_LENGTH)
+    parser.add_argument("--slow-message-bytes", type=int, default=1900)
+    parser.add_argument("--send-queue", type=int, default=64)
+    parser.add_argument("--no-deflate", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
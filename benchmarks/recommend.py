@@ -0,0 +1,121 @@
+"""Time the recommendation neighbor build and the event-loop lag it causes.
+
+Fills a completion matrix with --users synthetic users who each complete
+--per-user lessons out of --lessons (popular lessons more often), then builds
+the neighbor lists in a worker thread, as the app does, while a ticker on the
+event loop measures how late its 1ms sleeps wake up. Runs the scipy build and
+the pure-Python fallback (skip the slow fallback with --no-fallback), checks
+that both give the same scores, and times patching --dirty changed lessons.
+
+Usage: python benchmarks/recommend.py [--lessons 2000] [--users 50000]
+           [--per-user 20] [--dirty 20] [--no-fallback]
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import recommend  # noqa: E402
+from recommend import CompletionMatrix  # noqa: E402
+
+
+def fill(args) -> CompletionMatrix:
+    rng = random.Random(42)
+    weights = [1 / (rank + 1) for rank in range(args.lessons)]
+    matrix = CompletionMatrix()
+    for user in range(args.users):
+        for lesson in set(rng.choices(range(args.lessons), weights, k=args.per_user)):
+            matrix.set_progress(user, lesson, True, True)
+    return matrix
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def timed_in_thread(fn, *args):
+    lags, done = [], False
+
+    async def ticker():
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append((time.perf_counter() - start) * 1000 - 1)
+
+    task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    result = await asyncio.to_thread(fn, *args)
+    elapsed = time.perf_counter() - start
+    done = True
+    await task
+    return result, {
+        "seconds": round(elapsed, 3),
+        "loop_lag_p50_ms": round(percentile(lags, 50), 2),
+        "loop_lag_p99_ms": round(percentile(lags, 99), 2),
+        "loop_lag_max_ms": round(max(lags), 2),
+    }
+
+
+async def run(args):
+    matrix = fill(args)
+    completers = dict(matrix.completers)
+    # Otherwise the first full collection over the synthetic users' sets lands
+    # in a build and shows up as one long stall
+    gc.collect()
+    gc.freeze()
+    report = {"lessons": args.lessons, "users": args.users, "builds": {}}
+    builds = {}
+    modes = ["scipy"] if args.no_fallback else ["scipy", "fallback"]
+    for mode in modes:
+        if mode == "fallback":
+            recommend.scipy_modules = lambda: None
+        # The first scipy call pays for its lazy imports
+        recommend.build_neighbors({1: 0b11, 2: 0b10})
+        neighbors, stats = await timed_in_thread(recommend.build_neighbors, completers)
+        builds[mode] = neighbors
+        report["builds"][mode] = stats
+
+        lessons = sorted(completers)
+        dirty = set(random.Random(7).sample(lessons, args.dirty))
+        user = args.users
+        for lesson in dirty:
+            matrix.set_progress(user, lesson, True, True)
+        _, stats = await timed_in_thread(
+            recommend.patch_neighbors, neighbors, dict(matrix.completers), dirty
+        )
+        for lesson in dirty:
+            matrix.set_progress(user, lesson, False, False)
+        report["builds"][mode]["patch"] = stats
+
+    if "fallback" in builds:
+        # Ties may be ordered differently; compare the scores per lesson
+        report["same_scores"] = all(
+            [round(score, 9) for _, score in builds["scipy"][lesson]]
+            == [round(score, 9) for _, score in builds["fallback"][lesson]]
+            for lesson in completers
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lessons", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--dirty", type=int, default=20)
+    parser.add_argument("--no-fallback", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
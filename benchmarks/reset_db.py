@@ -0,0 +1,92 @@
+"""Time POST /reset-db against replaying the seed script directly.
+
+Boots the app in-process against a temp SQLite file. For each reset it also
+records the longest event-loop stall seen by a ticker task, which is what
+other requests wait for while a reset runs.
+
+Usage: python benchmarks/reset_db.py [--runs 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(WORK_DIR, "reset.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ["RESET_TEMPLATE_DIR"] = os.path.join(WORK_DIR, "templates")
+shutil.copy(os.path.join(ROOT, "store.db"), DB_PATH)
+
+import httpx  # noqa: E402
+from main import app  # noqa: E402
+from reset import run_seed_script  # noqa: E402
+
+
+async def timed(action, runs):
+    durations, stalls = [], []
+    for _ in range(runs):
+        worst = 0.0
+        running = True
+
+        async def ticker():
+            nonlocal worst
+            while running:
+                start = time.perf_counter()
+                await asyncio.sleep(0)
+                worst = max(worst, time.perf_counter() - start)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await action()
+        durations.append((time.perf_counter() - start) * 1000)
+        running = False
+        await task
+        stalls.append(worst * 1000)
+    return {
+        "p50_ms": round(statistics.median(durations), 2),
+        "max_ms": round(max(durations), 2),
+        "max_loop_stall_ms": round(max(stalls), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+
+            async def reset():
+                response = await client.post("/api/v1/reset-db")
+                response.raise_for_status()
+
+            # First call builds the template; not part of the steady state
+            await reset()
+            snapshot = await timed(reset, args.runs)
+
+    replay_path = os.path.join(WORK_DIR, "replay.db")
+
+    async def replay():
+        # What the endpoint used to do: executescript on the event loop
+        run_seed_script(replay_path)
+
+    script = await timed(replay, args.runs)
+    print(json.dumps({"snapshot_restore": snapshot, "script_replay": script}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""Measure /songs/search and /lessons/search latency on a large catalog.
+
+Boots the app in-process against a temp SQLite file, inserts ROWS songs and
+lessons (the FTS triggers index them as they go) and times a mix of word and
+prefix queries with the response cache disabled.
+
+Usage: python benchmarks/search.py [--rows 100000] [--queries 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "search.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+from main import app  # noqa: E402
+
+# Pseudo-words drawn with a skewed distribution, so a few words are very common
+# (the slow case: many matches to rank) and most are rare, like real titles
+SYLLABLES = "ka lo mi na re so ta vi ze bu do fe gi ju".split()
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES][:2000]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(WORDS))]
+
+
+def phrase(rng, count):
+    return " ".join(rng.choices(WORDS, WEIGHTS, k=count))
+
+
+def seed(rows):
+    rng = random.Random(1)
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany(
+        "INSERT INTO Songs (title, artist, level) VALUES (?, ?, 'basic')",
+        ((phrase(rng, 3), phrase(rng, 2)) for _ in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO Lessons (title, description, level) VALUES (?, ?, 'basic')",
+        ((phrase(rng, 3), phrase(rng, 12)) for _ in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(client, path, queries):
+    rng = random.Random(2)
+    samples = []
+    for _ in range(queries):
+        words = rng.choices(WORDS, WEIGHTS, k=rng.randint(1, 2))
+        words[-1] = words[-1][: rng.randint(2, len(words[-1]))]
+        start = time.perf_counter()
+        response = await client.get(path, params={"q": " ".join(words), "limit": 20})
+        samples.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return {
+        "path": path,
+        "queries": queries,
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    results = []
+    async with app.router.lifespan_context(app):
+        seed(args.rows)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for path in ("/api/v1/songs/search", "/api/v1/lessons/search"):
+                results.append(await run(client, path, args.queries))
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
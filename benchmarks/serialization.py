@@ -0,0 +1,133 @@
+"""Time full list pages on the response-cache miss path.
+
+Boots the app in-process against a temp SQLite file with the response cache
+disabled, fills every table with enough rows for --limit sized pages and
+requests the first page of each list endpoint --runs times. Besides total
+latency it reports the app and serialize phases from the Server-Timing
+header, so runs before and after a serialization change can be compared
+phase by phase.
+
+Usage: python benchmarks/serialization.py [--rows 5000] [--limit 500] [--runs 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(WORK_DIR, "serialization.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+shutil.copy(os.path.join(ROOT, "store.db"), DB_PATH)
+
+import httpx  # noqa: E402
+from main import app  # noqa: E402
+
+ENDPOINTS = [
+    "/songs",
+    "/lessons",
+    "/exercises",
+    "/users",
+    "/user-progress",
+    "/practice-rooms",
+    "/songs/search?q=song",
+]
+
+
+def seed(rows: int):
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany(
+        "INSERT INTO Users (username, email, avatar_url, created_at)"
+        " VALUES (?, ?, ?, '2024-01-01 00:00:00')",
+        (
+            (f"bench{i}", f"bench{i}@example.com", f"https://img/{i}.png")
+            for i in range(rows)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO Lessons (title, description, level, type)"
+        " VALUES (?, ?, 'basic', 'theory')",
+        ((f"Lesson {i}", f"Description of lesson {i}") for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO Exercises (lesson_id, title, type, content)"
+        " VALUES (1, ?, 'quiz', ?)",
+        ((f"Exercise {i}", f"Content {i}") for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO Songs (title, artist, level) VALUES (?, ?, 'basic')",
+        ((f"Song {i}", f"Artist {i % 100}") for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO PracticeRooms (room_name, host_user_id, instrument, created_at)"
+        " VALUES (?, 1, 'Piano', '2024-01-01 00:00:00')",
+        ((f"Room {i}",) for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO UserProgress (user_id, lesson_id, completed, completed_at)"
+        " VALUES (?, ?, 1, '2024-02-01 10:00:00')",
+        ((1 + i // 50, 1 + i % 50) for i in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def phases(header: str) -> dict:
+    durations = {}
+    for part in header.split(","):
+        name, *params = part.strip().split(";")
+        for param in params:
+            if param.startswith("dur="):
+                durations[name] = float(param[4:])
+    return durations
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        seed(args.rows)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench/api/v1"
+        ) as client:
+            for path in ENDPOINTS:
+                separator = "&" if "?" in path else "?"
+                url = f"{path}{separator}limit={min(args.limit, 100) if 'search' in path else args.limit}"
+                totals, apps, serializes = [], [], []
+                for _ in range(args.runs + 1):
+                    start = time.perf_counter()
+                    response = await client.get(url)
+                    response.raise_for_status()
+                    elapsed = (time.perf_counter() - start) * 1000
+                    timing = phases(response.headers.get("server-timing", ""))
+                    totals.append(elapsed)
+                    apps.append(timing.get("app", 0.0))
+                    serializes.append(timing.get("serialize", 0.0))
+                # The first request warms statement and schema caches
+                results[path] = {
+                    "items": len(response.json()),
+                    "p50_ms": round(statistics.median(totals[1:]), 2),
+                    "app_ms": round(statistics.median(apps[1:]), 2),
+                    "serialize_ms": round(statistics.median(serializes[1:]), 2),
+                }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
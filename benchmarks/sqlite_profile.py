@@ -0,0 +1,114 @@
+"""Compare read/write concurrency with and without the tuned SQLite profile.
+
+Runs READERS concurrent readers and WRITERS concurrent writers against a
+fresh temp database for DURATION seconds, once with driver defaults and
+once with database.SQLITE_PRAGMAS, and prints ops/sec and lock errors.
+
+Usage: python benchmarks/sqlite_profile.py [--readers 16] [--writers 4] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+from database import SQLITE_PRAGMAS, apply_sqlite_pragmas, engine_options  # noqa: E402
+
+SEED_ROWS = 10000
+
+
+async def setup(engine):
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "CREATE TABLE Songs (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " title TEXT NOT NULL, artist TEXT, level TEXT)"
+            )
+        )
+        await conn.execute(
+            text("INSERT INTO Songs (title, artist, level) VALUES (:t, :a, :l)"),
+            [
+                {"t": f"Song {i}", "a": f"Artist {i % 100}", "l": "basic"}
+                for i in range(SEED_ROWS)
+            ],
+        )
+
+
+async def reader(engine, deadline, stats):
+    while time.perf_counter() < deadline:
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(
+                    text("SELECT * FROM Songs WHERE id > :after ORDER BY id LIMIT 50"),
+                    {"after": stats["reads"] % SEED_ROWS},
+                )
+            stats["reads"] += 1
+        except OperationalError:
+            stats["read_errors"] += 1
+
+
+async def writer(engine, deadline, stats):
+    while time.perf_counter() < deadline:
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(
+                    text(
+                        "INSERT INTO Songs (title, artist, level) VALUES ('new', 'bench', 'basic')"
+                    )
+                )
+            stats["writes"] += 1
+        except OperationalError:
+            stats["write_errors"] += 1
+
+
+async def run_profile(name, readers, writers, duration):
+    path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    url = f"sqlite+aiosqlite:///{path}"
+    options = engine_options(url)
+    options.update(pool_size=readers + writers, max_overflow=0)
+    engine = create_async_engine(url, **options)
+    if name == "tuned":
+        apply_sqlite_pragmas(engine.sync_engine)
+    await setup(engine)
+
+    stats = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(
+        *[reader(engine, deadline, stats) for _ in range(readers)],
+        *[writer(engine, deadline, stats) for _ in range(writers)],
+    )
+    await engine.dispose()
+    return {
+        "profile": name,
+        "reads_per_sec": round(stats["reads"] / duration, 1),
+        "writes_per_sec": round(stats["writes"] / duration, 1),
+        "read_errors": stats["read_errors"],
+        "write_errors": stats["write_errors"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = [
+        await run_profile(name, args.readers, args.writers, args.duration)
+        for name in ("default", "tuned")
+    ]
+    print(json.dumps({"pragmas": SQLITE_PRAGMAS, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,217 @@
+"""Profile cold starts: imports, the lifespan hook and the first served request.
+
+Every measurement runs in a fresh interpreter, --runs times, and the report
+gives medians:
+
+  * import: `python -X importtime -c "import main"`, split into the app's own
+    modules and third-party packages, with the slowest top-level imports,
+  * lifespan: the startup hook on a fresh copy of store.db (schema still to
+    apply) and again on the same file once its schema is current,
+  * boot: from spawning uvicorn to the first 200 from GET /api/v1/songs?limit=1,
+    on a database whose schema is current.
+
+Save the report with --output and compare it across commits.
+
+Usage: python benchmarks/startup.py [--runs 5] [--top 15] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp()
+
+OWN_MODULES = {name[:-3] for name in os.listdir(ROOT) if name.endswith(".py")} | {
+    "Routes"
+}
+
+LIFESPAN_SCRIPT = """
+import asyncio, json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from main import app
+imported = time.perf_counter()
+
+async def run():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(run())
+print(json.dumps({{"import_ms": (imported - start) * 1000,
+                  "lifespan_ms": (ready - imported) * 1000}}))
+"""
+
+
+def fresh_database() -> str:
+    path = tempfile.mktemp(suffix=".db", dir=WORK_DIR)
+    shutil.copy(os.path.join(ROOT, "store.db"), path)
+    return path
+
+
+# Bytecode is written, as in a deployment, so runs after the first measure
+# imports rather than compiling
+def env_for(path: str) -> dict:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{path}",
+        "RESET_TEMPLATE_DIR": os.path.join(WORK_DIR, "templates"),
+    }
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+# {module: self_us} for every module `import main` loads
+def import_profile():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        env=env_for(fresh_database()),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        if self_us.strip().isdigit():
+            modules[name.strip()] = int(self_us)
+    return modules
+
+
+# Self time summed per top-level package: the app's own modules are listed
+# one by one, everything else under its distribution's package name
+def summarize_imports(profiles, top: int):
+    totals, own, groups = [], [], {}
+    for modules in profiles:
+        run_groups = {}
+        for name, self_us in modules.items():
+            package = name.split(".")[0]
+            key = name if package in OWN_MODULES else package
+            run_groups[key] = run_groups.get(key, 0) + self_us
+        totals.append(sum(run_groups.values()))
+        own.append(
+            sum(
+                us for key, us in run_groups.items() if key.split(".")[0] in OWN_MODULES
+            )
+        )
+        for key, us in run_groups.items():
+            groups.setdefault(key, []).append(us)
+    slowest = sorted(
+        ((statistics.median(values), key) for key, values in groups.items()),
+        reverse=True,
+    )[:top]
+    return {
+        "total_ms": round(statistics.median(totals) / 1000, 1),
+        "own_modules_ms": round(statistics.median(own) / 1000, 1),
+        "third_party_ms": round(
+            statistics.median(t - o for t, o in zip(totals, own)) / 1000, 1
+        ),
+        "slowest": {key: round(us / 1000, 1) for us, key in slowest},
+    }
+
+
+def lifespan_run(path: str):
+    result = subprocess.run(
+        [sys.executable, "-c", LIFESPAN_SCRIPT.format(root=ROOT)],
+        cwd=ROOT,
+        env=env_for(path),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def boot_to_first_request(path: str, port: int) -> float:
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env_for(path),
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}/api/v1") as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {server.returncode}")
+                try:
+                    if client.get("/songs", params={"limit": 1}).status_code == 200:
+                        return (time.perf_counter() - start) * 1000
+                except httpx.TransportError:
+                    time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def median_ms(values):
+    return round(statistics.median(values), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    try:
+        # One throwaway run to write the bytecode the runs below load
+        import_profile()
+        report = {
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "import": summarize_imports(
+                [import_profile() for _ in range(args.runs)], args.top
+            ),
+        }
+
+        fresh, current = [], []
+        for _ in range(args.runs):
+            path = fresh_database()
+            fresh.append(lifespan_run(path))
+            current.append(lifespan_run(path))
+        report["lifespan"] = {
+            "import_ms": median_ms(run["import_ms"] for run in fresh + current),
+            "fresh_schema_ms": median_ms(run["lifespan_ms"] for run in fresh),
+            "current_schema_ms": median_ms(run["lifespan_ms"] for run in current),
+        }
+
+        path = fresh_database()
+        lifespan_run(path)
+        report["boot_to_first_request_ms"] = median_ms(
+            boot_to_first_request(path, args.port) for _ in range(args.runs)
+        )
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Measure throughput against uvicorn with 1..N worker processes.
+
+For each --workers count, starts `uvicorn main:app --workers N` on a temp
+copy of store.db (with --rows extra rows per table), drives it for
+--duration seconds from --clients load generator processes with
+--connections keep-alive connections each, and reports requests/sec and
+latency percentiles for a mix of read routes plus a few PATCH writes.
+After each run it PATCHes a song and reads it back over fresh connections,
+which land on different workers, and counts stale answers; with the change
+log enabled this must be 0.
+
+Scaling is bounded by the cores available (reported as "cpus"), and the load
+generator competes for the same cores.
+
+Usage: python benchmarks/workers.py [--workers 1,2,4] [--duration 10]
+           [--clients 2] [--connections 16] [--rows 2000] [--port 8790]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(WORK_DIR, "workers.db")
+
+# (weight, method, path); {n} is replaced with a random id up to --rows
+MIX = [
+    (10, "GET", "/songs/{n}"),
+    (4, "GET", "/songs?limit=20"),
+    (2, "GET", "/songs/search?q=song"),
+    (6, "GET", "/lessons/{n}"),
+    (3, "GET", "/lessons?limit=20"),
+    (4, "GET", "/exercises/by-lesson/{n}"),
+    (6, "GET", "/users/{n}"),
+    (3, "GET", "/user-progress/by-user/{n}"),
+    (2, "GET", "/practice-rooms?limit=20"),
+    (2, "GET", "/users/{n}/dashboard"),
+    (2, "GET", "/stats/leaderboard?limit=10"),
+    (2, "PATCH", "/songs/{n}"),
+]
+
+
+def seed(rows: int):
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany(
+        "INSERT INTO Users (username, email, created_at)"
+        " VALUES (?, ?, '2024-01-01 00:00:00')",
+        ((f"bench{i}", f"bench{i}@example.com") for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO Lessons (title, description, level, type)"
+        " VALUES (?, ?, 'basic', 'theory')",
+        ((f"Lesson {i}", f"Description {i}") for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO Exercises (lesson_id, title, type) VALUES (?, ?, 'quiz')",
+        ((i % rows + 1, f"Exercise {i}") for i in range(rows * 3)),
+    )
+    conn.executemany(
+        "INSERT INTO Songs (title, artist, level) VALUES (?, ?, 'basic')",
+        ((f"Song {i}", f"Artist {i % 100}") for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO PracticeRooms (room_name, host_user_id, instrument, created_at)"
+        " VALUES (?, 1, 'Piano', '2024-01-01 00:00:00')",
+        ((f"Room {i}",) for i in range(rows // 10)),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO UserProgress (user_id, lesson_id, completed)"
+        " VALUES (?, ?, ?)",
+        # Five distinct lessons per user, clear of the seeded pairs
+        (
+            (i // 5 + 1, (i // 5 + i % 5 + 10) % rows + 1, i % 3 == 0)
+            for i in range(rows * 5)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+# One load generator process: `connections` concurrent request loops
+def generate_load(port, connections, duration, rows, seed_value):
+    async def run():
+        rng = random.Random(seed_value)
+        weights = [weight for weight, _, _ in MIX]
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + duration
+        limits = httpx.Limits(max_connections=connections)
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}/api/v1", limits=limits, timeout=30
+        ) as client:
+
+            async def loop():
+                nonlocal errors
+                while time.perf_counter() < deadline:
+                    _, method, path = rng.choices(MIX, weights)[0]
+                    path = path.replace("{n}", str(rng.randint(1, rows)))
+                    body = (
+                        {"title": f"Song {rng.random()}"} if method == "PATCH" else None
+                    )
+                    start = time.perf_counter()
+                    response = await client.request(method, path, json=body)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    if response.status_code >= 400:
+                        errors += 1
+
+            await asyncio.gather(*(loop() for _ in range(connections)))
+        return latencies, errors
+
+    return asyncio.run(run())
+
+
+def wait_for_server(server, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/v1/cache/stats")
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+# PATCH one song, then read it over fresh connections spread across workers
+def stale_reads(port, reads=40):
+    base = f"http://127.0.0.1:{port}/api/v1"
+    for _ in range(reads):
+        httpx.get(f"{base}/songs/1")
+    title = f"Checked {time.time()}"
+    httpx.patch(f"{base}/songs/1", json={"title": title}).raise_for_status()
+    return sum(
+        httpx.get(f"{base}/songs/1").json()["title"] != title for _ in range(reads)
+    )
+
+
+def run_workers(workers, args):
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{DB_PATH}",
+        "WEB_CONCURRENCY": str(workers),
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(args.port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        wait_for_server(server, args.port)
+        # Warm every worker's statement and response caches
+        generate_load(args.port, args.connections, 2, args.rows, 0)
+        with multiprocessing.Pool(args.clients) as pool:
+            start = time.perf_counter()
+            results = pool.starmap(
+                generate_load,
+                [
+                    (args.port, args.connections, args.duration, args.rows, i + 1)
+                    for i in range(args.clients)
+                ],
+            )
+            wall = time.perf_counter() - start
+        latencies = [value for values, _ in results for value in values]
+        return {
+            "workers": workers,
+            "requests": len(latencies),
+            "errors": sum(errors for _, errors in results),
+            "rps": round(len(latencies) / wall, 1),
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "stale_reads": stale_reads(args.port),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=2)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8790)
+    args = parser.parse_args()
+
+    shutil.copy(os.path.join(ROOT, "store.db"), DB_PATH)
+    seed(args.rows)
+    report = {"cpus": os.cpu_count(), "runs": []}
+    try:
+        for workers in (int(value) for value in args.workers.split(",")):
+            report["runs"].append(run_workers(workers, args))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    base = report["runs"][0]["rps"]
+    for run in report["runs"]:
+        run["speedup"] = round(run["rps"] / base, 2) if base else None
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
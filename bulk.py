@@ -0,0 +1,85 @@
+from typing import Generic, List, Optional, TypeVar
+from pydantic import BaseModel
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+MAX_BULK_ITEMS = 1000
+# Rows per INSERT statement; keeps bound parameters well under SQLite's limit
+BULK_CHUNK_SIZE = 200
+
+T = TypeVar("T")
+
+
+class BulkError(BaseModel):
+    index: int
+    detail: str
+
+
+class BulkResult(BaseModel, Generic[T]):
+    items: List[T]
+    errors: List[BulkError]
+
+
+def upsert_statement(model, rows: list, conflict_cols: Optional[list]):
+    stmt = insert(model).values(rows)
+    if conflict_cols:
+        update_cols = [
+            name for name in rows[0] if name not in conflict_cols and name != "id"
+        ]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=conflict_cols,
+            set_={name: stmt.excluded[name] for name in update_cols},
+        )
+    # The writer may share one session across jobs, so refresh identity-mapped rows
+    return stmt.returning(model).execution_options(populate_existing=True)
+
+
+# The last row for each conflict key, with its index in `rows`. A key repeated
+# in one INSERT ... ON CONFLICT would be written twice, and RETURNING would
+# report the first row while the table keeps the last. Rows missing part of the
+# key (new rows without an id) are all kept.
+def last_per_key(rows: list, conflict_cols: Optional[list]) -> list:
+    if not conflict_cols:
+        return list(enumerate(rows))
+    latest = {}
+    for index, row in enumerate(rows):
+        key = tuple(row.get(name) for name in conflict_cols)
+        if None in key:
+            key = index
+        latest.pop(key, None)
+        latest[key] = (index, row)
+    return list(latest.values())
+
+
+# Insert (or upsert on conflict_cols) all rows with one multi-row
+# INSERT ... ON CONFLICT ... RETURNING per chunk, inside the caller's transaction.
+# A key given more than once takes its last row, and is returned once.
+# A chunk that violates a constraint is retried row by row so only the offending
+# rows are reported in `errors`; the rest are still written.
+async def bulk_upsert(
+    db: AsyncSession, model, rows: list, conflict_cols: Optional[list] = None
+):
+    items, errors = [], []
+    indexed = last_per_key(rows, conflict_cols)
+    for start in range(0, len(indexed), BULK_CHUNK_SIZE):
+        chunk = indexed[start : start + BULK_CHUNK_SIZE]
+        try:
+            async with db.begin_nested():
+                result = await db.scalars(
+                    upsert_statement(model, [row for _, row in chunk], conflict_cols)
+                )
+                items.extend(result.all())
+            continue
+        except IntegrityError:
+            pass
+        for index, row in chunk:
+            try:
+                async with db.begin_nested():
+                    result = await db.scalars(
+                        upsert_statement(model, [row], conflict_cols)
+                    )
+                    items.extend(result.all())
+            except IntegrityError as e:
+                errors.append(BulkError(index=index, detail=str(e.orig)))
+    return items, errors
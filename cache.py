@@ -0,0 +1,224 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from changelog import change_log, sync_changes
+from compression import compress, compression_min_size, negotiate, set_encoding_headers
+from serialization import dump_json
+from singleflight import SingleFlight
+
+cache_enabled = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+cache_max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+cache_ttl = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+
+
+# Bounded LRU of serialized response bodies with a TTL. Entries carry tags
+# ("songs", "songs:5", "exercises:lesson:2") so writes can drop exactly
+# the responses they affect. With a change log, invalidations and clears are
+# also applied to the other workers' caches. Compressed copies of a body are
+# kept beside it, made on first request for each encoding.
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float, change_log=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.change_log = change_log
+        self.entries = OrderedDict()
+        # key -> {encoding: compressed body}
+        self.encoded = {}
+        self.tag_keys = {}
+        self.generations = {}
+        self.max_generations = max(4 * max_entries, 1024)
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.encoded_hits = 0
+        self.encoded_misses = 0
+        if change_log is not None:
+            change_log.subscribe("invalidate", self._invalidate, reload=self._clear)
+            change_log.subscribe("clear", lambda _: self._clear())
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, body, headers, tags = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return body, headers
+
+    # Snapshot of tag generations taken before loading from the database.
+    # set() refuses to store a body if one of its tags was invalidated meanwhile.
+    def generation(self, tags):
+        return (self.epoch, *(self.generations.get(tag, 0) for tag in tags))
+
+    def set(self, key: str, body: bytes, headers: dict, tags, generation=None):
+        if generation is not None and generation != self.generation(tags):
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + self.ttl, body, headers, tuple(tags))
+        for tag in tags:
+            self.tag_keys.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    # The entry's body compressed with `encoding`, or None once it is gone
+    def get_encoded(self, key: str, encoding: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        variants = self.encoded.setdefault(key, {})
+        body = variants.get(encoding)
+        if body is None:
+            body = variants[encoding] = compress(entry[1], encoding, cached=True)
+            self.encoded_misses += 1
+        else:
+            self.encoded_hits += 1
+        return body
+
+    async def invalidate(self, *tags):
+        self._invalidate(tags)
+        if self.change_log is not None and cache_enabled:
+            await self.change_log.publish("invalidate", tags)
+
+    async def clear(self):
+        self._clear()
+        if self.change_log is not None and cache_enabled:
+            await self.change_log.publish("clear", None)
+
+    def _invalidate(self, tags):
+        for tag in tags:
+            self.generations[tag] = self.generations.get(tag, 0) + 1
+            for key in self.tag_keys.pop(tag, set()):
+                if key in self.entries:
+                    self._remove(key)
+                    self.invalidations += 1
+        # Per-id tags would otherwise keep a generation each forever. Starting a
+        # new epoch instead only makes loads already running skip storing.
+        if len(self.generations) > self.max_generations:
+            self._reset_generations()
+
+    def _reset_generations(self):
+        self.epoch += 1
+        self.generations.clear()
+
+    def _clear(self):
+        self._reset_generations()
+        self.entries.clear()
+        self.encoded.clear()
+        self.tag_keys.clear()
+
+    def stats(self):
+        return {
+            "enabled": cache_enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "generations": len(self.generations),
+            "encoded_entries": sum(len(v) for v in self.encoded.values()),
+            "encoded_hits": self.encoded_hits,
+            "encoded_misses": self.encoded_misses,
+        }
+
+    def _remove(self, key: str):
+        _, _, _, tags = self.entries.pop(key)
+        self.encoded.pop(key, None)
+        for tag in tags:
+            keys = self.tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_keys[tag]
+
+
+VALIDATOR_HEADERS = ("etag", "last-modified")
+
+
+response_cache = ResponseCache(cache_max_entries, cache_ttl, change_log)
+# Misses for the same key and tag generations share one load
+response_flights = SingleFlight()
+
+
+def cache_key(request: Request) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+# Serve a GET handler from the cache. `load` runs the query on a miss and may set
+# headers on `response` (e.g. X-Next-Cursor); those headers are cached with the body.
+# Validators (conditional_get's ETag and Last-Modified) are not: an entry can
+# outlive a write to another row of its table, so they come from this request.
+# With `adapter=None`, `load` returns plain rows (fetch_page) that are encoded as is.
+# Concurrent misses for one key run `load` and the encoding once and share the
+# body (also with the cache disabled); a request arriving after a write to
+# its tags starts a new load instead of joining one that may predate it.
+# Clients accepting gzip or br get the entry's precompressed body.
+async def cached_json(
+    request: Request, response: Response, tags, adapter: Optional[TypeAdapter], load
+):
+    key = cache_key(request)
+    sync_changes()
+    cached = response_cache.get(key) if cache_enabled else None
+    if cached is not None:
+        body, headers = cached
+    else:
+        generation = response_cache.generation(tags)
+
+        async def load_body():
+            data = await load()
+            if adapter is None:
+                body = dump_json(data)
+            else:
+                body = adapter.dump_json(
+                    adapter.validate_python(data, from_attributes=True)
+                )
+            headers = {
+                name: value
+                for name, value in response.headers.items()
+                if name not in VALIDATOR_HEADERS
+            }
+            if cache_enabled:
+                # Another worker may have invalidated these tags while `load` ran
+                sync_changes()
+                response_cache.set(key, body, headers, tags, generation)
+            return body, headers
+
+        body, headers = await response_flights.do((key, generation), load_body)
+    headers = {
+        **headers,
+        **{
+            name: value
+            for name, value in response.headers.items()
+            if name in VALIDATOR_HEADERS
+        },
+    }
+
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding is not None and cache_enabled and len(body) >= compression_min_size:
+        encoded = response_cache.get_encoded(key, encoding)
+        if encoded is not None:
+            response = Response(
+                content=encoded, media_type="application/json", headers=headers
+            )
+            set_encoding_headers(response.headers, encoding)
+            return response
+    return Response(content=body, media_type="application/json", headers=headers)
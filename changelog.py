@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from sqlalchemy.engine import make_url
+from database import database_url, is_memory_sqlite, is_sqlite
+
+logger = logging.getLogger(__name__)
+
+# uvicorn --workers and gunicorn both default to WEB_CONCURRENCY workers. With
+# more than one, in-process caches and version counters are kept coherent
+# through the change log below.
+web_concurrency = int(os.getenv("WEB_CONCURRENCY", "1"))
+change_log_enabled = os.getenv(
+    "CHANGE_LOG_ENABLED", "true" if web_concurrency > 1 else "false"
+).lower() in ("1", "true", "yes")
+# Entries kept for workers that have been idle; one further behind resets its state
+change_log_keep = int(os.getenv("CHANGE_LOG_KEEP", "10000"))
+
+
+def default_change_log_path():
+    if not is_sqlite(database_url) or is_memory_sqlite(database_url):
+        return None
+    root, _ = os.path.splitext(os.path.abspath(make_url(database_url).database))
+    return f"{root}.changes.db"
+
+
+change_log_path = os.getenv("CHANGE_LOG_PATH") or default_change_log_path()
+
+
+# BEGIN IMMEDIATE, so appends from several workers queue up on the busy
+# timeout instead of failing when one upgrades a read to a write
+@contextmanager
+def immediate(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def open_log(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    # The log only matters while the workers run; it is reset on the next start
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+# Identifies the process manager that started the workers, so the log is
+# reset on each deployment rather than carrying versions across restarts
+def supervisor_id() -> str:
+    ppid = os.getppid()
+    try:
+        with open(f"/proc/{ppid}/stat") as stat:
+            started = stat.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        started = ""
+    return f"{ppid}:{started}"
+
+
+# Append-only log of cache invalidations and version bumps in a small SQLite
+# file shared by the workers. A worker applies its own changes at once and
+# replays the other workers' entries before it answers from in-process state;
+# PRAGMA data_version tells it whether anyone else wrote since it last looked,
+# so a check with nothing new costs no read of the log.
+# Replays read on the event loop: in WAL mode readers never wait for a writer.
+# Appends wait on BEGIN IMMEDIATE (up to the busy timeout) while another worker
+# appends, so they run on a thread of their own with a second connection.
+class ChangeLog:
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = None
+        self.writer = None
+        self.executor = None
+        self.data_version = None
+        self.last_seq = 0
+        self.epoch = None
+        self.started_at = None
+        self.handlers = {}
+        self.reloads = []
+
+    # `apply(payload)` handles entries of `kind` from other workers; `reload()`
+    # rebuilds local state when entries were missed (first open, pruned log)
+    def subscribe(self, kind: str, apply, reload=None):
+        self.handlers[kind] = apply
+        if reload is not None:
+            self.reloads.append(reload)
+
+    # Opened on first use, so a worker forked after import gets its own
+    # connection. The lifespan opens it before requests are served, so setting
+    # up the tables does not block a request.
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is not None:
+            return self.conn
+        conn = open_log(self.path)
+        with immediate(conn):
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY"
+                " AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL,"
+                " origin INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL, modified INTEGER NOT NULL)"
+            )
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if meta.get("supervisor") != supervisor_id():
+                conn.execute("DELETE FROM changes")
+                conn.execute("DELETE FROM versions")
+                meta = {
+                    "supervisor": supervisor_id(),
+                    "epoch": uuid.uuid4().hex[:8],
+                    "started_at": str(int(time.time())),
+                }
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    meta.items(),
+                )
+            self.epoch = meta["epoch"]
+            self.started_at = int(meta["started_at"])
+            # The last seq handed out, which survives the DELETE above
+            self.last_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence"
+                " WHERE name = 'changes'"
+            ).fetchone()[0]
+        self.conn = conn
+        self.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        for reload in self.reloads:
+            reload()
+        return conn
+
+    # Apply entries other workers appended since the last call
+    def sync(self):
+        conn = self.connect()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self._replay(conn)
+
+    # Log an entry for the other workers; this worker has already applied it
+    async def publish(self, kind: str, payload):
+        await self._write(self._publish, kind, payload)
+
+    # Increment the shared version of each table and log the new values, so
+    # every worker computes the same ETags. Returns {table: [version, modified]}.
+    async def bump(self, tables, modified: int) -> dict:
+        return await self._write(self._bump, tables, modified)
+
+    def versions(self) -> dict:
+        rows = self.connect().execute("SELECT name, version, modified FROM versions")
+        return {name: [version, modified] for name, version, modified in rows}
+
+    # One thread, so this worker's appends keep their order
+    async def _write(self, fn, *args):
+        self.connect()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(1, thread_name_prefix="change-log")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    # Only used on the executor's thread
+    def _writer(self) -> sqlite3.Connection:
+        if self.writer is None:
+            self.writer = open_log(self.path)
+        return self.writer
+
+    def _publish(self, kind: str, payload):
+        conn = self._writer()
+        with immediate(conn):
+            self._append(conn, kind, payload)
+
+    def _bump(self, tables, modified: int) -> dict:
+        conn = self._writer()
+        with immediate(conn):
+            versions = {}
+            for table in tables:
+                (version,) = conn.execute(
+                    "INSERT INTO versions (name, version, modified) VALUES (?, 1, ?)"
+                    " ON CONFLICT (name) DO UPDATE SET version = version + 1,"
+                    " modified = excluded.modified RETURNING version",
+                    (table, modified),
+                ).fetchone()
+                versions[table] = [version, modified]
+            self._append(conn, "versions", versions)
+        return versions
+
+    # This worker's own entries are skipped when sync() reaches them
+    def _append(self, conn, kind: str, payload):
+        seq = conn.execute(
+            "INSERT INTO changes (kind, payload, origin) VALUES (?, ?, ?)",
+            (kind, json.dumps(payload), os.getpid()),
+        ).lastrowid
+        if seq % 1000 == 0:
+            conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - change_log_keep,))
+
+    def _replay(self, conn):
+        rows = conn.execute(
+            "SELECT seq, kind, payload, origin FROM changes WHERE seq > ? ORDER BY seq",
+            (self.last_seq,),
+        ).fetchall()
+        if not rows:
+            return
+        if rows[0][0] != self.last_seq + 1:
+            # Entries this worker never saw were pruned
+            logger.warning("Change log entries were pruned; reloading local state")
+            self.last_seq = rows[-1][0]
+            for reload in self.reloads:
+                reload()
+            return
+        pid = os.getpid()
+        for seq, kind, payload, origin in rows:
+            self.last_seq = seq
+            if origin != pid and kind in self.handlers:
+                self.handlers[kind](json.loads(payload))
+
+
+if change_log_enabled and change_log_path is None:
+    logger.warning(
+        "CHANGE_LOG_ENABLED needs a file-backed SQLite database or CHANGE_LOG_PATH"
+    )
+change_log = (
+    ChangeLog(change_log_path) if change_log_enabled and change_log_path else None
+)
+
+
+# Bring this worker's caches and versions up to date with the other workers
+def sync_changes():
+    if change_log is not None:
+        change_log.sync()
@@ -0,0 +1,161 @@
+import functools
+import gzip
+import os
+import zlib
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+
+# brotli compresses JSON smaller than gzip at similar CPU cost. It is in
+# requirements.txt; without it installed only gzip is offered.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+compression_enabled = os.getenv("COMPRESSION_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Bodies below this many bytes are sent as is; the gain would not pay for the CPU
+compression_min_size = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# gzip above 6 saves about 1% more on catalog JSON for 2-5x the CPU
+gzip_level = int(os.getenv("GZIP_LEVEL", "6"))
+# brotli 4 matches gzip 6 on size in less time. Cached bodies are compressed
+# once per write and served many times, so they get 6 (another 5-7%); 9 and up
+# cost 10-100x more for little gain (see benchmarks/compression.py).
+brotli_quality = int(os.getenv("BROTLI_QUALITY", "4"))
+cached_brotli_quality = int(os.getenv("CACHED_BROTLI_QUALITY", "6"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+# In order of preference when the client accepts several equally
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+# Pick the encoding for an Accept-Encoding header: the supported coding with
+# the highest q-value, "*" standing for any coding not listed. Clients send a
+# handful of distinct headers, so the parse is cached.
+@functools.lru_cache(maxsize=256)
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    if not accept_encoding or not compression_enabled:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    if encoding == "br":
+        quality = cached_brotli_quality if cached else brotli_quality
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+# (process, finish) for a streamed body: process(chunk) returns what is ready
+# so far, finish() the rest
+def stream_compressor(encoding: str):
+    if encoding == "br":
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=brotli_quality)
+        return compressor.process, compressor.finish
+    # wbits 16 + 15: a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, compressor.flush
+
+
+# Headers for a body sent with `encoding`. The bytes differ from the identity
+# body, so a strong ETag becomes weak; conditional GETs compare weakly anyway.
+def set_encoding_headers(headers: MutableHeaders, encoding: str):
+    headers["Content-Encoding"] = encoding
+    headers.add_vary_header("Accept-Encoding")
+    etag = headers.get("etag")
+    if etag is not None and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+def is_compressible(status: int, headers: Headers) -> bool:
+    return (
+        status not in (204, 304)
+        and "content-encoding" not in headers
+        and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+# Pure ASGI middleware compressing JSON, NDJSON and text responses for clients
+# that accept it. A whole body is compressed in one call; a streamed one (the
+# exports) chunk by chunk. Responses that already carry Content-Encoding, such
+# as precompressed cache entries, pass through untouched.
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not compression_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        start = None
+        stream = None
+
+        async def send_compressed(message):
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows how to send it
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is None:
+                if stream is not None:
+                    process, finish = stream
+                    body = process(body)
+                    if not more_body:
+                        body += finish()
+                    message = {**message, "body": body}
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            response_start, start = start, None
+            if not is_compressible(response_start["status"], headers) or (
+                not more_body and len(body) < compression_min_size
+            ):
+                await send(response_start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is None:
+                await send(response_start)
+                await send(message)
+                return
+            set_encoding_headers(headers, encoding)
+            if more_body:
+                stream = stream_compressor(encoding)
+                del headers["Content-Length"]
+                body = stream[0](body)
+            else:
+                body = compress(body, encoding)
+                headers["Content-Length"] = str(len(body))
+            await send(response_start)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
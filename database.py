@@ -1,5 +1,10 @@
 import os
+import asyncio
+import contextvars
 import logging
+from contextlib import asynccontextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
@@ -10,10 +15,137 @@ logger = logging.getLogger(__name__)
 # Load the database URL from environment variables
 database_url = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./store.db")
 
+# SQLite profile: "tuned" applies SQLITE_PRAGMAS to every new connection,
+# "default" leaves the driver defaults (rollback journal, synchronous=FULL)
+sqlite_profile = os.getenv("SQLITE_PROFILE", "tuned")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative values are KiB, so -65536 is a 64 MiB page cache
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+# Pool settings; ignored for in-memory databases, which use a single static connection
+pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+pool_pre_ping = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_memory_sqlite(url: str) -> bool:
+    database = make_url(url).database
+    return is_sqlite(url) and database in (None, "", ":memory:")
+
+
+def engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": pool_pre_ping}
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    if not is_memory_sqlite(url):
+        options.update(
+            pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout
+        )
+    return options
+
+
+# Register a connect hook that applies the pragmas to each new DBAPI connection
+def apply_sqlite_pragmas(sync_engine, pragmas: dict = SQLITE_PRAGMAS):
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return set_sqlite_pragmas
+
+
+# Read/write split: reads use a pool of read-only connections and every write
+# goes through one writer task that groups queued writes into a single transaction
+write_queue_enabled = os.getenv("DB_WRITE_QUEUE", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+write_batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))
+
+
+def read_only_url(url: str) -> str:
+    parsed = make_url(url)
+    path = os.path.abspath(parsed.database)
+    return str(
+        parsed.set(database=f"file:{path}").update_query_dict(
+            {"mode": "ro", "uri": "true"}
+        )
+    )
+
+
+# SQLite only supports SAVEPOINT reliably when the driver's implicit
+# transaction handling is disabled and BEGIN is emitted explicitly.
+# A "sqlite_begin" execution option overrides the statement per engine proxy.
+def use_explicit_begin(sync_engine, begin_statement: str = "BEGIN"):
+    @event.listens_for(sync_engine, "connect")
+    def disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sync_engine, "begin")
+    def emit_begin(conn):
+        options = conn.get_execution_options()
+        conn.exec_driver_sql(options.get("sqlite_begin", begin_statement))
+
+
 # Create the database engine
-engine = create_async_engine(database_url, connect_args={"check_same_thread": False})
+if (
+    write_queue_enabled
+    and is_sqlite(database_url)
+    and not is_memory_sqlite(database_url)
+):
+    engine = create_async_engine(
+        database_url,
+        **{**engine_options(database_url), "pool_size": 1, "max_overflow": 0},
+    )
+    read_engine = create_async_engine(
+        read_only_url(database_url), **engine_options(database_url)
+    )
+    use_explicit_begin(engine.sync_engine, "BEGIN IMMEDIATE")
+else:
+    write_queue_enabled = False
+    engine = create_async_engine(database_url, **engine_options(database_url))
+    read_engine = engine
+    if is_sqlite(database_url):
+        use_explicit_begin(engine.sync_engine)
+
+if is_sqlite(database_url) and sqlite_profile == "tuned":
+    apply_sqlite_pragmas(engine.sync_engine)
+    if read_engine is not engine:
+        read_pragmas = {k: v for k, v in SQLITE_PRAGMAS.items() if k != "journal_mode"}
+        apply_sqlite_pragmas(read_engine.sync_engine, read_pragmas)
+
 SessionLocal = sessionmaker(
-    autocommit=False, autoflush=False, bind=engine, class_=AsyncSession
+    autocommit=False, autoflush=False, bind=read_engine, class_=AsyncSession
+)
+# Objects returned from a write job are serialized after the commit,
+# so they must not be expired by it. Write transactions take the write lock
+# up front: a deferred transaction that reads and then writes gets SQLITE_BUSY
+# without waiting when another writer commits in between.
+WriteSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=(
+        engine.execution_options(sqlite_begin="BEGIN IMMEDIATE")
+        if is_sqlite(database_url)
+        else engine
+    ),
+    class_=AsyncSession,
+    expire_on_commit=False,
 )
 Base = declarative_base()
 
@@ -28,3 +160,124 @@ async def get_db():
             raise
         finally:
             await session.close()
+
+
+# Lets a maintenance step (reset-db) wait for in-flight write transactions to
+# finish and hold new ones back until it is done.
+# With `serialize`, writers also take turns in process: SQLite allows one writer
+# anyway, and a writer left waiting in SQLite's busy handler polls with growing
+# sleeps and holds its connection's mutex for up to busy_timeout meanwhile.
+class WriteGate:
+    def __init__(self, serialize: bool = False):
+        self.open = asyncio.Event()
+        self.open.set()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.active = 0
+        self.lock = asyncio.Lock() if serialize else None
+
+    @asynccontextmanager
+    async def writing(self):
+        await self.open.wait()
+        self.active += 1
+        self.idle.clear()
+        try:
+            if self.lock is None:
+                yield
+            else:
+                async with self.lock:
+                    yield
+        finally:
+            self.active -= 1
+            if self.active == 0:
+                self.idle.set()
+
+    @asynccontextmanager
+    async def closed(self):
+        self.open.clear()
+        try:
+            await self.idle.wait()
+            yield
+        finally:
+            self.open.set()
+
+
+write_gate = WriteGate(serialize=is_sqlite(database_url))
+
+
+# Single writer task. Each job runs in its own SAVEPOINT so a failing job
+# (404, constraint violation) only rolls back itself; the batch commits once.
+class WriteQueue:
+    def __init__(self, session_factory, max_batch: int):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            # Fresh context: the writer serves every request, not the one that started it
+            self.task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def submit(self, job):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((job, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            async with write_gate.writing():
+                await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch):
+        outcomes = []
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    for job, future in batch:
+                        try:
+                            async with session.begin_nested():
+                                outcomes.append((future, await job(session), None))
+                        except Exception as e:
+                            outcomes.append((future, None, e))
+        except Exception as e:
+            logger.error(f"Write batch failed: {e}")
+            outcomes = [(future, None, e) for _, future in batch]
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+write_queue = (
+    WriteQueue(WriteSessionLocal, write_batch_size) if write_queue_enabled else None
+)
+
+
+# Run `job(session)` in a write transaction and return its result.
+# Jobs should flush rather than commit; the commit happens here or in the writer task.
+async def run_write(job):
+    if write_queue is not None:
+        return await write_queue.submit(job)
+    async with write_gate.writing():
+        async with WriteSessionLocal() as session:
+            result = await job(session)
+            await session.commit()
+            return result
@@ -0,0 +1,58 @@
+import json
+from datetime import date, datetime
+from typing import Literal
+from fastapi.responses import StreamingResponse
+from sqlalchemy.future import select
+from database import SessionLocal
+
+EXPORT_CHUNK_SIZE = 1000
+
+ExportFormat = Literal["ndjson", "json"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def _encode_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+# Stream plain column rows from the table in chunks of EXPORT_CHUNK_SIZE.
+# Selecting columns instead of ORM objects keeps the identity map empty,
+# so memory stays flat regardless of table size.
+async def iter_rows(model):
+    async with SessionLocal() as session:
+        stmt = (
+            select(*model.__table__.columns)
+            .order_by(model.id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        result = await session.stream(stmt)
+        async for partition in result.mappings().partitions():
+            yield [json.dumps(dict(row), default=_encode_default) for row in partition]
+
+
+async def iter_ndjson(model):
+    async for lines in iter_rows(model):
+        yield "".join(line + "\n" for line in lines)
+
+
+async def iter_json_array(model):
+    yield "["
+    first = True
+    async for lines in iter_rows(model):
+        chunk = ",".join(lines)
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]"
+
+
+# The session is opened inside the generator rather than taken from get_db,
+# because the request-scoped session is closed before the body is streamed.
+def export_response(model, fmt: ExportFormat) -> StreamingResponse:
+    body = iter_ndjson(model) if fmt == "ndjson" else iter_json_array(model)
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt])
@@ -1,20 +1,22 @@
-import os
-from typing import Literal
-from fastapi import FastAPI, Depends
+import time
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from database import Base, engine
-
-# from routes import CategoryRoute, CustomerRoute, EmployeeRoute
-from Routes import (
-    ExerciseRoute,
-    LessonRoute,
-    ResetDBRoute,
-    SongRoute,
-    UserRoute,
-    UserProgressRoute,
-    PracticeRoomRoute,
-)
+from changelog import change_log
+from compression import CompressionMiddleware
+from database import database_url, engine, is_sqlite, read_engine, write_queue
+from maintenance import scheduler
+from metrics import TimingMiddleware, instrument_engine, instrument_routes, metrics
+from pagination import NEXT_CURSOR_HEADER
+from recommend import recommender
+from routers import include_route_groups, load_route_groups
+from schema import init_schema, schema_is_current
+
+# Route modules are imported on first use (see routers.py); only /metrics is eager
+from Routes import MetricsRoute
+
+# Subscribes the table versions (and the response cache) to the change log
+# before the lifespan opens it, whether or not a route module was loaded yet
+import versioning  # noqa: F401
 import logging
 from contextlib import asynccontextmanager
 
@@ -22,28 +24,66 @@ from contextlib import asynccontextmanager
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
-    title="FastAPI with SQLite For Music4You app",
-    description="This is a very fancy project, with auto docs for the API",
-    version="0.1.0",
-)
-
 
-# Create the tables
-async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+# Create the tables, unless the database already carries the current schema
+# version. With several workers starting at once, BEGIN IMMEDIATE makes them
+# take turns instead of racing to create the same tables. Returns whether
+# init_schema ran.
+async def init_db() -> bool:
+    bind = (
+        engine.execution_options(sqlite_begin="BEGIN IMMEDIATE")
+        if is_sqlite(database_url)
+        else engine
+    )
+    async with bind.begin() as conn:
+        if await schema_is_current(conn):
+            return False
+        await init_schema(conn)
+        return True
 
 
 # Lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
+    start = time.perf_counter()
+    applied = await init_db()
+    schema_done = time.perf_counter()
+    if change_log is not None:
+        change_log.connect()
+    ready = time.perf_counter()
+    metrics.startup = {
+        "schema": schema_done - start,
+        "change_log": ready - schema_done,
+    }
+    logger.info(
+        f"Startup took {(ready - start) * 1000:.1f}ms (schema "
+        f"{'applied' if applied else 'current'} in {(schema_done - start) * 1000:.1f}ms)"
+    )
+    # Builds in the background; the first recommendation request waits for it
+    recommender.start()
+    scheduler.start()
     yield
-    # Add any cleanup code here if needed
+    await scheduler.stop()
+    await recommender.stop()
+    if write_queue is not None:
+        await write_queue.stop()
+
+
+app = FastAPI(
+    title="FastAPI with SQLite For Music4You app",
+    description="This is a very fancy project, with auto docs for the API",
+    version="0.1.0",
+    lifespan=lifespan,
+)
+
+
+# The schema covers every route, so build it with all groups loaded
+def openapi():
+    load_route_groups(app)
+    return FastAPI.openapi(app)
 
 
-app = FastAPI(lifespan=lifespan)
+app.openapi = openapi
 
 
 app.add_middleware(
@@ -52,20 +92,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified", "Server-Timing"],
 )
+# Inside TimingMiddleware, so Server-Timing totals include compression
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(TimingMiddleware)
 
+instrument_engine(engine.sync_engine)
+if read_engine is not engine:
+    instrument_engine(read_engine.sync_engine)
 
-class FilterParams(BaseModel):
-    limit: int = Field(100, gt=0, le=100)
-    offset: int = Field(0, ge=0)
-    order_by: Literal["created_at", "updated_at"] = "created_at"
-    tags: list[str] = []
 
+include_route_groups(app)
+app.include_router(MetricsRoute.router, tags=["metrics"])
 
-app.include_router(ResetDBRoute.router, prefix="/api/v1", tags=["reset-db"])
-app.include_router(SongRoute.router, prefix="/api/v1", tags=["songs"])
-app.include_router(UserRoute.router, prefix="/api/v1", tags=["users"])
-app.include_router(UserProgressRoute.router, prefix="/api/v1", tags=["user-progress"])
-app.include_router(LessonRoute.router, prefix="/api/v1", tags=["lessons"])
-app.include_router(ExerciseRoute.router, prefix="/api/v1", tags=["exercises"])
-app.include_router(PracticeRoomRoute.router, prefix="/api/v1", tags=["practice-rooms"])
+instrument_routes(app.routes)
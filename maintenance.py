@@ -0,0 +1,274 @@
+import asyncio
+import contextvars
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime, timezone
+from sqlalchemy.engine import make_url
+from database import (
+    SQLITE_PRAGMAS,
+    database_url,
+    is_memory_sqlite,
+    is_sqlite,
+    run_write,
+    write_gate,
+)
+from stats import refresh_stats
+from versioning import table_versions
+
+logger = logging.getLogger(__name__)
+
+maintenance_enabled = os.getenv("MAINTENANCE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Jobs running at once, periodic and on-demand together
+maintenance_concurrency = int(os.getenv("MAINTENANCE_CONCURRENCY", "1"))
+# Runs kept for GET /maintenance/runs
+history_size = int(os.getenv("MAINTENANCE_HISTORY", "100"))
+# Free pages returned to the file per incremental vacuum run
+vacuum_pages = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "2000"))
+
+
+def interval(name: str, default: float) -> float:
+    return float(os.getenv(f"MAINTENANCE_{name.upper()}_SECONDS", str(default)))
+
+
+def database_file():
+    if not is_sqlite(database_url) or is_memory_sqlite(database_url):
+        return None
+    return os.path.abspath(make_url(database_url).database)
+
+
+# Jobs below run on their own autocommit connection in a worker thread (VACUUM
+# cannot run inside a transaction) and return a dict for the run history
+
+
+# Lets SQLite re-analyze the tables whose statistics it thinks are stale;
+# cheap when nothing changed much
+def optimize(conn: sqlite3.Connection) -> dict:
+    conn.execute("PRAGMA optimize")
+    return {}
+
+
+# Full statistics for the query planner, for after bulk loads and reseeds
+def analyze(conn: sqlite3.Connection) -> dict:
+    conn.execute("ANALYZE")
+    return {}
+
+
+# Copy the WAL back into the database and truncate it, so the -wal file does
+# not keep the size of the largest burst of writes
+def wal_checkpoint(conn: sqlite3.Connection) -> dict:
+    busy, log, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    return {"busy": bool(busy), "log_frames": log, "checkpointed_frames": checkpointed}
+
+
+def page_counts(conn: sqlite3.Connection) -> dict:
+    return {
+        "pages": conn.execute("PRAGMA page_count").fetchone()[0],
+        "free_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+    }
+
+
+AUTO_VACUUM_MODES = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}
+
+
+# Give up to `vacuum_pages` free pages back to the file system. Needs
+# auto_vacuum=INCREMENTAL, which the vacuum job turns on; with FULL every
+# commit already does this.
+def incremental_vacuum(conn: sqlite3.Connection) -> dict:
+    (mode,) = conn.execute("PRAGMA auto_vacuum").fetchone()
+    before = page_counts(conn)
+    if mode != 2:
+        return {**before, "skipped": f"auto_vacuum is {AUTO_VACUUM_MODES[mode]}"}
+    # executescript steps the pragma to completion; execute() frees one page
+    conn.executescript(f"PRAGMA incremental_vacuum({vacuum_pages});")
+    return {"before": before, "after": page_counts(conn)}
+
+
+# Rewrite the whole file, dropping every free page and defragmenting tables and
+# indexes. A database without auto-vacuum is switched to INCREMENTAL on the
+# way, so incremental_vacuum can shrink it in steps afterwards. Needs free disk
+# space about the size of the database.
+def vacuum(conn: sqlite3.Connection) -> dict:
+    before = page_counts(conn)
+    (mode,) = conn.execute("PRAGMA auto_vacuum").fetchone()
+    if mode == 0:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    (mode,) = conn.execute("PRAGMA auto_vacuum").fetchone()
+    return {
+        "before": before,
+        "after": page_counts(conn),
+        "auto_vacuum": AUTO_VACUUM_MODES[mode],
+    }
+
+
+def run_on_database(job, path: str) -> dict:
+    conn = sqlite3.connect(
+        path,
+        isolation_level=None,
+        timeout=SQLITE_PRAGMAS["busy_timeout"] / 1000,
+    )
+    try:
+        return job(conn)
+    finally:
+        conn.close()
+
+
+async def sqlite_job(job) -> dict:
+    # Behind in-process writers rather than in SQLite's busy handler
+    async with write_gate.writing():
+        return await asyncio.to_thread(run_on_database, job, database_file())
+
+
+async def rebuild_stats() -> dict:
+    await run_write(refresh_stats)
+    await table_versions.bump("UserStats", "LessonStats")
+    return {}
+
+
+# name -> (coroutine returning details, default interval in seconds; 0 means
+# on demand only). Each interval is overridden by MAINTENANCE_<NAME>_SECONDS.
+JOBS = {
+    "optimize": (lambda: sqlite_job(optimize), 3600),
+    "wal_checkpoint": (lambda: sqlite_job(wal_checkpoint), 600),
+    "incremental_vacuum": (lambda: sqlite_job(incremental_vacuum), 6 * 3600),
+    "analyze": (lambda: sqlite_job(analyze), 0),
+    "vacuum": (lambda: sqlite_job(vacuum), 0),
+    "rebuild_stats": (rebuild_stats, 0),
+}
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+# In-process scheduler for maintenance jobs. Periodic jobs first run one
+# interval after startup; any job can also be started on demand. A job never
+# overlaps itself, and at most `maintenance_concurrency` run at once. Each
+# worker runs its own schedule; the periodic jobs are idempotent and cheap when
+# there is nothing to do.
+class MaintenanceScheduler:
+    def __init__(self):
+        self.intervals = {
+            name: interval(name, every) for name, (_, every) in JOBS.items()
+        }
+        self.next_run = {}
+        self.running = {}
+        self.last_run = {}
+        self.history = deque(maxlen=history_size)
+        self.semaphore = asyncio.Semaphore(maintenance_concurrency)
+        self.task = None
+
+    @property
+    def available(self) -> bool:
+        return database_file() is not None
+
+    def start(self):
+        if not maintenance_enabled or not self.available:
+            return
+        if self.task is None or self.task.done():
+            now = time.monotonic()
+            self.next_run = {
+                name: now + every for name, every in self.intervals.items() if every > 0
+            }
+            self.task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        # Let on-demand runs finish rather than leave a VACUUM half done
+        running = [run["task"] for run in self.running.values()]
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _run(self):
+        while self.next_run:
+            now = time.monotonic()
+            for name, due in self.next_run.items():
+                if due <= now:
+                    self.next_run[name] = now + self.intervals[name]
+                    if name not in self.running:
+                        self.trigger(name, "schedule")
+            await asyncio.sleep(
+                max(0.0, min(self.next_run.values()) - time.monotonic())
+            )
+
+    # Start a job unless it is already running; returns its run record either way
+    def trigger(self, name: str, trigger: str = "manual") -> dict:
+        if name in self.running:
+            return self.running[name]["record"]
+        record = {
+            "job": name,
+            "trigger": trigger,
+            "status": "queued",
+            "queued_at": utc_now(),
+            "started_at": None,
+            "duration_ms": None,
+            "details": None,
+            "error": None,
+        }
+        task = asyncio.create_task(
+            self._execute(name, record), context=contextvars.Context()
+        )
+        self.running[name] = {"record": record, "task": task}
+        return record
+
+    async def wait(self, name: str):
+        run = self.running.get(name)
+        if run is not None:
+            await asyncio.shield(run["task"])
+
+    async def _execute(self, name: str, record: dict):
+        job, _ = JOBS[name]
+        try:
+            async with self.semaphore:
+                record["status"] = "running"
+                record["started_at"] = utc_now()
+                start = time.perf_counter()
+                try:
+                    record["details"] = await job()
+                    record["status"] = "succeeded"
+                except Exception as e:
+                    record["status"] = "failed"
+                    record["error"] = str(e)
+                    logger.error(f"Maintenance job {name} failed: {e}")
+                record["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                logger.info(
+                    f"Maintenance job {name} {record['status']} in "
+                    f"{record['duration_ms']}ms"
+                )
+        finally:
+            self.running.pop(name, None)
+            self.last_run[name] = record
+            self.history.appendleft(record)
+
+    def jobs(self) -> list:
+        now = time.monotonic()
+        return [
+            {
+                "name": name,
+                "interval_seconds": every or None,
+                "next_run_in_seconds": (
+                    round(self.next_run[name] - now, 1)
+                    if name in self.next_run
+                    else None
+                ),
+                "running": name in self.running,
+                "last_run": self.last_run.get(name),
+            }
+            for name, every in self.intervals.items()
+        ]
+
+
+scheduler = MaintenanceScheduler()
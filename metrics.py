@@ -0,0 +1,265 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import time
+from collections import defaultdict
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Statements slower than this are logged with their route; 0 disables the log
+slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+# Seconds; roughly doubling from 1ms to 10s
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# Timings for the request being handled, set by TimingMiddleware
+class RequestTiming:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.route = None
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.handler_end = None
+
+
+current_timing = contextvars.ContextVar("current_timing", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels: dict) -> str:
+    def escape(value):
+        return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+# Per-route request latency histograms plus DB and serialization totals,
+# rendered in the Prometheus text format
+class Metrics:
+    def __init__(self):
+        self.requests = defaultdict(Histogram)
+        self.db_queries = defaultdict(int)
+        self.db_seconds = defaultdict(float)
+        self.serialize_seconds = defaultdict(float)
+        self.slow_queries = 0
+        # Lifespan phase -> seconds, set once at startup
+        self.startup = {}
+
+    def record_request(self, method, route, status, timing: RequestTiming, duration):
+        self.requests[(method, route, status)].observe(duration)
+        key = (method, route)
+        self.db_queries[key] += timing.db_queries
+        self.db_seconds[key] += timing.db_time
+
+    def record_serialize(self, method, route, seconds):
+        self.serialize_seconds[(method, route)] += seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Time from request start to last body byte.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), histogram in sorted(self.requests.items()):
+            labels = {"method": method, "route": route, "status": status}
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                bucket = format_labels({**labels, "le": bound})
+                lines.append(
+                    f"http_request_duration_seconds_bucket{{{bucket}}} {cumulative}"
+                )
+            bucket = format_labels({**labels, "le": "+Inf"})
+            lines.append(
+                f"http_request_duration_seconds_bucket{{{bucket}}} {histogram.count}"
+            )
+            lines.append(
+                f"http_request_duration_seconds_sum{{{format_labels(labels)}}} {histogram.sum}"
+            )
+            lines.append(
+                f"http_request_duration_seconds_count{{{format_labels(labels)}}} {histogram.count}"
+            )
+
+        for name, help_text, values in (
+            ("db_queries_total", "SQL statements executed.", self.db_queries),
+            ("db_query_seconds_total", "Time spent executing SQL.", self.db_seconds),
+            (
+                "http_serialize_seconds_total",
+                "Time from handler return to response start (validation and encoding).",
+                self.serialize_seconds,
+            ),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (method, route), value in sorted(values.items()):
+                labels = format_labels({"method": method, "route": route})
+                lines.append(f"{name}{{{labels}}} {value}")
+
+        lines.append(
+            "# HELP db_slow_queries_total Statements slower than SLOW_QUERY_MS."
+        )
+        lines.append("# TYPE db_slow_queries_total counter")
+        lines.append(f"db_slow_queries_total {self.slow_queries}")
+
+        lines.append("# HELP app_startup_seconds Time spent in each startup phase.")
+        lines.append("# TYPE app_startup_seconds gauge")
+        for phase, seconds in self.startup.items():
+            labels = format_labels({"phase": phase})
+            lines.append(f"app_startup_seconds{{{labels}}} {seconds}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# Count statements and DB time against the current request and log slow ones.
+# Statements outside a request (startup, the write queue task) are only slow-logged.
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - context._query_start
+        timing = current_timing.get()
+        if timing is not None:
+            timing.db_queries += 1
+            timing.db_time += elapsed
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            metrics.slow_queries += 1
+            route = timing.route if timing is not None else None
+            logger.warning(
+                f"Slow query {elapsed * 1000:.1f}ms route={route}: "
+                f"{' '.join(statement.split())[:500]}"
+            )
+
+
+# Record the route when each endpoint function starts and mark when it returns,
+# so the time FastAPI then spends validating and encoding the return value can
+# be reported separately. Route groups loaded on first use are instrumented then.
+def instrument_routes(routes):
+    def timed(call, path):
+        @functools.wraps(call)
+        async def wrapper(*args, **kwargs):
+            timing = current_timing.get()
+            if timing is not None:
+                timing.route = path
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                timing = current_timing.get()
+                if timing is not None:
+                    timing.handler_end = time.perf_counter()
+
+        wrapper.timed_route = True
+        return wrapper
+
+    # FastAPI decided sync/async per route at registration; keep sync ones as they are.
+    # Routes already wrapped (the same list passed again) are left alone.
+    for route in routes:
+        if (
+            isinstance(route, APIRoute)
+            and asyncio.iscoroutinefunction(route.dependant.call)
+            and not getattr(route.dependant.call, "timed_route", False)
+        ):
+            route.dependant.call = timed(route.dependant.call, route.path)
+
+
+def server_timing(timing: RequestTiming, now: float) -> str:
+    parts = [f'db;dur={timing.db_time * 1000:.2f};desc="{timing.db_queries} queries"']
+    if timing.handler_end is not None:
+        parts.append(f"app;dur={(timing.handler_end - timing.start) * 1000:.2f}")
+        parts.append(f"serialize;dur={(now - timing.handler_end) * 1000:.2f}")
+    parts.append(f"total;dur={(now - timing.start) * 1000:.2f}")
+    return ", ".join(parts)
+
+
+# Pure ASGI middleware, so streaming responses are timed to their last byte
+class TimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.route_paths = None
+
+    # Rebuilt when a matched endpoint is missing, i.e. after a lazy route group loaded
+    def route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if self.route_paths is None or (
+            endpoint is not None and endpoint not in self.route_paths
+        ):
+            self.route_paths = {
+                route.endpoint: route.path
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint")
+            }
+        return self.route_paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                status = message["status"]
+                timing.route = timing.route or self.route_path(scope)
+                if timing.handler_end is not None:
+                    metrics.record_serialize(
+                        scope["method"], timing.route, now - timing.handler_end
+                    )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timing, now).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timing.reset(token)
+            route = timing.route or self.route_path(scope)
+            metrics.record_request(
+                scope["method"],
+                route,
+                status,
+                timing,
+                time.perf_counter() - timing.start,
+            )
@@ -1,6 +1,14 @@
 PRAGMA foreign_keys = ON;
 
+-- Makes the app run its schema setup again on the next start
+PRAGMA user_version = 0;
+
 -- Drop all existing tables to avoid conflicts (drop child tables first)
+-- Summary tables the app adds on startup; they reference Users and Lessons
+DROP TABLE IF EXISTS UserStats;
+
+DROP TABLE IF EXISTS LessonStats;
+
 DROP TABLE IF EXISTS UserProgress;
 
 DROP TABLE IF EXISTS Achievements;
@@ -25,6 +33,8 @@ CREATE TABLE IF NOT EXISTS Users (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX IF NOT EXISTS ix_Users_created_at ON Users (created_at);
+
 INSERT
     OR IGNORE INTO Users (username, email, avatar_url)
 VALUES (
@@ -147,6 +157,8 @@ CREATE TABLE IF NOT EXISTS Exercises (
     FOREIGN KEY (lesson_id) REFERENCES Lessons (id)
 );
 
+CREATE INDEX IF NOT EXISTS ix_Exercises_lesson_id ON Exercises (lesson_id);
+
 INSERT
     OR IGNORE INTO Exercises (
         lesson_id,
@@ -525,6 +537,12 @@ CREATE TABLE IF NOT EXISTS PracticeRooms (
     FOREIGN KEY (host_user_id) REFERENCES Users (id)
 );
 
+CREATE INDEX IF NOT EXISTS ix_PracticeRooms_host_user_id ON PracticeRooms (host_user_id);
+
+CREATE INDEX IF NOT EXISTS ix_PracticeRooms_created_at ON PracticeRooms (created_at);
+
+CREATE INDEX IF NOT EXISTS ix_PracticeRooms_lower_instrument ON PracticeRooms (lower(instrument));
+
 INSERT
     OR IGNORE INTO PracticeRooms (
         room_name,
@@ -596,6 +614,10 @@ CREATE TABLE IF NOT EXISTS UserProgress (
     FOREIGN KEY (lesson_id) REFERENCES Lessons (id)
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS ix_UserProgress_user_id_lesson_id ON UserProgress (user_id, lesson_id);
+
+CREATE INDEX IF NOT EXISTS ix_UserProgress_lesson_id ON UserProgress (lesson_id);
+
 INSERT
     OR IGNORE INTO UserProgress (
         user_id,
@@ -0,0 +1,117 @@
+import base64
+import json
+from typing import Literal, Optional
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import String, and_, or_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from serialization import rows_as_dicts
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Query parameters shared by every list endpoint.
+# Subclasses add optional equality filters named after model columns.
+class PageParams(BaseModel):
+    limit: int = Field(DEFAULT_LIMIT, gt=0, le=MAX_LIMIT)
+    cursor: Optional[str] = None
+    order_by: Literal["id"] = "id"
+    order: Literal["asc", "desc"] = "asc"
+
+    def filters(self):
+        pagination_fields = set(PageParams.model_fields)
+        return {
+            name: value
+            for name, value in self.model_dump().items()
+            if name not in pagination_fields and value is not None
+        }
+
+
+# For tables that also carry a created_at column
+class TimestampPageParams(PageParams):
+    order_by: Literal["id", "created_at"] = "id"
+
+
+def encode_cursor(key, last_id: int) -> str:
+    payload = json.dumps({"k": key, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        key = payload["k"]
+        # The key is bound into the keyset WHERE clause, so only scalars; None
+        # is the key of a row whose order column is NULL
+        if isinstance(key, bool) or not isinstance(key, (str, int, float, type(None))):
+            raise TypeError(key)
+        return key, int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# Rows after the cursor (key, last_id) in ORDER BY key, id. SQLite sorts NULL
+# keys first ascending and last descending, and a NULL never compares, so they
+# are matched with IS NULL.
+def after_key(key_col, id_col, key, last_id, descending: bool):
+    same_key = key_col.is_(None) if key is None else key_col == key
+    after = and_(same_key, id_col < last_id if descending else id_col > last_id)
+    if descending:
+        if key is None:
+            return after
+        return or_(key_col < key, after, key_col.is_(None))
+    if key is None:
+        return or_(after, key_col.is_not(None))
+    return or_(key_col > key, after)
+
+
+# Build a keyset-paginated select: WHERE (key, id) > cursor ORDER BY key, id LIMIT n+1.
+# The extra row tells us whether there is a next page without a COUNT(*).
+# Non-id keys are compared as the raw stored text, since seeded and ORM-written
+# timestamps use different string formats; the raw key is selected as a second column.
+def page_query(model, params: PageParams, stmt=None):
+    if stmt is None:
+        stmt = select(model)
+    for name, value in params.filters().items():
+        stmt = stmt.where(getattr(model, name) == value)
+
+    key_col = getattr(model, params.order_by)
+    if params.order_by != "id":
+        key_col = type_coerce(key_col, String)
+        stmt = stmt.add_columns(key_col.label("cursor_key"))
+    descending = params.order == "desc"
+    if params.cursor:
+        key, last_id = decode_cursor(params.cursor)
+        if params.order_by == "id":
+            stmt = stmt.where(model.id < last_id if descending else model.id > last_id)
+        else:
+            stmt = stmt.where(after_key(key_col, model.id, key, last_id, descending))
+
+    order_cols = [key_col] if params.order_by == "id" else [key_col, model.id]
+    if descending:
+        order_cols = [col.desc() for col in order_cols]
+    return stmt.order_by(*order_cols).limit(params.limit + 1)
+
+
+# Fetch one page and advertise the next cursor through the X-Next-Cursor header,
+# so the list endpoints keep returning plain JSON arrays.
+# Only `columns` are selected (see serialization.schema_columns) and rows come
+# back as dicts ready to encode, without ORM objects or model validation.
+# `stmt`, when given, must select the same columns.
+async def fetch_page(
+    db: AsyncSession, model, columns, params: PageParams, response: Response, stmt=None
+):
+    if stmt is None:
+        stmt = select(*columns)
+    rows = (await db.execute(page_query(model, params, stmt))).all()
+    if len(rows) > params.limit:
+        rows = rows[: params.limit]
+        last = rows[-1]
+        key = last.id if params.order_by == "id" else last.cursor_key
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key, last.id)
+    return rows_as_dicts(rows, columns)
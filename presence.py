@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+from fastapi import WebSocket
+from serialization import dump_json
+
+logger = logging.getLogger(__name__)
+
+# Messages waiting for one socket before it counts as a slow consumer
+send_queue_size = int(os.getenv("PRESENCE_SEND_QUEUE", "64"))
+MAX_CHAT_LENGTH = 2000
+MIN_BPM, MAX_BPM = 20, 400
+
+# Close codes: 1013 asks the client to reconnect later, 4404 mirrors HTTP 404
+SLOW_CONSUMER_CLOSE = 1013
+ROOM_GONE_CLOSE = 4404
+
+
+# One open socket. Broadcasts only append to its bounded queue; a sender task
+# drains the queue into the socket, so a slow client never blocks the others.
+class Connection:
+    def __init__(self, websocket: WebSocket, room_id: int, user_id: int):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.user_id = user_id
+        self.queue = asyncio.Queue(send_queue_size)
+        self.sender = None
+        self.closed = False
+
+    def push(self, text: str) -> bool:
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    # A failed send means the client is gone; the receive loop sees the disconnect
+    async def send_loop(self):
+        try:
+            while True:
+                text = await self.queue.get()
+                await self.websocket.send_text(text)
+        except Exception:
+            pass
+
+
+# In-process registry of who is connected to which practice room. Presence,
+# chat and metronome messages fan out from here without touching SQLite.
+# Each worker only sees its own sockets.
+class RoomRegistry:
+    def __init__(self):
+        self.rooms = {}
+        self.user_counts = {}
+        self.closing = set()
+        self.messages_in = 0
+        self.messages_out = 0
+        self.slow_consumers = 0
+
+    def is_live(self, room_id: int) -> bool:
+        return room_id in self.rooms
+
+    def members(self, room_id: int):
+        return sorted(self.user_counts.get(room_id, {}))
+
+    def join(self, websocket: WebSocket, room_id: int, user_id: int) -> Connection:
+        conn = Connection(websocket, room_id, user_id)
+        conn.sender = asyncio.create_task(conn.send_loop())
+        self.rooms.setdefault(room_id, set()).add(conn)
+        counts = self.user_counts.setdefault(room_id, {})
+        counts[user_id] = counts.get(user_id, 0) + 1
+        conn.push(self._encode(self._presence(room_id)))
+        # A second tab of someone already present is not news to the room
+        if counts[user_id] == 1:
+            self.broadcast(room_id, {"type": "join", "user_id": user_id}, exclude=conn)
+        return conn
+
+    def leave(self, conn: Connection):
+        if conn.closed:
+            return
+        conn.closed = True
+        conn.sender.cancel()
+        room = self.rooms.get(conn.room_id)
+        if room is None:
+            return
+        room.discard(conn)
+        counts = self.user_counts[conn.room_id]
+        counts[conn.user_id] -= 1
+        if counts[conn.user_id] == 0:
+            del counts[conn.user_id]
+            self.broadcast(conn.room_id, {"type": "leave", "user_id": conn.user_id})
+        if not room:
+            del self.rooms[conn.room_id]
+            del self.user_counts[conn.room_id]
+
+    # Encode once and queue the same text for every member. A member whose queue
+    # is full is dropped from the room and closed in the background.
+    def broadcast(self, room_id: int, message: dict, exclude: Connection = None):
+        text = self._encode(message)
+        for conn in list(self.rooms.get(room_id, ())):
+            if conn is exclude or conn.closed:
+                continue
+            if conn.push(text):
+                self.messages_out += 1
+            else:
+                self.slow_consumers += 1
+                self.disconnect(conn, SLOW_CONSUMER_CLOSE, "slow consumer")
+
+    def disconnect(self, conn: Connection, code: int, reason: str):
+        self.leave(conn)
+        task = asyncio.create_task(self._close(conn, code, reason))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    def close_room(self, room_id: int):
+        for conn in list(self.rooms.get(room_id, ())):
+            self.disconnect(conn, ROOM_GONE_CLOSE, "practice room deleted")
+
+    # Handle one frame from a client; `text` is None for a binary frame
+    def receive(self, conn: Connection, text: Optional[str]):
+        self.messages_in += 1
+        try:
+            message = json.loads(text)
+        except (TypeError, ValueError):
+            message = None
+        if not isinstance(message, dict):
+            return self._error(conn, "Message must be a JSON object")
+
+        kind = message.get("type")
+        if kind == "ping":
+            conn.push(self._encode({"type": "pong", "server_time": time.time()}))
+        elif kind == "chat":
+            chat = message.get("text")
+            if not isinstance(chat, str) or not chat.strip():
+                return self._error(conn, "Chat text is required")
+            if len(chat) > MAX_CHAT_LENGTH:
+                return self._error(conn, f"Chat text exceeds {MAX_CHAT_LENGTH} chars")
+            self.broadcast(
+                conn.room_id,
+                {
+                    "type": "chat",
+                    "user_id": conn.user_id,
+                    "text": chat,
+                    "sent_at": message.get("sent_at"),
+                },
+            )
+        elif kind == "metronome":
+            bpm = message.get("bpm")
+            if (
+                not isinstance(bpm, (int, float))
+                or isinstance(bpm, bool)
+                or not MIN_BPM <= bpm <= MAX_BPM
+            ):
+                return self._error(conn, f"bpm must be between {MIN_BPM} and {MAX_BPM}")
+            # server_time lets clients line up start_at with their own clocks
+            self.broadcast(
+                conn.room_id,
+                {
+                    "type": "metronome",
+                    "user_id": conn.user_id,
+                    "bpm": bpm,
+                    "beats_per_bar": message.get("beats_per_bar"),
+                    "start_at": message.get("start_at"),
+                    "server_time": time.time(),
+                },
+            )
+        else:
+            self._error(conn, "Unknown message type")
+
+    def stats(self):
+        return {
+            "rooms": len(self.rooms),
+            "connections": sum(len(room) for room in self.rooms.values()),
+            "send_queue_size": send_queue_size,
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "slow_consumers": self.slow_consumers,
+        }
+
+    def _presence(self, room_id: int):
+        return {
+            "type": "presence",
+            "room_id": room_id,
+            "members": self.members(room_id),
+        }
+
+    def _error(self, conn: Connection, detail: str):
+        conn.push(self._encode({"type": "error", "detail": detail}))
+
+    @staticmethod
+    def _encode(message: dict) -> str:
+        return dump_json(message).decode()
+
+    # The server bounds the close handshake itself and drops the TCP connection
+    # of a peer that never acknowledges, which a stalled consumer won't. The
+    # peer may also have gone already, leaving nothing to close.
+    @staticmethod
+    async def _close(conn: Connection, code: int, reason: str):
+        try:
+            await conn.websocket.close(code, reason)
+        except Exception as e:
+            logger.debug(f"Closing socket for user {conn.user_id} failed: {e!r}")
+
+
+room_registry = RoomRegistry()
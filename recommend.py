@@ -0,0 +1,458 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import logging
+import math
+import os
+import time
+from typing import Optional
+from sqlalchemy import text
+from changelog import sync_changes
+from database import SessionLocal
+from versioning import table_versions
+
+logger = logging.getLogger(__name__)
+
+recommendations_enabled = os.getenv("RECOMMENDATIONS_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# How often the model picks up new progress changes
+refresh_interval = float(os.getenv("RECOMMEND_REFRESH_SECONDS", "5"))
+# Incremental refreshes patch the neighbor lists in place, which can leave a
+# list one entry short when a neighbor's score drops; a periodic full build
+# evens that out
+rebuild_interval = float(os.getenv("RECOMMEND_REBUILD_SECONDS", "3600"))
+# How long a request waits for the first build before answering 503
+ready_timeout = float(os.getenv("RECOMMEND_READY_TIMEOUT_SECONDS", "5"))
+# Most similar lessons kept per lesson
+neighbor_count = int(os.getenv("RECOMMEND_NEIGHBORS", "20"))
+MAX_RECOMMENDATIONS = 50
+# Progress changes read per query while catching up
+CHANGE_BATCH = 5000
+# Lessons per numpy/scipy step; bounds how long one call holds the GIL
+SIMILARITY_CHUNK = 64
+
+LESSONS_SQL = text("SELECT id, title, level, type FROM Lessons")
+PROGRESS_SQL = text("SELECT user_id, lesson_id, completed FROM UserProgress")
+SYNC_STATE_SQL = text(
+    "SELECT epoch, (SELECT COALESCE(MAX(seq), 0) FROM UserProgressSync) "
+    "FROM SyncState WHERE id = 1"
+)
+# Walks ix_UserProgressSync_seq from the last change applied
+CHANGES_SQL = text(
+    "SELECT s.seq, s.user_id, s.lesson_id, p.id, p.completed "
+    "FROM UserProgressSync s LEFT JOIN UserProgress p "
+    "ON p.user_id = s.user_id AND p.lesson_id = s.lesson_id "
+    "WHERE s.seq > :seq ORDER BY s.seq LIMIT :limit"
+)
+
+
+# numpy and scipy compute co-completions as sparse matrix products, a chunk of
+# lessons at a time. Without them a pure-Python fallback does one bitset AND
+# per lesson pair: fine for a few hundred lessons, but at 2000 lessons and 50k
+# users a build takes tens of seconds and slows the event loop throughout.
+# Imported on the first build (in its worker thread) rather than at startup,
+# where they would add about 0.2s even with recommendations disabled.
+@functools.cache
+def scipy_modules():
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError:
+        return None
+    return numpy, sparse
+
+
+# Cosine similarity of lesson `a` to every other lesson over who completed
+# them. Each lesson's completers are one Python int with a bit per user, so a
+# co-completion count is an AND and a popcount over the whole column at once.
+# Used when numpy/scipy are not installed.
+def similarity_row(a: int, completers: dict, counts: dict) -> dict:
+    bits, count = completers.get(a, 0), counts.get(a, 0)
+    row = {}
+    if not count:
+        return row
+    for b, other in completers.items():
+        if b == a or not counts[b]:
+            continue
+        both = (bits & other).bit_count()
+        if both:
+            row[b] = both / math.sqrt(count * counts[b])
+    return row
+
+
+def top_neighbors(row: dict) -> list:
+    return heapq.nlargest(neighbor_count, row.items(), key=lambda item: item[1])
+
+
+# The completers as a sparse users x lessons 0/1 matrix in both layouts, the
+# lesson id of each column and the completions per lesson. The bitsets of a
+# chunk of lessons are laid out as one lessons x bytes array; only its nonzero
+# bytes are unpacked, and they come out ordered by lesson and user, so the
+# column layout is built as is.
+def completion_matrix(completers: dict):
+    np, sparse = scipy_modules()
+    lessons = list(completers)
+    size = (
+        max((bits.bit_length() for bits in completers.values()), default=0) + 7
+    ) // 8
+    users, counts = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for start in range(0, len(lessons), SIMILARITY_CHUNK):
+        chunk = lessons[start : start + SIMILARITY_CHUNK]
+        packed = np.frombuffer(
+            b"".join(completers[lesson].to_bytes(size, "little") for lesson in chunk),
+            np.uint8,
+        ).reshape(len(chunk), size)
+        lesson_index, byte_index = np.nonzero(packed)
+        bits = np.unpackbits(
+            packed[lesson_index, byte_index][:, None], axis=1, bitorder="little"
+        )
+        nonzero, bit = np.nonzero(bits)
+        users.append(byte_index[nonzero] * 8 + bit)
+        counts.append(np.bincount(lesson_index[nonzero], minlength=len(chunk)))
+    users, counts = np.concatenate(users), np.concatenate(counts)
+    by_lesson = sparse.csc_matrix(
+        (
+            np.ones(len(users), dtype=np.int32),
+            users,
+            np.concatenate(([0], np.cumsum(counts))),
+        ),
+        shape=(size * 8, len(lessons)),
+    )
+    return lessons, by_lesson, by_lesson.tocsr(), counts
+
+
+# Cosine similarities of the lessons in `columns` to every lesson, from their
+# co-completion counts (one sparse product), with self-pairs left out. One
+# CSR row per column. The product runs without releasing the GIL, so callers
+# pass SIMILARITY_CHUNK columns at a time.
+def similarities(by_lesson, by_user, counts, columns):
+    np, _ = scipy_modules()
+    product = (by_lesson[:, columns].T @ by_user).tocsr()
+    rows = np.repeat(columns, np.diff(product.indptr))
+    scores = product.data / np.sqrt(counts[rows] * counts[product.indices])
+    scores[rows == product.indices] = 0.0
+    product.data = scores
+    product.eliminate_zeros()
+    return product
+
+
+def sparse_row(product, row: int):
+    start, end = product.indptr[row], product.indptr[row + 1]
+    return product.indices[start:end], product.data[start:end]
+
+
+def sparse_top_neighbors(lessons: list, columns, scores) -> list:
+    np, _ = scipy_modules()
+    if len(scores) > neighbor_count:
+        best = np.argpartition(scores, -neighbor_count)[-neighbor_count:]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return [(lessons[columns[i]], float(scores[i])) for i in best]
+
+
+# Similarity rows {other lesson: score} of the given lessons
+def similarity_rows(completers: dict, lessons) -> dict:
+    if scipy_modules() is None:
+        counts = {lesson: bits.bit_count() for lesson, bits in completers.items()}
+        return {
+            lesson: similarity_row(lesson, completers, counts) for lesson in lessons
+        }
+    np, _ = scipy_modules()
+    ids, by_lesson, by_user, counts = completion_matrix(completers)
+    position = {lesson: column for column, lesson in enumerate(ids)}
+    lessons = [lesson for lesson in lessons if lesson in position]
+    rows = {}
+    for start in range(0, len(lessons), SIMILARITY_CHUNK):
+        chunk = lessons[start : start + SIMILARITY_CHUNK]
+        columns = np.array([position[lesson] for lesson in chunk], dtype=np.int64)
+        product = similarities(by_lesson, by_user, counts, columns)
+        for row, lesson in enumerate(chunk):
+            others, scores = sparse_row(product, row)
+            rows[lesson] = {ids[c]: float(score) for c, score in zip(others, scores)}
+    return rows
+
+
+# Runs in a worker thread, so a build over a large catalog does not hold up
+# the event loop for its whole length. With scipy the lesson x lesson product
+# is computed a chunk of lessons at a time and only the top neighbors are
+# turned into Python objects.
+def build_neighbors(completers: dict) -> dict:
+    if scipy_modules() is None:
+        return {
+            lesson: top_neighbors(row)
+            for lesson, row in similarity_rows(completers, completers).items()
+        }
+    np, _ = scipy_modules()
+    ids, by_lesson, by_user, counts = completion_matrix(completers)
+    neighbors = {}
+    for start in range(0, len(ids), SIMILARITY_CHUNK):
+        columns = np.arange(start, min(start + SIMILARITY_CHUNK, len(ids)))
+        product = similarities(by_lesson, by_user, counts, columns)
+        for row, column in enumerate(columns):
+            neighbors[ids[column]] = sparse_top_neighbors(
+                ids, *sparse_row(product, row)
+            )
+    return neighbors
+
+
+# Only the rows of lessons whose completers changed are recomputed; the other
+# lessons' lists get the changed lessons' new scores patched in. When most
+# lessons changed, a full build is cheaper.
+def patch_neighbors(neighbors: dict, completers: dict, dirty: set) -> dict:
+    if len(dirty) * 4 > len(completers):
+        return build_neighbors(completers)
+    neighbors = dict(neighbors)
+    rows = similarity_rows(completers, dirty)
+    for lesson, row in rows.items():
+        neighbors[lesson] = top_neighbors(row)
+    for lesson in completers.keys() - dirty:
+        current = neighbors.get(lesson, [])
+        changed = [
+            (other, rows[other].get(lesson, 0.0))
+            for other in dirty
+            if lesson in rows[other] or any(n == other for n, _ in current)
+        ]
+        if not changed:
+            continue
+        merged = {n: score for n, score in current if n not in dirty}
+        merged.update((n, score) for n, score in changed if score > 0)
+        neighbors[lesson] = top_neighbors(merged)
+    return neighbors
+
+
+# Who started and completed which lessons. Each lesson's completers are one
+# Python int with a bit per user.
+class CompletionMatrix:
+    def __init__(self):
+        self.user_bits = {}
+        self.started = {}
+        self.completed = {}
+        self.completers = {}
+
+    def user_bit(self, user_id: int) -> int:
+        bit = self.user_bits.get(user_id)
+        if bit is None:
+            bit = self.user_bits[user_id] = 1 << len(self.user_bits)
+        return bit
+
+    # Record the current state of one (user, lesson) key; returns whether the
+    # lesson's completers changed
+    def set_progress(self, user_id, lesson_id, exists: bool, completed: bool):
+        started = self.started.setdefault(user_id, set())
+        done = self.completed.setdefault(user_id, set())
+        bit = self.user_bit(user_id)
+        old = self.completers.get(lesson_id, 0)
+        if exists:
+            started.add(lesson_id)
+        else:
+            started.discard(lesson_id)
+        if exists and completed:
+            done.add(lesson_id)
+            new = old | bit
+        else:
+            done.discard(lesson_id)
+            new = old & ~bit
+        self.completers[lesson_id] = new
+        return new != old
+
+    # Lessons with any completion, most completed first
+    def popular(self) -> list:
+        counts = {lesson: bits.bit_count() for lesson, bits in self.completers.items()}
+        ranked = sorted(counts, key=counts.get, reverse=True)
+        return [lesson for lesson in ranked if counts[lesson]]
+
+
+# In-memory item-item model over lesson completions: lesson -> most similar
+# lessons by co-completion, plus the completion matrix it was built from.
+# A background task keeps it current by reading the progress change sequence
+# (see sync.py) from the last change applied, so a refresh costs as much as the
+# changes since the previous one. Recommendations are read from memory.
+# Each worker keeps its own copy.
+class LessonRecommender:
+    def __init__(self):
+        self.matrix = CompletionMatrix()
+        self.lessons = {}
+        self.neighbors = {}
+        self.popular = []
+        self.epoch = None
+        self.seq = 0
+        self.lessons_version = None
+        self.built_at = 0.0
+        self.cache = {}
+        self.ready = asyncio.Event()
+        # Why the last refresh failed, until one succeeds
+        self.error = None
+        self.task = None
+
+    def start(self):
+        if recommendations_enabled and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+                self.error = None
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"Recommendation refresh failed: {e}")
+            await asyncio.sleep(refresh_interval)
+
+    # Whether the model has been built, waiting up to `timeout` for the first
+    # build; gives up at once when the last attempt failed
+    async def wait_ready(self, timeout: float) -> bool:
+        if self.ready.is_set():
+            return True
+        if self.error is not None:
+            return False
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def refresh(self):
+        sync_changes()
+        lessons_version = table_versions.versions.get("Lessons", 0)
+        async with SessionLocal() as db:
+            epoch, last_seq = (await db.execute(SYNC_STATE_SQL)).one()
+            if (
+                epoch != self.epoch
+                or last_seq < self.seq
+                or time.monotonic() - self.built_at > rebuild_interval
+            ):
+                await self.build(db, epoch, last_seq)
+            elif last_seq > self.seq:
+                await self.apply_changes(db)
+            if lessons_version != self.lessons_version:
+                await self.load_lessons(db)
+        self.lessons_version = lessons_version
+        self.ready.set()
+
+    async def load_lessons(self, db):
+        rows = (await db.execute(LESSONS_SQL)).all()
+        self.lessons = {
+            row.id: {"title": row.title, "level": row.level, "type": row.type}
+            for row in rows
+        }
+        self.cache = {}
+
+    # Full build from UserProgress into a new matrix, swapped in when done. The
+    # sequence number read in the same transaction is where incremental
+    # refreshes continue from.
+    async def build(self, db, epoch: str, last_seq: int):
+        start = time.perf_counter()
+        rows = (await db.execute(PROGRESS_SQL)).all()
+        matrix = CompletionMatrix()
+        for row in rows:
+            matrix.set_progress(row.user_id, row.lesson_id, True, bool(row.completed))
+        neighbors = await asyncio.to_thread(build_neighbors, dict(matrix.completers))
+        self.matrix, self.neighbors = matrix, neighbors
+        self.popular = matrix.popular()
+        self.epoch, self.seq = epoch, last_seq
+        self.built_at = time.monotonic()
+        self.cache = {}
+        logger.info(
+            f"Built recommendations for {len(matrix.completers)} lessons and "
+            f"{len(matrix.user_bits)} users in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+
+    async def apply_changes(self, db):
+        dirty = set()
+        while True:
+            result = await db.execute(
+                CHANGES_SQL, {"seq": self.seq, "limit": CHANGE_BATCH}
+            )
+            rows = result.all()
+            for row in rows:
+                exists = row.id is not None
+                if self.matrix.set_progress(
+                    row.user_id, row.lesson_id, exists, bool(row.completed)
+                ):
+                    dirty.add(row.lesson_id)
+                self.cache.pop(row.user_id, None)
+            if rows:
+                self.seq = rows[-1].seq
+            if len(rows) < CHANGE_BATCH:
+                break
+        if dirty:
+            self.neighbors = await asyncio.to_thread(
+                patch_neighbors, self.neighbors, dict(self.matrix.completers), dirty
+            )
+            self.popular = self.matrix.popular()
+            self.cache = {}
+
+    # Lessons the user has not started, scored by the summed similarity to the
+    # lessons they completed; padded with the most completed lessons, so new
+    # users get the popular ones. `level` and `type` filter the candidates.
+    def recommend(
+        self,
+        user_id: int,
+        limit: int,
+        level: Optional[str] = None,
+        type: Optional[str] = None,
+    ) -> list:
+        key = (level, type, limit)
+        cached = self.cache.get(user_id, {}).get(key)
+        if cached is not None:
+            return cached
+
+        started = self.matrix.started.get(user_id, set())
+
+        def wanted(lesson: int) -> bool:
+            info = self.lessons.get(lesson)
+            return (
+                info is not None
+                and lesson not in started
+                and (level is None or info["level"] == level)
+                and (type is None or info["type"] == type)
+            )
+
+        scores = {}
+        for lesson in self.matrix.completed.get(user_id, ()):
+            for other, score in self.neighbors.get(lesson, ()):
+                scores[other] = scores.get(other, 0.0) + score
+        best = heapq.nlargest(
+            limit,
+            ((lesson, score) for lesson, score in scores.items() if wanted(lesson)),
+            key=lambda item: item[1],
+        )
+        if len(best) < limit:
+            picked = {lesson for lesson, _ in best}
+            for lesson in self.popular:
+                if lesson not in picked and wanted(lesson):
+                    best.append((lesson, 0.0))
+                    if len(best) == limit:
+                        break
+        items = [
+            {"lesson_id": lesson, "score": round(score, 4), **self.lessons[lesson]}
+            for lesson, score in best
+        ]
+        self.cache.setdefault(user_id, {})[key] = items
+        return items
+
+    def stats(self) -> dict:
+        return {
+            "lessons": len(self.matrix.completers),
+            "users": len(self.matrix.user_bits),
+            "seq": self.seq,
+            "ready": self.ready.is_set(),
+            "error": self.error,
+        }
+
+
+recommender = LessonRecommender()
@@ -0,0 +1,130 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from database import (
+    Base,
+    SQLITE_PRAGMAS,
+    database_url,
+    engine,
+    is_memory_sqlite,
+    is_sqlite,
+    read_engine,
+    use_explicit_begin,
+    write_gate,
+)
+from routers import load_models
+from schema import init_schema
+from search import SEARCH_INDEXES, search_ddl
+from sync import sync_ddl
+
+logger = logging.getLogger(__name__)
+
+SEED_SQL_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "music_app_schema_with_data.sql"
+)
+TEMPLATE_DIR = os.getenv(
+    "RESET_TEMPLATE_DIR", os.path.join(tempfile.gettempdir(), "music4you-reset")
+)
+
+_reset_lock = asyncio.Lock()
+
+
+# Changes whenever the seed script or the schema the app layers on top of it
+# (models, indexes, FTS tables, triggers) changes, so a stale template is never restored.
+# Computed once per process; both inputs only change with a deploy.
+@functools.cache
+def template_fingerprint() -> str:
+    load_models()
+    digest = hashlib.sha1()
+    with open(SEED_SQL_PATH, "rb") as f:
+        digest.update(f.read())
+    dialect = sqlite.dialect()
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    for name in SEARCH_INDEXES:
+        for statement in search_ddl(name):
+            digest.update(statement.encode())
+    for statement in sync_ddl():
+        digest.update(statement.encode())
+    return digest.hexdigest()[:16]
+
+
+def template_path() -> str:
+    return os.path.join(TEMPLATE_DIR, f"seed-{template_fingerprint()}.db")
+
+
+def database_path() -> str:
+    if not is_sqlite(database_url) or is_memory_sqlite(database_url):
+        raise RuntimeError("reset-db requires a file-backed SQLite database")
+    return os.path.abspath(make_url(database_url).database)
+
+
+def run_seed_script(path: str):
+    with open(SEED_SQL_PATH, encoding="utf-8") as f:
+        sql_script = f.read()
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(sql_script)
+    finally:
+        conn.close()
+
+
+# Replay the seed script into a fresh file and apply init_schema to it, once per
+# fingerprint. Built beside its final name and renamed, so readers never see half a file.
+async def build_template() -> str:
+    path = template_path()
+    if os.path.exists(path):
+        return path
+    os.makedirs(TEMPLATE_DIR, exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    await asyncio.to_thread(run_seed_script, partial)
+    template_engine = create_async_engine(f"sqlite+aiosqlite:///{partial}")
+    use_explicit_begin(template_engine.sync_engine)
+    try:
+        async with template_engine.begin() as conn:
+            await init_schema(conn)
+    finally:
+        await template_engine.dispose()
+    os.replace(partial, path)
+    logger.info(f"Built reset template {path}")
+    return path
+
+
+# Copy every page of the template over the live database in one step of the
+# online backup API. The destination keeps its own journal mode (WAL) and other
+# connections see the new contents on their next transaction.
+def restore_database(source_path: str, target_path: str):
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    target = sqlite3.connect(target_path, timeout=SQLITE_PRAGMAS["busy_timeout"] / 1000)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+# Restore the database to the seed data without replaying SQL: wait for in-flight
+# writes (new ones queue behind the gate), close pooled connections, then copy
+# the template in a worker thread so the event loop keeps serving reads.
+async def reset_database():
+    async with _reset_lock:
+        target = database_path()
+        source = await build_template()
+        async with write_gate.closed():
+            await engine.dispose()
+            if read_engine is not engine:
+                await read_engine.dispose()
+            await asyncio.to_thread(restore_database, source, target)
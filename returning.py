@@ -0,0 +1,46 @@
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+
+# Fields actually sent in a PATCH body. A null for a NOT NULL column is rejected
+# here rather than surfacing as an IntegrityError from the UPDATE.
+def patch_values(patch: BaseModel, model) -> dict:
+    values = patch.dict(exclude_unset=True)
+    for name, value in values.items():
+        if value is None and not model.__table__.c[name].nullable:
+            raise HTTPException(status_code=422, detail=f"{name} cannot be null")
+    return values
+
+
+# Apply `values` to one row with a single UPDATE ... WHERE id = ? RETURNING and
+# return the updated row as a dict of `columns`, or None when no row matched.
+# `where` adds conditions; an empty patch changes nothing, so it only reads the row.
+async def update_returning(
+    db: AsyncSession, model, columns, row_id: int, values: dict, *where
+):
+    if values:
+        stmt = (
+            update(model)
+            .where(model.id == row_id, *where)
+            .values(values)
+            .returning(*columns)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        stmt = select(*columns).where(model.id == row_id, *where)
+    row = (await db.execute(stmt)).one_or_none()
+    return None if row is None else row._asdict()
+
+
+# DELETE ... WHERE id = ? RETURNING id, *columns; None when no row had that id
+async def delete_returning(db: AsyncSession, model, row_id: int, *columns):
+    stmt = (
+        delete(model)
+        .where(model.id == row_id)
+        .returning(model.id, *columns)
+        .execution_options(synchronize_session=False)
+    )
+    return (await db.execute(stmt)).one_or_none()
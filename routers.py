@@ -0,0 +1,97 @@
+import importlib
+import logging
+import os
+import time
+from fastapi import FastAPI
+from starlette.routing import BaseRoute, Match, NoMatchFound, get_route_path
+from metrics import instrument_routes
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/v1"
+
+# Import each group of route modules on the first request under its path
+# instead of at startup; set to false to load them all when the app is built
+lazy_routes = os.getenv("LAZY_ROUTES", "true").lower() in ("1", "true", "yes")
+
+# Path under API_PREFIX -> (module in Routes, tags), in the order they are included
+ROUTE_GROUPS = {
+    "/reset-db": [("ResetDBRoute", ["reset-db"])],
+    "/songs": [("SongRoute", ["songs"])],
+    "/users": [
+        ("UserRoute", ["users"]),
+        ("DashboardRoute", ["dashboard"]),
+        ("RecommendationRoute", ["recommendations"]),
+    ],
+    "/user-progress": [("UserProgressRoute", ["user-progress"])],
+    "/lessons": [("LessonRoute", ["lessons"])],
+    "/exercises": [("ExerciseRoute", ["exercises"])],
+    "/practice-rooms": [("PracticeRoomRoute", ["practice-rooms"])],
+    "/stats": [("StatsRoute", ["stats"])],
+    "/cache": [("CacheRoute", ["cache"])],
+    "/maintenance": [("MaintenanceRoute", ["maintenance"])],
+}
+
+
+# Every model lives in a route module, so anything that needs the full
+# Base.metadata (creating the schema, fingerprinting it) imports them all first
+def load_models():
+    for groups in ROUTE_GROUPS.values():
+        for module_name, _ in groups:
+            importlib.import_module(f"Routes.{module_name}")
+
+
+# Stands in for one group's routes until a request arrives under its path,
+# then includes the real routers in its place and dispatches the request again
+class LazyRoutes(BaseRoute):
+    def __init__(self, app: FastAPI, path: str):
+        self.app = app
+        self.path = API_PREFIX + path
+        self.modules = ROUTE_GROUPS[path]
+
+    def matches(self, scope):
+        if scope["type"] not in ("http", "websocket"):
+            return Match.NONE, {}
+        route_path = get_route_path(scope)
+        if route_path == self.path or route_path.startswith(self.path + "/"):
+            return Match.FULL, {}
+        return Match.NONE, {}
+
+    async def handle(self, scope, receive, send):
+        self.load()
+        await self.app.router.app(scope, receive, send)
+
+    # Nothing is named until the group is loaded
+    def url_path_for(self, name: str, /, **path_params):
+        raise NoMatchFound(name, path_params)
+
+    def load(self):
+        routes = self.app.router.routes
+        if self not in routes:
+            return
+        start = time.perf_counter()
+        first_new = len(routes)
+        for module_name, tags in self.modules:
+            module = importlib.import_module(f"Routes.{module_name}")
+            self.app.include_router(module.router, prefix=API_PREFIX, tags=tags)
+        added = routes[first_new:]
+        del routes[first_new:]
+        position = routes.index(self)
+        routes[position : position + 1] = added
+        instrument_routes(added)
+        logger.info(
+            f"Loaded routes for {self.path} in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+
+
+def include_route_groups(app: FastAPI):
+    for path in ROUTE_GROUPS:
+        app.router.routes.append(LazyRoutes(app, path))
+    if not lazy_routes:
+        load_route_groups(app)
+
+
+def load_route_groups(app: FastAPI):
+    for route in list(app.router.routes):
+        if isinstance(route, LazyRoutes):
+            route.load()
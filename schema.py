@@ -0,0 +1,87 @@
+import functools
+import glob
+import hashlib
+import logging
+import os
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from database import Base
+from routers import load_models
+from search import create_search_indexes
+from stats import UserStatsModel, refresh_stats
+from sync import UserProgressSyncModel, create_sync_triggers
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Modules that define tables, indexes, FTS tables and triggers
+SCHEMA_SOURCES = ["schema.py", "search.py", "stats.py", "sync.py", "Routes/*.py"]
+
+
+# Stored in PRAGMA user_version once init_schema has run, so later starts can
+# skip it. Hashes the defining modules' source rather than the compiled DDL,
+# which would mean importing every model first; an edit that leaves the schema
+# alone just costs one more init_schema run.
+@functools.cache
+def schema_version() -> int:
+    digest = hashlib.sha1()
+    for pattern in SCHEMA_SOURCES:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    # A positive 32-bit int; 0 is what a database never initialized reports
+    return int(digest.hexdigest()[:7], 16) or 1
+
+
+async def schema_is_current(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "sqlite":
+        return False
+    stored = (await conn.exec_driver_sql("PRAGMA user_version")).scalar()
+    return stored == schema_version()
+
+
+# create_all skips tables that already exist, so indexes added to a model
+# later are created here on existing databases
+def create_missing_indexes(conn):
+    existing = set(
+        conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        ).scalars()
+    )
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            # Indexes on the primary key alone duplicate the rowid
+            if index.columns and all(col.primary_key for col in index.columns):
+                continue
+            if index.name in existing:
+                continue
+            try:
+                with conn.begin_nested():
+                    index.create(conn)
+            except IntegrityError as e:
+                logger.warning(f"Could not create index {index.name}: {e.orig}")
+
+
+# Bring a database up to the current models: tables, indexes, FTS tables and
+# triggers, and the summary and sync tables (filled from UserProgress when first
+# created).
+# Runs inside the caller's transaction; used at startup and to build the reset
+# template. Records schema_version() when done.
+async def init_schema(conn: AsyncConnection):
+    load_models()
+    stats_missing, sync_missing = await conn.run_sync(
+        lambda sync_conn: [
+            not inspect(sync_conn).has_table(model.__tablename__)
+            for model in (UserStatsModel, UserProgressSyncModel)
+        ]
+    )
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.run_sync(create_missing_indexes)
+    await conn.run_sync(create_search_indexes)
+    await conn.run_sync(create_sync_triggers, sync_missing)
+    if stats_missing:
+        async with AsyncSession(bind=conn) as session:
+            await refresh_stats(session)
+    if conn.dialect.name == "sqlite":
+        await conn.exec_driver_sql(f"PRAGMA user_version = {schema_version()}")
@@ -0,0 +1,95 @@
+"""Run EXPLAIN QUERY PLAN on the SQL issued by the hot lookup routes.
+
+Boots the app against a throwaway SQLite file, calls each route in
+HOT_ROUTES, captures the statements it executes and fails if any plan
+contains a full table scan.
+
+Usage: python scripts/check_query_plans.py
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "plans.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+# Its background build reads whole tables, which would be charged to the routes
+os.environ["RECOMMENDATIONS_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from database import engine  # noqa: E402
+from main import app  # noqa: E402
+
+HOT_ROUTES = [
+    "/api/v1/user-progress/by-user/1",
+    "/api/v1/user-progress/by-user-lesson/1/1",
+    "/api/v1/user-progress/sync/1",
+    "/api/v1/user-progress?lesson_id=1",
+    "/api/v1/exercises/by-lesson/1",
+    "/api/v1/exercises?lesson_id=1",
+    "/api/v1/practice-rooms/by-user/1",
+    "/api/v1/practice-rooms/by-instrument/Piano",
+    "/api/v1/practice-rooms?host_user_id=1",
+    "/api/v1/stats/users/1",
+    "/api/v1/stats/lessons/1",
+]
+
+
+def full_scans(conn, statement, parameters):
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    details = [row[-1] for row in plan]
+    return [d for d in details if d.startswith("SCAN ") and "CONSTANT ROW" not in d]
+
+
+async def capture_statements():
+    captured = {}
+    current = {"route": None}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        route = current["route"]
+        if route and statement.lstrip().upper().startswith("SELECT"):
+            captured.setdefault(route, []).append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://check"
+        ) as client:
+            for route in HOT_ROUTES:
+                current["route"] = route
+                await client.get(route)
+    event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    await engine.dispose()
+    return captured
+
+
+def main():
+    captured = asyncio.run(capture_statements())
+    conn = sqlite3.connect(DB_PATH)
+    failures = 0
+    for route in HOT_ROUTES:
+        statements = captured.get(route, [])
+        if not statements:
+            print(f"FAIL {route}: no SELECT captured")
+            failures += 1
+            continue
+        for statement, parameters in statements:
+            scans = full_scans(conn, statement, parameters)
+            if scans:
+                print(f"FAIL {route}: {'; '.join(scans)}")
+                failures += 1
+            else:
+                print(f"ok   {route}")
+    conn.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Recompute the UserStats / LessonStats summary tables from UserProgress.
+
+The tables are maintained incrementally by the progress write handlers;
+run this after editing UserProgress outside the API.
+
+Usage: python scripts/rebuild_stats.py  (uses DATABASE_URL like the app)
+"""
+
+import asyncio
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import run_write, write_queue  # noqa: E402
+from main import init_db  # noqa: E402
+from stats import refresh_stats  # noqa: E402
+
+
+async def main():
+    await init_db()
+    await run_write(refresh_stats)
+    if write_queue is not None:
+        await write_queue.stop()
+    print("Stats rebuilt.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+import math
+import re
+from typing import Optional
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import and_, column, or_, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from pagination import (
+    DEFAULT_LIMIT,
+    MAX_LIMIT,
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+)
+from serialization import rows_as_dicts
+
+# FTS5 index name -> (content table, indexed columns, bm25 column weights).
+# External-content tables: the index stores only tokens, rows are read from the
+# content table by rowid.
+SEARCH_INDEXES = {
+    "SongsSearch": ("Songs", ["title", "artist"], [2.0, 1.0]),
+    "LessonsSearch": ("Lessons", ["title", "description"], [2.0, 1.0]),
+}
+
+MAX_QUERY_LENGTH = 200
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchParams(BaseModel):
+    q: str = Field(min_length=1, max_length=MAX_QUERY_LENGTH)
+    limit: int = Field(DEFAULT_LIMIT, gt=0, le=MAX_LIMIT)
+    cursor: Optional[str] = None
+
+
+def search_ddl(name: str):
+    content, columns, _ = SEARCH_INDEXES[name]
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{c}" for c in columns)
+    old_cols = ", ".join(f"old.{c}" for c in columns)
+    # 'prefix' keeps extra 2/3-character prefix indexes so "pia*" is a range lookup
+    yield (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        f"{cols}, content='{content}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    yield (
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {content} BEGIN "
+        f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+    )
+    yield (
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {content} BEGIN "
+        f"INSERT INTO {name}({name}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols}); END"
+    )
+    yield (
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON {content} BEGIN "
+        f"INSERT INTO {name}({name}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+    )
+
+
+# Create the FTS5 tables and the triggers that keep them in sync with CRUD writes.
+# Content tables recreated outside the ORM (reset-db) lose their triggers, so this
+# is safe to rerun; rebuild=True re-tokenizes every row from the content table.
+def create_search_indexes(conn, rebuild: bool = False):
+    for name, (_, _, weights) in SEARCH_INDEXES.items():
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).first()
+        for statement in search_ddl(name):
+            conn.exec_driver_sql(statement)
+        if rebuild or not exists:
+            conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+            # Persist the column weights so ORDER BY rank uses them
+            conn.exec_driver_sql(
+                f"INSERT INTO {name}({name}, rank) VALUES ('rank', ?)",
+                (f"bm25({', '.join(str(w) for w in weights)})",),
+            )
+
+
+# Turn free text into an FTS5 query: every word must match, and the last one
+# (the word still being typed) also matches as a prefix. Words are quoted so user
+# input can never be parsed as FTS5 syntax.
+def match_query(q: str) -> Optional[str]:
+    tokens = TOKEN_RE.findall(q)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+# One page of `model` rows matching params.q, best bm25 rank first.
+# Keyset-paginated on (rank, id) with the same X-Next-Cursor header as the list
+# endpoints; rank is stable for a query as long as the catalog is unchanged.
+async def search_page(
+    db: AsyncSession,
+    model,
+    columns,
+    index_name: str,
+    params: SearchParams,
+    response: Response,
+):
+    query = match_query(params.q)
+    if query is None:
+        return []
+
+    # Rank and cut the page inside the FTS table, then join only those rows
+    index = table(index_name, column("rowid"), column("rank"))
+    hits = select(index.c.rowid, index.c.rank).where(
+        text(f"{index_name} MATCH :query").bindparams(query=query)
+    )
+    if params.cursor:
+        key, last_id = decode_cursor(params.cursor)
+        # Ranks are floats; any other key would compare as text or NULL
+        try:
+            key = float(key)
+            if not math.isfinite(key):
+                raise ValueError(key)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        hits = hits.where(
+            or_(index.c.rank > key, and_(index.c.rank == key, index.c.rowid > last_id))
+        )
+    hits = hits.order_by(index.c.rank, index.c.rowid).limit(params.limit + 1).subquery()
+    stmt = (
+        select(*columns, hits.c.rank)
+        .join(hits, hits.c.rowid == model.id)
+        .order_by(hits.c.rank, model.id)
+    )
+
+    rows = (await db.execute(stmt)).all()
+    if len(rows) > params.limit:
+        rows = rows[: params.limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.rank, last.id)
+    return rows_as_dicts(rows, columns)
@@ -0,0 +1,37 @@
+from fastapi import Response
+from pydantic_core import to_json
+
+# orjson is optional: it encodes plain rows a little faster than pydantic-core,
+# which is always installed with Pydantic and produces the same JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dump_json(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return to_json(data)
+
+
+# Table columns backing each field of `schema`, in the schema's field order, so
+# rows encoded as dicts come out exactly as the validated model would
+def schema_columns(model, schema):
+    return [model.__table__.c[name] for name in schema.model_fields]
+
+
+def rows_as_dicts(rows, columns):
+    names = [column.name for column in columns]
+    return [dict(zip(names, row)) for row in rows]
+
+
+# Encode plain data straight into the response, keeping headers already set on
+# the injected `response` (X-Next-Cursor, ETag). response_model stays on the
+# route for the OpenAPI schema; FastAPI does not re-validate a returned Response.
+def json_response(data, response: Response) -> Response:
+    return Response(
+        content=dump_json(data),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
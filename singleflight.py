@@ -0,0 +1,63 @@
+import asyncio
+import os
+
+single_flight_enabled = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+
+# Coalesces identical concurrent work: the first caller for a key runs `fn`,
+# callers arriving while it runs wait for the same result (or exception)
+# instead of running it again. Nothing is kept once the call finishes; caching
+# results is the response cache's job.
+class SingleFlight:
+    def __init__(self):
+        self.flights = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def do(self, key, fn):
+        if not single_flight_enabled:
+            return await fn()
+        future = self.flights.get(key)
+        if future is not None:
+            self.joined += 1
+            try:
+                # Shielded, so a waiter going away does not cancel the others
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader was cancelled (its client disconnected), not this
+                # request: run it again, leading a new flight
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            return await self.do(key, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        self.flights[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marks it retrieved, so an exception nobody waited for is not logged
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self.flights.get(key) is future:
+                del self.flights[key]
+
+    def stats(self):
+        return {
+            "enabled": single_flight_enabled,
+            "in_flight": len(self.flights),
+            "leaders": self.leaders,
+            "joined": self.joined,
+        }
@@ -0,0 +1,107 @@
+from sqlalchemy import Column, Integer, ForeignKey, Index, case, delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from database import Base
+
+
+# Summary tables kept in step with UserProgress inside the same write transaction
+class UserStatsModel(Base):
+    __tablename__ = "UserStats"
+    user_id = Column(Integer, ForeignKey("Users.id"), primary_key=True)
+    progress_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+
+    # Leaderboard order; top-N reads walk this index instead of sorting
+    __table_args__ = (
+        Index("ix_UserStats_leaderboard", completed_count.desc(), user_id),
+    )
+
+
+class LessonStatsModel(Base):
+    __tablename__ = "LessonStats"
+    lesson_id = Column(Integer, ForeignKey("Lessons.id"), primary_key=True)
+    started_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+
+
+async def _add_counts(db: AsyncSession, model, key: str, key_value: int, deltas: dict):
+    stmt = insert(model).values({key: key_value, **deltas})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={name: getattr(model, name) + stmt.excluded[name] for name in deltas},
+    )
+    await db.execute(stmt)
+
+
+# Apply the effect of one progress row changing from `old` to `new`.
+# Either side may be None (create / delete); both expose user_id, lesson_id, completed.
+async def apply_progress_change(db: AsyncSession, old, new):
+    user_deltas, lesson_deltas = {}, {}
+    for row, sign in ((old, -1), (new, 1)):
+        if row is None:
+            continue
+        done = sign if row.completed else 0
+        user = user_deltas.setdefault(row.user_id, [0, 0])
+        user[0] += sign
+        user[1] += done
+        lesson = lesson_deltas.setdefault(row.lesson_id, [0, 0])
+        lesson[0] += sign
+        lesson[1] += done
+
+    for user_id, (progress, completed) in user_deltas.items():
+        if progress or completed:
+            await _add_counts(
+                db,
+                UserStatsModel,
+                "user_id",
+                user_id,
+                {"progress_count": progress, "completed_count": completed},
+            )
+    for lesson_id, (started, completed) in lesson_deltas.items():
+        if started or completed:
+            await _add_counts(
+                db,
+                LessonStatsModel,
+                "lesson_id",
+                lesson_id,
+                {"started_count": started, "completed_count": completed},
+            )
+
+
+# Recompute stats from UserProgress, for the given users/lessons or for everything.
+# Used by bulk writes, where the previous row values are not known, and for recovery.
+async def refresh_stats(db: AsyncSession, user_ids=None, lesson_ids=None):
+    progress = Base.metadata.tables["UserProgress"]
+    completed = func.sum(case((progress.c.completed == True, 1), else_=0))  # noqa: E712
+    full = user_ids is None and lesson_ids is None
+
+    if full or user_ids:
+        stmt = delete(UserStatsModel)
+        query = select(progress.c.user_id, func.count(), completed).group_by(
+            progress.c.user_id
+        )
+        if not full:
+            stmt = stmt.where(UserStatsModel.user_id.in_(user_ids))
+            query = query.where(progress.c.user_id.in_(user_ids))
+        await db.execute(stmt)
+        await db.execute(
+            insert(UserStatsModel).from_select(
+                ["user_id", "progress_count", "completed_count"], query
+            )
+        )
+
+    if full or lesson_ids:
+        stmt = delete(LessonStatsModel)
+        query = select(progress.c.lesson_id, func.count(), completed).group_by(
+            progress.c.lesson_id
+        )
+        if not full:
+            stmt = stmt.where(LessonStatsModel.lesson_id.in_(lesson_ids))
+            query = query.where(progress.c.lesson_id.in_(lesson_ids))
+        await db.execute(stmt)
+        await db.execute(
+            insert(LessonStatsModel).from_select(
+                ["lesson_id", "started_count", "completed_count"], query
+            )
+        )
@@ -0,0 +1,327 @@
+import secrets
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy import Boolean, Column, Index, Integer, String, and_, delete, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from bulk import BULK_CHUNK_SIZE, MAX_BULK_ITEMS
+from database import Base
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, encode_cursor
+from stats import apply_progress_change
+
+
+# Latest change to each (user, lesson) progress key. Triggers on UserProgress
+# give a key the next sequence number whenever its row is inserted, changed or
+# deleted (deleted rows stay as tombstones), so "changes since N" for a user is
+# a range scan of (user_id, seq) that grows with the changes, not the history.
+class UserProgressSyncModel(Base):
+    __tablename__ = "UserProgressSync"
+    user_id = Column(Integer, primary_key=True)
+    lesson_id = Column(Integer, primary_key=True)
+    seq = Column(Integer, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index("ix_UserProgressSync_user_id_seq", "user_id", "seq"),
+        # Makes MAX(seq), the next number, an index lookup
+        Index("ix_UserProgressSync_seq", "seq", unique=True),
+    )
+
+
+# Random id of the current sequence history. Tokens carry it, so a token from
+# before reset-db (which restores older sequence numbers) forces a full sync.
+class SyncStateModel(Base):
+    __tablename__ = "SyncState"
+    id = Column(Integer, primary_key=True)
+    epoch = Column(String, nullable=False)
+
+
+class SyncParams(BaseModel):
+    since: Optional[str] = None
+    limit: int = Field(DEFAULT_LIMIT, gt=0, le=MAX_LIMIT)
+
+
+# One progress key; deleted keys only carry lesson_id
+class SyncChange(BaseModel):
+    lesson_id: int
+    deleted: bool
+    id: Optional[int] = None
+    completed: Optional[bool] = None
+    completed_at: Optional[datetime] = None
+
+
+# `reset` means the token was missing or from another history: the changes are
+# the user's full state and local rows not listed should be dropped
+class SyncPage(BaseModel):
+    changes: List[SyncChange]
+    token: str
+    has_more: bool
+    reset: bool
+
+
+class SyncPushItem(BaseModel):
+    lesson_id: int
+    completed: bool = False
+    completed_at: Optional[datetime] = None
+    deleted: bool = False
+
+    # Stored times are naive UTC; a client's offset ("...Z") is converted so the
+    # merge can compare them
+    @field_validator("completed_at")
+    @classmethod
+    def naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+# `token` is the one the client last pulled; server changes after it conflict
+class SyncPush(BaseModel):
+    token: Optional[str] = None
+    changes: List[SyncPushItem] = Field(max_length=MAX_BULK_ITEMS)
+
+
+# `conflicts`: pushed keys the server had changed after the client's token
+class SyncPushResult(BaseModel):
+    items: List[SyncChange]
+    conflicts: List[int]
+
+
+NEXT_SEQ = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM UserProgressSync)"
+
+
+# Statement recording a change to a key; an upsert rather than INSERT OR REPLACE,
+# since an OR clause on the statement firing the trigger would override it
+def record_change(row: str, deleted: int, where: str = "") -> str:
+    return (
+        "INSERT INTO UserProgressSync (user_id, lesson_id, seq, deleted) "
+        f"SELECT {row}.user_id, {row}.lesson_id, {NEXT_SEQ}, {deleted} "
+        f"WHERE {where or 'true'} "
+        "ON CONFLICT (user_id, lesson_id) DO UPDATE "
+        "SET seq = excluded.seq, deleted = excluded.deleted;"
+    )
+
+
+def sync_ddl():
+    yield (
+        "CREATE TRIGGER IF NOT EXISTS UserProgressSync_ai AFTER INSERT ON UserProgress "
+        f"BEGIN {record_change('new', 0)} END"
+    )
+    yield (
+        "CREATE TRIGGER IF NOT EXISTS UserProgressSync_ad AFTER DELETE ON UserProgress "
+        f"BEGIN {record_change('old', 1)} END"
+    )
+    # Rewrites with the same values (PUT of an unchanged row) are not changes.
+    # A row moved to another user or lesson leaves a tombstone at its old key.
+    moved = "old.user_id IS NOT new.user_id OR old.lesson_id IS NOT new.lesson_id"
+    yield (
+        "CREATE TRIGGER IF NOT EXISTS UserProgressSync_au AFTER UPDATE ON UserProgress "
+        f"WHEN {moved} OR old.completed IS NOT new.completed "
+        "OR old.completed_at IS NOT new.completed_at BEGIN "
+        f"{record_change('old', 1, moved)} {record_change('new', 0)} END"
+    )
+
+
+# Create the sync triggers, numbering the existing progress rows when the
+# change table is new, and make sure there is an epoch. Safe to rerun.
+def create_sync_triggers(conn, backfill: bool = False):
+    for statement in sync_ddl():
+        conn.exec_driver_sql(statement)
+    if backfill:
+        conn.exec_driver_sql(
+            "INSERT OR IGNORE INTO UserProgressSync (user_id, lesson_id, seq, deleted) "
+            "SELECT user_id, lesson_id, ROW_NUMBER() OVER (ORDER BY id), 0 "
+            "FROM UserProgress"
+        )
+    conn.exec_driver_sql(
+        "INSERT OR IGNORE INTO SyncState (id, epoch) VALUES (1, ?)",
+        (secrets.token_hex(8),),
+    )
+
+
+# Start a new history after the database was replaced (reset-db): every
+# outstanding token becomes a full sync
+async def new_sync_epoch(db: AsyncSession):
+    await db.execute(
+        text("UPDATE SyncState SET epoch = :epoch WHERE id = 1"),
+        {"epoch": secrets.token_hex(8)},
+    )
+
+
+async def current_epoch(db: AsyncSession) -> str:
+    result = await db.execute(
+        select(SyncStateModel.epoch).where(SyncStateModel.id == 1)
+    )
+    return result.scalar_one()
+
+
+# Sequence number a token continues from, or None when it must start over
+def token_seq(token: Optional[str], epoch: str) -> Optional[int]:
+    if token is None:
+        return None
+    token_epoch, seq = decode_cursor(token)
+    return seq if token_epoch == epoch else None
+
+
+def change_query(user_id: int):
+    progress = Base.metadata.tables["UserProgress"]
+    sync = UserProgressSyncModel
+    return (
+        select(
+            sync.seq,
+            sync.lesson_id,
+            sync.deleted,
+            progress.c.id,
+            progress.c.completed,
+            progress.c.completed_at,
+        )
+        .select_from(sync)
+        .outerjoin(
+            progress,
+            and_(
+                progress.c.user_id == sync.user_id,
+                progress.c.lesson_id == sync.lesson_id,
+            ),
+        )
+        .where(sync.user_id == user_id)
+    )
+
+
+def as_change(row) -> dict:
+    if row.deleted:
+        return {"lesson_id": row.lesson_id, "deleted": True}
+    return {
+        "lesson_id": row.lesson_id,
+        "deleted": False,
+        "id": row.id,
+        "completed": row.completed,
+        "completed_at": row.completed_at,
+    }
+
+
+# A page of one user's changes after `since`, oldest first. Without a usable
+# token it is the full state (tombstones left out) from the start.
+async def changes_since(db: AsyncSession, user_id: int, params: SyncParams):
+    epoch = await current_epoch(db)
+    since = token_seq(params.since, epoch)
+    sync = UserProgressSyncModel
+    stmt = change_query(user_id)
+    if since is None:
+        stmt = stmt.where(sync.deleted == False)  # noqa: E712
+    else:
+        stmt = stmt.where(sync.seq > since)
+    result = await db.execute(stmt.order_by(sync.seq).limit(params.limit + 1))
+    rows = result.all()
+    has_more = len(rows) > params.limit
+    rows = rows[: params.limit]
+    if rows:
+        last = rows[-1].seq
+    else:
+        last = since or 0
+    return {
+        "changes": [as_change(row) for row in rows],
+        "token": encode_cursor(epoch, last),
+        "has_more": has_more,
+        "reset": since is None,
+    }
+
+
+# A client upsert that conflicts with a server change keeps a completion from
+# either side, with the earlier completion time
+def merge(server, item: SyncPushItem) -> dict:
+    times = [
+        row.completed_at
+        for row in (server, item)
+        if row.completed and row.completed_at is not None
+    ]
+    completed = bool(server.completed) or item.completed
+    if times:
+        completed_at = min(times)
+    else:
+        completed_at = item.completed_at if item.completed else server.completed_at
+    return {"completed": completed, "completed_at": completed_at}
+
+
+# Apply a client's offline changes for one user in the caller's transaction.
+# A key the server has not changed since the client's token takes the client's
+# value. Otherwise it conflicts: a client delete is dropped, an upsert is
+# merged with the server row (or recreates it if the server deleted it).
+# Returns the resulting state of every pushed key.
+async def push_changes(db: AsyncSession, user_id: int, push: SyncPush):
+    progress = Base.metadata.tables["UserProgress"]
+    sync = UserProgressSyncModel
+    items = {item.lesson_id: item for item in push.changes}
+    if not items:
+        return {"items": [], "conflicts": []}
+    base = token_seq(push.token, await current_epoch(db)) or 0
+
+    result = await db.execute(
+        select(
+            progress.c.user_id,
+            progress.c.lesson_id,
+            progress.c.completed,
+            progress.c.completed_at,
+        ).where(progress.c.user_id == user_id, progress.c.lesson_id.in_(items))
+    )
+    current = {row.lesson_id: row for row in result.all()}
+    result = await db.execute(
+        select(sync.lesson_id, sync.seq).where(
+            sync.user_id == user_id, sync.lesson_id.in_(items)
+        )
+    )
+    changed = {lesson_id for lesson_id, seq in result.all() if seq > base}
+
+    upserts, deletes, conflicts = [], [], []
+    for lesson_id, item in items.items():
+        server = current.get(lesson_id)
+        if lesson_id in changed:
+            conflicts.append(lesson_id)
+        if item.deleted:
+            if server is not None and lesson_id not in changed:
+                deletes.append(lesson_id)
+                await apply_progress_change(db, server, None)
+            continue
+        if server is not None and lesson_id in changed:
+            values = merge(server, item)
+        else:
+            values = {"completed": item.completed, "completed_at": item.completed_at}
+        if server is not None and (
+            bool(server.completed) == values["completed"]
+            and server.completed_at == values["completed_at"]
+        ):
+            continue
+        row = {"user_id": user_id, "lesson_id": lesson_id, **values}
+        upserts.append(row)
+        await apply_progress_change(db, server, SimpleNamespace(**row))
+
+    if deletes:
+        await db.execute(
+            delete(progress).where(
+                progress.c.user_id == user_id, progress.c.lesson_id.in_(deletes)
+            )
+        )
+    for start in range(0, len(upserts), BULK_CHUNK_SIZE):
+        stmt = insert(progress).values(upserts[start : start + BULK_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "lesson_id"],
+            set_={
+                "completed": stmt.excluded.completed,
+                "completed_at": stmt.excluded.completed_at,
+            },
+        )
+        await db.execute(stmt)
+
+    result = await db.execute(
+        change_query(user_id).where(sync.lesson_id.in_(items)).order_by(sync.seq)
+    )
+    found = {row.lesson_id: as_change(row) for row in result.all()}
+    return {
+        "items": [
+            found.get(lesson_id, {"lesson_id": lesson_id, "deleted": True})
+            for lesson_id in items
+        ],
+        "conflicts": conflicts,
+    }
@@ -0,0 +1,39 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app reads its settings on import, so point it at a scratch copy of
+# store.db before anything imports it
+WORK_DIR = tempfile.mkdtemp()
+shutil.copy(os.path.join(ROOT, "store.db"), os.path.join(WORK_DIR, "test.db"))
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{WORK_DIR}/test.db"
+os.environ["RECOMMENDATIONS_ENABLED"] = "false"
+os.environ["MAINTENANCE_ENABLED"] = "false"
+os.environ["RESET_TEMPLATE_DIR"] = WORK_DIR
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+# Runs `scenario(client)` against the app, started up and shut down around it
+@pytest.fixture
+def api():
+    from main import app
+
+    async def run(scenario):
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test/api/v1"
+            ) as client:
+                return await scenario(client)
+
+    return lambda scenario: asyncio.run(run(scenario))
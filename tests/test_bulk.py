@@ -0,0 +1,40 @@
+def test_repeated_key_keeps_last_row(api):
+    async def scenario(client):
+        songs = [
+            {"title": "Bulk first", "artist": "A"},
+            {"title": "Bulk second", "artist": "B"},
+        ]
+        created = (await client.post("/songs/bulk", json=songs)).json()["items"]
+        song_id = created[0]["id"]
+        response = await client.post(
+            "/songs/bulk",
+            json=[
+                {"id": song_id, "title": "Old", "artist": "A"},
+                {"title": "Unrelated", "artist": "C"},
+                {"id": song_id, "title": "New", "artist": "A"},
+            ],
+        )
+        stored = (await client.get(f"/songs/{song_id}")).json()
+        return response.json(), stored
+
+    result, stored = api(scenario)
+    assert result["errors"] == []
+    titles = [item["title"] for item in result["items"]]
+    assert titles == ["Unrelated", "New"]
+    assert stored["title"] == "New"
+
+
+def test_repeated_progress_key_in_one_batch(api):
+    async def scenario(client):
+        rows = [
+            {"user_id": 1, "lesson_id": 2, "completed": False},
+            {"user_id": 1, "lesson_id": 2, "completed": True},
+        ]
+        response = await client.post("/user-progress/bulk", json=rows)
+        stored = await client.get("/user-progress/by-user/1")
+        return response.json(), stored.json()
+
+    result, stored = api(scenario)
+    assert [item["completed"] for item in result["items"]] == [True]
+    matching = [row for row in stored if row["lesson_id"] == 2]
+    assert [row["completed"] for row in matching] == [True]
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import sqlite3
+import time
+from changelog import ChangeLog
+from versioning import TableVersions
+
+
+# Stands in for another worker holding the log's write lock
+def lock_log(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    return conn
+
+
+def test_publish_waits_off_the_event_loop(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.db"))
+    log.connect()
+
+    async def scenario():
+        other = lock_log(log.path)
+        publish = asyncio.create_task(log.publish("invalidate", ["songs"]))
+        start = time.perf_counter()
+        await asyncio.sleep(0.05)
+        lag = time.perf_counter() - start - 0.05
+        pending = not publish.done()
+        other.execute("COMMIT")
+        await publish
+        return lag, pending
+
+    lag, pending = asyncio.run(scenario())
+    assert pending
+    assert lag < 0.04
+    kinds = [row[0] for row in log.conn.execute("SELECT kind FROM changes")]
+    assert kinds == ["invalidate"]
+
+
+def test_older_version_replayed_after_own_bump(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.db"))
+    versions = TableVersions(log)
+    log.connect()
+    # Another worker bumps Songs to 1 before this worker's bump, which is
+    # applied here before the other worker's entry is replayed
+    other = lock_log(log.path)
+    other.execute(
+        "INSERT INTO versions (name, version, modified) VALUES ('Songs', 1, 0)"
+    )
+    other.execute(
+        "INSERT INTO changes (kind, payload, origin) VALUES (?, ?, 0)",
+        ("versions", json.dumps({"Songs": [1, 0]})),
+    )
+    other.execute("COMMIT")
+
+    asyncio.run(versions.bump("Songs"))
+    assert versions.versions["Songs"] == 2
+    log.sync()
+    assert versions.versions["Songs"] == 2
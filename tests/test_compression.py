@@ -0,0 +1,8 @@
+def test_brotli_offered(api):
+    async def scenario(client):
+        return await client.get("/lessons", headers={"accept-encoding": "br"})
+
+    response = api(scenario)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert response.json()
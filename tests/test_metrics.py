@@ -0,0 +1,27 @@
+from fastapi.routing import APIRoute
+from metrics import instrument_routes
+
+
+def wrap_depth(call) -> int:
+    depth = 0
+    while hasattr(call, "__wrapped__"):
+        call = call.__wrapped__
+        depth += 1
+    return depth
+
+
+def test_routes_are_wrapped_once(api):
+    from main import app
+
+    async def scenario(client):
+        await client.get("/songs")
+        # A route group loaded on first use, passed through instrument_routes again
+        instrument_routes(app.routes)
+        return [
+            wrap_depth(route.dependant.call)
+            for route in app.routes
+            if isinstance(route, APIRoute)
+        ]
+
+    depths = api(scenario)
+    assert depths and set(depths) <= {0, 1}
@@ -0,0 +1,69 @@
+import base64
+import json
+import sqlite3
+import pytest
+from reset import database_path
+
+
+def cursor(key, last_id: int) -> str:
+    payload = json.dumps({"k": key, "id": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("key", [True, False, [1], {"a": 1}])
+def test_non_scalar_cursor_key_is_rejected(api, key):
+    async def scenario(client):
+        return await client.get(
+            "/practice-rooms",
+            params={"order_by": "created_at", "cursor": cursor(key, 1)},
+        )
+
+    response = api(scenario)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("path", ["/users", "/practice-rooms"])
+def test_null_cursor_key(api, path):
+    async def scenario(client):
+        return await client.get(
+            path, params={"order_by": "created_at", "cursor": cursor(None, 1)}
+        )
+
+    assert api(scenario).status_code == 200
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_through_null_timestamps(api, order):
+    conn = sqlite3.connect(database_path())
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO Users (username, email, created_at)"
+            " VALUES (?, ?, NULL)",
+            [(f"undated{i}", f"undated{i}@example.com") for i in range(3)],
+        )
+        conn.commit()
+        direction = "DESC" if order == "desc" else "ASC"
+        expected = [
+            row[0]
+            for row in conn.execute(
+                f"SELECT id FROM Users ORDER BY created_at {direction}, id {direction}"
+            )
+        ]
+    finally:
+        conn.close()
+
+    async def scenario(client):
+        seen, next_cursor = [], None
+        while True:
+            params = {"order_by": "created_at", "order": order, "limit": 2}
+            if next_cursor:
+                params["cursor"] = next_cursor
+            response = await client.get("/users", params=params)
+            assert response.status_code == 200, response.text
+            seen.extend(user["id"] for user in response.json())
+            next_cursor = response.headers.get("x-next-cursor")
+            if next_cursor is None:
+                return seen
+
+    assert api(scenario) == expected
@@ -0,0 +1,39 @@
+import random
+import pytest
+import recommend
+
+
+def completers(lessons: int, users: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    result = {lesson: 0 for lesson in range(lessons)}
+    for user in range(users):
+        for lesson in rng.sample(range(lessons), rng.randint(0, 8)):
+            result[lesson] |= 1 << user
+    return result
+
+
+def scores(neighbors: dict) -> dict:
+    return {
+        lesson: [round(score, 9) for _, score in items]
+        for lesson, items in neighbors.items()
+    }
+
+
+@pytest.mark.skipif(recommend.scipy_modules() is None, reason="scipy not installed")
+def test_sparse_build_matches_fallback(monkeypatch):
+    data = completers(150, 400)
+    sparse_build = recommend.build_neighbors(data)
+    monkeypatch.setattr(recommend, "scipy_modules", lambda: None)
+    assert scores(sparse_build) == scores(recommend.build_neighbors(data))
+
+
+def test_patch_matches_build():
+    data = completers(150, 400)
+    neighbors = recommend.build_neighbors(data)
+    dirty = {3, 40, 77}
+    for lesson in dirty:
+        data[lesson] ^= (1 << 400) | (1 << 5)
+    patched = recommend.patch_neighbors(neighbors, data, dirty)
+    rebuilt = recommend.build_neighbors(data)
+    for lesson in dirty:
+        assert scores(patched)[lesson] == scores(rebuilt)[lesson]
@@ -0,0 +1,37 @@
+import time
+import pytest
+from Routes import RecommendationRoute
+from recommend import recommender
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    # The suite runs with the background model off, so it is never built
+    monkeypatch.setattr(RecommendationRoute, "recommendations_enabled", True)
+    monkeypatch.setattr(RecommendationRoute, "ready_timeout", 0.2)
+
+
+def test_not_ready_times_out(api, enabled):
+    async def scenario(client):
+        start = time.perf_counter()
+        response = await client.get("/users/1/recommendations")
+        return response, time.perf_counter() - start
+
+    response, elapsed = api(scenario)
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Recommendations are not ready"
+    assert elapsed < 2
+
+
+def test_failed_build_answers_at_once(api, enabled, monkeypatch):
+    monkeypatch.setattr(RecommendationRoute, "ready_timeout", 30)
+    monkeypatch.setattr(recommender, "error", "database is locked")
+
+    async def scenario(client):
+        start = time.perf_counter()
+        response = await client.get("/users/1/recommendations")
+        return response, time.perf_counter() - start
+
+    response, elapsed = api(scenario)
+    assert response.status_code == 503
+    assert elapsed < 2
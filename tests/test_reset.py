@@ -0,0 +1,32 @@
+import sqlite3
+from reset import database_path, run_seed_script
+
+
+def test_seed_replays_over_initialized_database(api, tmp_path):
+    async def scenario(client):
+        return (await client.get("/stats/users/1")).status_code
+
+    assert api(scenario) == 200
+    copy = tmp_path / "replay.db"
+    # The backup API includes what is still in the -wal file; a file copy would
+    # miss the tables the app created
+    source, target = sqlite3.connect(database_path()), sqlite3.connect(copy)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    run_seed_script(str(copy))
+    conn = sqlite3.connect(copy)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone() == (0,)
+    finally:
+        conn.close()
+
+
+def test_reset_db(api):
+    async def scenario(client):
+        return await client.post("/reset-db")
+
+    response = api(scenario)
+    assert response.status_code == 200, response.text
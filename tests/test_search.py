@@ -0,0 +1,58 @@
+import base64
+import json
+import pytest
+
+
+def cursor(key, last_id: int) -> str:
+    payload = json.dumps({"k": key, "id": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode(value: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+
+
+@pytest.mark.parametrize("key", [None, "abc", "nan"])
+def test_invalid_rank_cursor(api, key):
+    async def scenario(client):
+        return await client.get(
+            "/lessons/search", params={"q": "music", "cursor": cursor(key, 1)}
+        )
+
+    response = api(scenario)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_pages_follow_rank_order(api):
+    async def scenario(client):
+        everything = await client.get(
+            "/lessons/search", params={"q": "music", "limit": 50}
+        )
+        seen, next_cursor, first_cursor = [], None, None
+        while True:
+            params = {"q": "music", "limit": 1}
+            if next_cursor:
+                params["cursor"] = next_cursor
+            response = await client.get("/lessons/search", params=params)
+            assert response.status_code == 200, response.text
+            seen.extend(lesson["id"] for lesson in response.json())
+            next_cursor = response.headers.get("x-next-cursor")
+            first_cursor = first_cursor or next_cursor
+            if next_cursor is None:
+                break
+        # A rank sent as a numeric string is compared as a number
+        payload = decode(first_cursor)
+        as_text = await client.get(
+            "/lessons/search",
+            params={"q": "music", "cursor": cursor(str(payload["k"]), payload["id"])},
+        )
+        as_float = await client.get(
+            "/lessons/search", params={"q": "music", "cursor": first_cursor}
+        )
+        return everything.json(), seen, as_text.json(), as_float.json()
+
+    everything, seen, as_text, as_float = api(scenario)
+    assert len(everything) > 1
+    assert seen == [lesson["id"] for lesson in everything]
+    assert as_text == as_float
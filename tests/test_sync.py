@@ -0,0 +1,23 @@
+def test_push_with_utc_offset_merges_with_existing_row(api):
+    async def scenario(client):
+        return await client.post(
+            "/user-progress/sync/1",
+            json={
+                "changes": [
+                    {
+                        "lesson_id": 1,
+                        "completed": True,
+                        "completed_at": "2020-01-01T08:00:00Z",
+                    },
+                ]
+            },
+        )
+
+    response = api(scenario)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    # No token, so the existing row conflicts and the earlier completion wins
+    assert result["conflicts"] == [1]
+    [item] = result["items"]
+    assert item["completed"] is True
+    assert item["completed_at"] == "2020-01-01T08:00:00"
@@ -0,0 +1,96 @@
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+from cache import cache_key
+from changelog import change_log, sync_changes
+
+
+# In-memory version counter per table, bumped by every write handler.
+# The epoch changes on each start so ETags from a previous process never match.
+# With a change log the counters, epoch and start time are shared by all
+# workers, so any of them can answer a conditional GET for another's ETag.
+class TableVersions:
+    def __init__(self, change_log=None):
+        self.change_log = change_log
+        self.epoch = uuid.uuid4().hex[:8]
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self.versions = {}
+        self.modified = {}
+        if change_log is not None:
+            change_log.subscribe("versions", self._apply, reload=self._reload)
+
+    async def bump(self, *tables):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        if self.change_log is not None:
+            self._apply(await self.change_log.bump(tables, int(now.timestamp())))
+            return
+        for table in tables:
+            self.versions[table] = self.versions.get(table, 0) + 1
+            self.modified[table] = now
+
+    def etag(self, tables, key: str) -> str:
+        state = ",".join(f"{t}={self.versions.get(t, 0)}" for t in tables)
+        digest = hashlib.sha1(f"{self.epoch}|{state}|{key}".encode()).hexdigest()
+        return f'"{digest[:20]}"'
+
+    def last_modified(self, tables) -> datetime:
+        return max(self.modified.get(t, self.started_at) for t in tables)
+
+    # `versions` maps table -> [version, modified unix time]. Another worker's
+    # entry can be replayed after this worker applied its own later bump.
+    def _apply(self, versions: dict):
+        for table, (version, modified) in versions.items():
+            if version <= self.versions.get(table, 0):
+                continue
+            self.versions[table] = version
+            self.modified[table] = datetime.fromtimestamp(modified, timezone.utc)
+
+    def _reload(self):
+        self.epoch = self.change_log.epoch
+        self.started_at = datetime.fromtimestamp(
+            self.change_log.started_at, timezone.utc
+        )
+        self.versions.clear()
+        self.modified.clear()
+        self._apply(self.change_log.versions())
+
+
+table_versions = TableVersions(change_log)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+# Answer a conditional GET from the version counters alone. Returns a 304 response
+# when the client copy is current; otherwise sets ETag/Last-Modified on `response`
+# and returns None so the handler runs its query as usual.
+def conditional_get(request: Request, response: Response, tables) -> Optional[Response]:
+    sync_changes()
+    etag = table_versions.etag(tables, cache_key(request))
+    last_modified = table_versions.last_modified(tables)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, etag)
+    else:
+        not_modified = False
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                not_modified = last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                pass
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None